@@ -1,43 +1,69 @@
-import logging
-import requests
-import json
-from PyQt5.QtCore import QThread, pyqtSignal
-
-from lyrics_insight.config import SERVER_URL, TIMEOUT
-from lyrics_insight.crypto import encrypt_request, decrypt_response
-
-class ApiWorker(QThread):
-    """
-    Поток для выполнения зашифрованных API-запросов без блокировки UI.
-    """
-    finished = pyqtSignal(dict)
-    error = pyqtSignal(str)
-
-    def __init__(self, endpoint, params=None):
-        super().__init__()
-        self.endpoint = endpoint
-        self.params = params or {}
-
-    def run(self):
-        try:
-            # Шифруем параметры запроса
-            token = encrypt_request(self.params)
-            resp = requests.post(
-                f"{SERVER_URL}/{self.endpoint}",
-                json={"data": token},
-                timeout=TIMEOUT
-            )
-            if resp.status_code == 200:
-                body = resp.json()
-                encrypted = body.get("data")
-                if not encrypted:
-                    self.error.emit("Пустой ответ сервера")
-                    return
-                # Дешифруем и парсим
-                data = decrypt_response(encrypted)
-                self.finished.emit(data)
-            else:
-                self.error.emit(f"Сервер вернул {resp.status_code}")
-        except Exception as e:
-            self.error.emit(f"Сетевая ошибка: {e}")
-            logging.error(f"Ошибка запроса: {e}")
\ No newline at end of file
+import logging
+import time
+import requests
+import json
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from lyrics_insight.config import SERVER_URL, TIMEOUT, POLL_INTERVAL
+from lyrics_insight.crypto import encrypt_request, decrypt_response
+
+class ApiWorker(QThread):
+    """
+    Поток для выполнения зашифрованных API-запросов без блокировки UI.
+    """
+    finished = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+    def __init__(self, endpoint, params=None):
+        super().__init__()
+        self.endpoint = endpoint
+        self.params = params or {}
+
+    def run(self):
+        try:
+            data = self._post(self.endpoint, self.params)
+            if data is None:
+                return
+            # /get_lyrics ставит задачу в очередь: ждём её завершения
+            if "job_id" in data:
+                data = self._wait_for_job(data)
+                if data is None:
+                    return
+            self.finished.emit(data)
+        except Exception as e:
+            self.error.emit(f"Сетевая ошибка: {e}")
+            logging.error(f"Ошибка запроса: {e}")
+
+    def _post(self, endpoint, params):
+        # Шифруем параметры запроса
+        token = encrypt_request(params)
+        resp = requests.post(
+            f"{SERVER_URL}/{endpoint}",
+            json={"data": token},
+            timeout=TIMEOUT
+        )
+        if resp.status_code != 200:
+            self.error.emit(f"Сервер вернул {resp.status_code}")
+            return None
+        body = resp.json()
+        encrypted = body.get("data")
+        if not encrypted:
+            self.error.emit("Пустой ответ сервера")
+            return None
+        # Дешифруем и парсим
+        return decrypt_response(encrypted)
+
+    def _wait_for_job(self, job):
+        deadline = time.monotonic() + TIMEOUT
+        while job.get("status") in ("queued", "running"):
+            if time.monotonic() > deadline:
+                self.error.emit("Истекло время ожидания обработки трека")
+                return None
+            time.sleep(POLL_INTERVAL)
+            job = self._post("get_lyrics_status", {"job_id": job["job_id"]})
+            if job is None:
+                return None
+        if job.get("status") != "done":
+            self.error.emit(f"Сервер вернул {job.get('code', 500)}")
+            return None
+        return job.get("result", {})
@@ -1,18 +1,19 @@
-import logging
-from dotenv import load_dotenv
-load_dotenv()  # подгрузить переменные из .env
-
-# Конфигурация сервера и логирования
-SERVER_URL = "http://localhost:8000"
-TIMEOUT = 300.0
-LOG_FILE = "client.log"
-
-def setup_logging():
-    """
-    Настраивает логирование в файл с необходимым форматом.
-    """
-    logging.basicConfig(
-        filename=LOG_FILE,
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s"
+import logging
+from dotenv import load_dotenv
+load_dotenv()  # подгрузить переменные из .env
+
+# Конфигурация сервера и логирования
+SERVER_URL = "http://localhost:8000"
+TIMEOUT = 300.0
+POLL_INTERVAL = 1.0  # сек. между опросами статуса задачи /get_lyrics
+LOG_FILE = "client.log"
+
+def setup_logging():
+    """
+    Настраивает логирование в файл с необходимым форматом.
+    """
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
     )
\ No newline at end of file
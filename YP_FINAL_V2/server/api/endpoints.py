@@ -1,197 +1,326 @@
-from fastapi import APIRouter, Request, HTTPException, Depends, Body
-from sqlalchemy.orm import Session
-import json
-import numpy as np
-
-from database import get_db
-from models import Lyrics, Log
-from services.lyrics import fetch_lyrics_from_genius, process_and_save_lyrics
-from services.crypto import decrypt_payload, encrypt_payload
-from services.faiss_index import faiss_service
-from services.idf_cache import idf_service
-from config import (
-    logger,
-    SBERT_WEIGHT, E5_WEIGHT, EMO_WEIGHT,
-    THEME_BONUS, GENRE_BONUS, OVERLAP_RATIO_BONUS,
-    LENGTH_NORMALIZATION, DUPLICATE_PENALTY
-)
-
-router = APIRouter()
-
-
-@router.post("/get_lyrics")
-def get_lyrics_encrypted(
-    request: Request,
-    db: Session = Depends(get_db),
-    body: dict = Body(...)
-):
-    token = body.get("data")
-    if not token:
-        raise HTTPException(status_code=400, detail="Missing encrypted payload")
-    try:
-        raw = decrypt_payload(token)
-        params = json.loads(raw.decode("utf-8"))
-        track_name = params.get("track_name")
-        artist     = params.get("artist")
-        if not track_name or not artist:
-            raise HTTPException(status_code=400, detail="Invalid parameters")
-
-        text, _ = fetch_lyrics_from_genius(track_name, artist)
-        if len(text.split()) < 10:
-            raise HTTPException(status_code=404, detail="Текст слишком короткий или не найден")
-
-        result = process_and_save_lyrics(db, track_name, artist, text, {
-            "ip":    request.client.host,
-            "agent": request.headers.get("User-Agent", "-")
-        })
-
-        payload   = json.dumps(result, ensure_ascii=False).encode("utf-8")
-        encrypted = encrypt_payload(payload)
-        return {"data": encrypted}
-
-    except HTTPException:
-        raise
-    except Exception:
-        logger.exception("Ошибка в /get_lyrics")
-        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
-
-
-@router.post("/find_similar")
-async def find_similar_encrypted(
-    request: Request,
-    db: Session = Depends(get_db),
-    body: dict = Body(...)
-):
-    token = body.get("data")
-    if not token:
-        raise HTTPException(status_code=400, detail="Missing encrypted payload")
-    try:
-        raw = decrypt_payload(token)
-        params = json.loads(raw.decode("utf-8"))
-        track_name = params.get("track_name")
-        artist     = params.get("artist")
-        if not track_name or not artist:
-            raise HTTPException(status_code=400, detail="Invalid parameters")
-
-        source = db.query(Lyrics).filter_by(track_name=track_name, artist=artist).first()
-        if not source or not source.embedding or not source.sbert_embedding or not source.deep_emotion_vec:
-            raise HTTPException(status_code=404, detail="Сначала вызовите /get_lyrics")
-
-        # Normalize source vectors
-        src_e5 = np.frombuffer(source.embedding, dtype=np.float32).copy()
-        src_sb = np.frombuffer(source.sbert_embedding, dtype=np.float32).copy()
-        src_em = np.frombuffer(source.deep_emotion_vec, dtype=np.float32).copy()
-        src_e5 /= (np.linalg.norm(src_e5) + 1e-10)
-        src_sb /= (np.linalg.norm(src_sb) + 1e-10)
-        src_em /= (np.linalg.norm(src_em) + 1e-10)
-
-        src_genres = set(source.genre or [])
-        src_themes = set(source.themes or [])
-
-        # Hybrid FAISS search
-        candidate_ids = faiss_service.search(src_e5, src_sb, src_em, top_k=50)
-
-        # Bulk fetch and filter
-        objs       = db.query(Lyrics).filter(Lyrics.id.in_(candidate_ids)).all()
-        id_to_obj  = {o.id: o for o in objs}
-        neighbors  = []
-        seen_ids   = set()
-        for cid in candidate_ids:
-            if cid == source.id or cid in seen_ids:
-                continue
-            o = id_to_obj.get(cid)
-            if not o or not o.embedding:
-                continue
-            # require common genre and theme
-            if not (src_genres & set(o.genre or [])):
-                continue
-            if not (src_themes & set(o.themes or [])):
-                continue
-            neighbors.append(o)
-            seen_ids.add(cid)
-            if len(neighbors) >= 30:
-                break
-
-        if not neighbors:
-            raise HTTPException(status_code=404, detail="Нет доступных кандидатов")
-
-        theme_idf = idf_service.theme_idf
-        genre_idf = idf_service.genre_idf
-
-        results = []
-        for cand in neighbors:
-            e5v = np.frombuffer(cand.embedding, dtype=np.float32).copy()
-            sbv = np.frombuffer(cand.sbert_embedding, dtype=np.float32).copy()
-            emv = np.frombuffer(cand.deep_emotion_vec, dtype=np.float32).copy()
-            e5v /= (np.linalg.norm(e5v) + 1e-10)
-            sbv /= (np.linalg.norm(sbv) + 1e-10)
-            emv /= (np.linalg.norm(emv) + 1e-10)
-
-            cos_sim = float(np.dot(src_e5, e5v))
-            sb_sim  = float(np.dot(src_sb, sbv))
-            emo_sim = float(np.dot(src_em, emv))
-
-            common_t    = src_themes & set(cand.themes or [])
-            union_t     = src_themes | set(cand.themes or [])
-            theme_tfidf = (
-                sum(theme_idf.get(t, 0) for t in common_t) /
-                sum(theme_idf.get(t, 0) for t in union_t)
-                if union_t else 0.0
-            )
-
-            common_g    = src_genres & set(cand.genre or [])
-            union_g     = src_genres | set(cand.genre or [])
-            genre_tfidf = (
-                sum(genre_idf.get(g, 0) for g in common_g) /
-                sum(genre_idf.get(g, 0) for g in union_g)
-                if union_g else 0.0
-            )
-            overlap_ratio = (len(common_g) / len(union_g)) if union_g else 0.0
-
-            raw_score    = SBERT_WEIGHT * sb_sim + E5_WEIGHT * cos_sim + EMO_WEIGHT * emo_sim
-            bonus        = (1 + THEME_BONUS * theme_tfidf + GENRE_BONUS * genre_tfidf + OVERLAP_RATIO_BONUS * overlap_ratio)
-            length_bonus = min(len(cand.lyrics.split()), LENGTH_NORMALIZATION) / LENGTH_NORMALIZATION
-            score        = raw_score * bonus * length_bonus
-            score        = min(score, 0.9999)
-
-            results.append({
-                "track":            cand.track_name,
-                "artist":           cand.artist,
-                "similarity":       round(score * 100, 2),
-                "sbert_similarity": round(max(sb_sim,  0) * 100, 2),
-                "cosine_semantic":  round(max(cos_sim, 0) * 100, 2),
-                "emotion_sim":      round(emo_sim * 100,   2),
-                "theme_tfidf":      round(theme_tfidf * 100,2),
-                "genre_tfidf":      round(genre_tfidf * 100,2),
-                "overlap_ratio":    round(overlap_ratio * 100,2),
-            })
-
-        # final unique top-5
-        seen_pairs = set()
-        final = []
-        for item in sorted(results, key=lambda x: -x["similarity"]):
-            pair = (item["track"], item["artist"])
-            if pair in seen_pairs:
-                continue
-            seen_pairs.add(pair)
-            final.append(item)
-            if len(final) == 5:
-                break
-
-        db.add(Log(
-            ip_address=request.client.host,
-            operation="find_similar",
-            status="success",
-            device_info=request.headers.get("User-Agent", "-")
-        ))
-        db.commit()
-
-        payload   = json.dumps({"similar_tracks": final}, ensure_ascii=False).encode("utf-8")
-        encrypted = encrypt_payload(payload)
-        return {"data": encrypted}
-
-    except HTTPException:
-        raise
-    except Exception:
-        logger.exception("Ошибка в /find_similar")
-        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+from fastapi import APIRouter, Request, HTTPException, Depends, Body
+from sqlalchemy.orm import Session
+import json
+import numpy as np
+
+from database import get_db, get_read_db
+from models import Lyrics
+from services.lyrics import ingest_track, fresh_analysis, fast_path_stats
+from services.jobs import ingest_queue
+from services.genius import genius_lookup
+from services.external_io import external_io
+from services.lastfm import version_stats
+from services.lastfm_cache import lastfm_cache
+from services.normalize import match_key
+from services.semantic import e5_batcher, sbert_batcher
+from services.emotion import emotion_batcher
+from services.crypto import decrypt_payload, encrypt_payload
+from services.faiss_index import faiss_service
+from services.faiss_common import default_weights, MODALITIES
+from services.idf_cache import idf_service
+from services.feature_store import feature_store
+from services.ranking import FeatureRows, pick_neighbors, rank_candidates
+from services.result_cache import result_cache, result_key
+from services.request_log import request_log
+from config import (
+    logger, FIND_SIMILAR_BATCH_MAX
+)
+
+router = APIRouter()
+
+# Кандидатов из FAISS на одну затравку
+SEARCH_TOP_K = 50
+
+
+def _read_params(body: dict) -> dict:
+    token = body.get("data")
+    if not token:
+        raise HTTPException(status_code=400, detail="Missing encrypted payload")
+    raw = decrypt_payload(token)
+    return json.loads(raw.decode("utf-8"))
+
+
+def _request_weights(params: dict) -> dict:
+    """
+    Веса модальностей из запроса ({"e5": .., "sbert": .., "emotion": ..});
+    отсутствующие берутся из config.
+    """
+    weights = default_weights()
+    custom = params.get("weights")
+    if custom is None:
+        return weights
+    if not isinstance(custom, dict) or set(custom) - set(MODALITIES):
+        raise HTTPException(status_code=400, detail="Invalid weights")
+    try:
+        weights.update({m: float(w) for m, w in custom.items()})
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid weights")
+    if any(w < 0 for w in weights.values()) or not any(weights.values()):
+        raise HTTPException(status_code=400, detail="Invalid weights")
+    return weights
+
+
+def _encrypted_response(data: dict) -> dict:
+    payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    return {"data": encrypt_payload(payload)}
+
+
+@router.post("/get_lyrics")
+def get_lyrics_encrypted(
+    request: Request,
+    db: Session = Depends(get_db),
+    body: dict = Body(...)
+):
+    """
+    Свежий анализ из БД отдаёт сразу (status=done), иначе ставит загрузку
+    трека в очередь и возвращает job_id для опроса через /get_lyrics_status.
+    """
+    try:
+        params = _read_params(body)
+        track_name = params.get("track_name")
+        artist     = params.get("artist")
+        if not track_name or not artist:
+            raise HTTPException(status_code=400, detail="Invalid parameters")
+
+        request_info = {
+            "ip":    request.client.host,
+            "agent": request.headers.get("User-Agent", "-")
+        }
+        result = fresh_analysis(db, track_name, artist, request_info)
+        if result is not None:
+            return _encrypted_response({"job_id": None, "status": "done", "result": result})
+
+        job = ingest_queue.submit(track_name, artist, ingest_track, request_info)
+        return _encrypted_response(job.to_dict())
+
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка в /get_lyrics")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.post("/get_lyrics_status")
+def get_lyrics_status_encrypted(body: dict = Body(...)):
+    try:
+        params = _read_params(body)
+        job_id = params.get("job_id")
+        if not job_id:
+            raise HTTPException(status_code=400, detail="Invalid parameters")
+
+        job = ingest_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+        return _encrypted_response(job.to_dict())
+
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка в /get_lyrics_status")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.post("/stats")
+def service_stats_encrypted(body: dict = Body(...)):
+    """
+    Метрики сервиса: очередь загрузки, тайминги этапов и попадания в кеши.
+    Доступ, как у /admin/rebuild_index, — по пустому зашифрованному запросу.
+    """
+    try:
+        _read_params(body)
+        return _encrypted_response({
+            "ingest": ingest_queue.stats(),
+            "fast_path": fast_path_stats(),
+            "genius": genius_lookup.stats(),
+            "external_io": external_io.stats(),
+            "lastfm_versions": version_stats.snapshot(),
+            "lastfm_cache": lastfm_cache.stats(),
+            "faiss": faiss_service.stats(),
+            "feature_store": feature_store.stats(),
+            "result_cache": result_cache.stats(),
+            "idf": idf_service.stats(),
+            "request_log": request_log.stats(),
+            "inference": {b.name: b.stats() for b in (e5_batcher, sbert_batcher, emotion_batcher)},
+        })
+
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка в /stats")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.post("/admin/rebuild_index")
+def rebuild_index_encrypted(body: dict = Body(...)):
+    """
+    Запускает полную перестройку FAISS-индекса из БД в фоне; поиск тем временем
+    обслуживается текущим поколением. Ответ — ход перестройки и started=false,
+    если она уже шла; дальше ход виден в /stats (faiss.rebuild).
+    """
+    try:
+        # Пустой зашифрованный запрос: расшифровка ключом сервиса и есть проверка доступа
+        _read_params(body)
+        started = faiss_service.start_rebuild()
+        return _encrypted_response({"started": started, **faiss_service.rebuild_progress.snapshot()})
+
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка в /admin/rebuild_index")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+def _similar_tracks(
+    src: FeatureRows, candidate_ids: list[int], weights: dict, key: tuple, cache_token: int
+) -> list[dict]:
+    """
+    Отбор и ранжирование кандидатов FAISS по данным хранилища признаков;
+    результат кладётся в кеш ответов вместе с тем, от чего он зависит.
+    """
+    neighbors = pick_neighbors(src, feature_store.features(candidate_ids))
+    genre_idf, theme_idf = feature_store.idf_vectors(idf_service.genre_idf, idf_service.theme_idf)
+    final = rank_candidates(src, neighbors, weights, genre_idf, theme_idf)
+
+    source_id = int(src.ids[0])
+    genres, themes = feature_store.tag_names(src, neighbors)
+    result_cache.put(
+        key, final, cache_token, [source_id, *candidate_ids],
+        feature_store.tags(source_id), genres, themes
+    )
+    return final
+
+
+def _source_query(src: FeatureRows, i: int) -> tuple:
+    return tuple(src.vectors[m][i] for m in MODALITIES)
+
+
+@router.post("/find_similar")
+async def find_similar_encrypted(
+    request: Request,
+    read_db: Session = Depends(get_read_db),
+    body: dict = Body(...)
+):
+    token = body.get("data")
+    if not token:
+        raise HTTPException(status_code=400, detail="Missing encrypted payload")
+    try:
+        raw = decrypt_payload(token)
+        params = json.loads(raw.decode("utf-8"))
+        track_name = params.get("track_name")
+        artist     = params.get("artist")
+        if not track_name or not artist:
+            raise HTTPException(status_code=400, detail="Invalid parameters")
+        weights = _request_weights(params)
+
+        # Из БД нужен только id источника, остальное — в хранилище признаков
+        source = read_db.query(Lyrics.id).filter_by(match_key=match_key(track_name, artist)).first()
+        source_id = source.id if source else None
+        src = feature_store.features([source_id] if source_id is not None else [])
+        if not len(src):
+            raise HTTPException(status_code=404, detail="Сначала вызовите /get_lyrics")
+
+        # IDF выводится лениво: сдвиг после загрузок сбрасывает устаревшие ответы до чтения кеша
+        idf_service.sync()
+        key   = result_key(source_id, faiss_service.generation, weights, SEARCH_TOP_K)
+        final = result_cache.get(key)
+        if final is None:
+            cache_token = result_cache.token()
+            src_genres, src_themes = feature_store.tags(source_id)
+
+            # Hybrid FAISS search: общий жанр и общая тема отбираются внутри индекса
+            candidate_ids = faiss_service.search(
+                *_source_query(src, 0), top_k=SEARCH_TOP_K,
+                genres=src_genres, themes=src_themes, weights=weights
+            )
+            final = _similar_tracks(src, candidate_ids, weights, key, cache_token)
+        if not final:
+            raise HTTPException(status_code=404, detail="Нет доступных кандидатов")
+
+        request_log.log("find_similar", request.client.host, request.headers.get("User-Agent", "-"))
+
+        payload   = json.dumps({"similar_tracks": final}, ensure_ascii=False).encode("utf-8")
+        encrypted = encrypt_payload(payload)
+        return {"data": encrypted}
+
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка в /find_similar")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.post("/find_similar_batch")
+async def find_similar_batch_encrypted(
+    request: Request,
+    read_db: Session = Depends(get_read_db),
+    body: dict = Body(...)
+):
+    """
+    /find_similar для многих затравок за один запрос:
+    {"seeds": [{"track_name": .., "artist": ..}, ...], "weights": {..}}.
+    id затравок читаются из БД одним запросом, поиск в FAISS — один пакетный
+    и только для затравок без ответа в кеше, признаки кандидатов берутся из хранилища.
+    Ответ — "results" в порядке затравок; для затравки без анализа
+    или без кандидатов вместо similar_tracks приходит error.
+    """
+    try:
+        params = _read_params(body)
+        seeds  = params.get("seeds")
+        if not isinstance(seeds, list) or not seeds or len(seeds) > FIND_SIMILAR_BATCH_MAX:
+            raise HTTPException(status_code=400, detail="Invalid parameters")
+        pairs = []
+        for seed in seeds:
+            if not isinstance(seed, dict) or not seed.get("track_name") or not seed.get("artist"):
+                raise HTTPException(status_code=400, detail="Invalid parameters")
+            pairs.append((seed["track_name"], seed["artist"]))
+        weights = _request_weights(params)
+
+        seed_keys  = [match_key(track_name, artist) for track_name, artist in pairs]
+        by_key     = dict(read_db.query(Lyrics.match_key, Lyrics.id).filter(Lyrics.match_key.in_(set(seed_keys))))
+        source_ids = [by_key.get(key) for key in seed_keys]
+        src        = feature_store.features(i for i in source_ids if i is not None)
+        # в хранилище только проанализированные треки; повторы затравок не мешают
+        src_rows   = {int(obj_id): row for row, obj_id in enumerate(src.ids)}
+        idf_service.sync()
+        generation = faiss_service.generation
+        keys       = {obj_id: result_key(obj_id, generation, weights, SEARCH_TOP_K) for obj_id in src_rows}
+        finals     = {}
+        for obj_id, key in keys.items():
+            final = result_cache.get(key)
+            if final is not None:
+                finals[obj_id] = final
+
+        missing = [obj_id for obj_id in src_rows if obj_id not in finals]
+        if missing:
+            cache_token = result_cache.token()
+            rows  = np.asarray([src_rows[obj_id] for obj_id in missing])
+            tags  = [feature_store.tags(obj_id) for obj_id in missing]
+            found = faiss_service.search_batch(
+                *(src.vectors[m][rows] for m in MODALITIES), top_k=SEARCH_TOP_K,
+                genres=[g for g, _ in tags], themes=[t for _, t in tags], weights=weights
+            )
+            for obj_id, row, ids in zip(missing, rows.tolist(), found):
+                finals[obj_id] = _similar_tracks(src.take(np.asarray([row])), ids, weights, keys[obj_id], cache_token)
+
+        results = []
+        for (track_name, artist), obj_id in zip(pairs, source_ids):
+            item = {"track_name": track_name, "artist": artist}
+            if obj_id not in finals:
+                item["error"] = "Сначала вызовите /get_lyrics"
+            else:
+                final = finals[obj_id]
+                if final:
+                    item["similar_tracks"] = final
+                else:
+                    item["error"] = "Нет доступных кандидатов"
+            results.append(item)
+
+        request_log.log("find_similar_batch", request.client.host, request.headers.get("User-Agent", "-"))
+
+        return _encrypted_response({"results": results})
+
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка в /find_similar_batch")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
@@ -1,40 +1,126 @@
-import os
-import logging.config
-from dotenv import load_dotenv
-load_dotenv()
-
-# --- Основные настройки ---
-DEFAULT_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
-DEFAULT_PORT = int(os.getenv("PORT", 8000))
-
-# --- API токены ---
-GENIUS_TOKEN = os.getenv("GENIUS_TOKEN")
-LASTFM_API_KEY = os.getenv("LASTFM_API_KEY")
-LASTFM_API_URL = "http://ws.audioscrobbler.com/2.0/"
-
-# --- Логирование ---
-LOG_FILE = "server.log"
-LOGGING_CONFIG = {
-    "version": 1,
-    "handlers": {
-        "file": {"class": "logging.FileHandler", "filename": LOG_FILE, "formatter": "default"},
-        "console": {"class": "logging.StreamHandler", "formatter": "default"},
-    },
-    "formatters": {"default": {"format": "%(asctime)s - %(levelname)s - %(message)s"}},
-    "root": {"handlers": ["file", "console"], "level": "INFO"},
-}
-logging.config.dictConfig(LOGGING_CONFIG)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
-# --- Гиперпараметры для /find_similar ---
-SBERT_WEIGHT         = float(os.getenv("SBERT_WEIGHT",         "0.35"))  # семантика текста
-E5_WEIGHT            = float(os.getenv("E5_WEIGHT",            "0.35"))  # глубокая семантика
-EMO_WEIGHT           = float(os.getenv("EMO_WEIGHT",           "0.30"))  # эмоции в доп.весе
-
-THEME_BONUS          = float(os.getenv("THEME_BONUS",          "0.25"))  # темы чуть ниже жанра
-GENRE_BONUS          = float(os.getenv("GENRE_BONUS",          "0.50"))  # жанр важен, но не доминирует
-OVERLAP_RATIO_BONUS  = float(os.getenv("OVERLAP_RATIO_BONUS",  "0.10"))  # умеренный буст пересечения
-
-LENGTH_NORMALIZATION = int(os.getenv("LENGTH_NORMALIZATION",   "200"))
-DUPLICATE_PENALTY    = float(os.getenv("DUPLICATE_PENALTY",     "0.05"))  # почти исключает оригинал
\ No newline at end of file
+import os
+import logging.config
+from dotenv import load_dotenv
+load_dotenv()
+
+# --- Основные настройки ---
+DEFAULT_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
+DEFAULT_PORT = int(os.getenv("PORT", 8000))
+# Каталог для производных артефактов (матрица тем, снимки индексов)
+DATA_DIR = os.getenv("DATA_DIR", "./data")
+
+# --- SQLite ---
+SQLITE_JOURNAL_MODE  = os.getenv("SQLITE_JOURNAL_MODE",  "WAL")     # читатели не блокируют писателя
+SQLITE_SYNCHRONOUS   = os.getenv("SQLITE_SYNCHRONOUS",   "NORMAL")  # в WAL целостность сохраняется
+SQLITE_CACHE_SIZE    = int(os.getenv("SQLITE_CACHE_SIZE", str(-64 * 1024)))        # <0 — КиБ на соединение
+SQLITE_MMAP_SIZE     = int(os.getenv("SQLITE_MMAP_SIZE",  str(256 * 1024 * 1024)))  # байт файла БД в mmap
+SQLITE_BUSY_TIMEOUT  = int(os.getenv("SQLITE_BUSY_TIMEOUT", "10000"))  # мс ожидания блокировки
+SQLITE_READ_POOL     = int(os.getenv("SQLITE_READ_POOL",  "8"))
+SQLITE_WRITE_POOL    = int(os.getenv("SQLITE_WRITE_POOL", "4"))
+SQLITE_CHECKPOINT_INTERVAL = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "300"))  # сек., 0 — только автоматический
+SQLITE_CHECKPOINT_MODE     = os.getenv("SQLITE_CHECKPOINT_MODE", "PASSIVE")
+
+# --- Журнал запросов (таблица logs) ---
+REQUEST_LOG_DATABASE_URL = os.getenv("REQUEST_LOG_DATABASE_URL", "")          # пусто — основная БД, иначе отдельный файл
+REQUEST_LOG_BATCH        = int(os.getenv("REQUEST_LOG_BATCH",       "256"))     # строк в одной транзакции
+REQUEST_LOG_FLUSH_MS     = float(os.getenv("REQUEST_LOG_FLUSH_MS",  "1000"))    # ожидание добора пачки
+REQUEST_LOG_QUEUE_MAX    = int(os.getenv("REQUEST_LOG_QUEUE_MAX",   "100000"))  # сверх — события отбрасываются
+
+# --- API токены ---
+GENIUS_TOKEN = os.getenv("GENIUS_TOKEN")
+LASTFM_API_KEY = os.getenv("LASTFM_API_KEY")
+LASTFM_API_URL = os.getenv("LASTFM_API_URL", "http://ws.audioscrobbler.com/2.0/")
+LASTFM_WEB_URL = os.getenv("LASTFM_WEB_URL", "https://www.last.fm")
+# Корни Genius переопределяются, чтобы гонять пайплайн против локальных заглушек
+GENIUS_API_ROOT        = os.getenv("GENIUS_API_ROOT",        "https://api.genius.com/")
+GENIUS_PUBLIC_API_ROOT = os.getenv("GENIUS_PUBLIC_API_ROOT", "https://genius.com/api/")
+GENIUS_WEB_ROOT        = os.getenv("GENIUS_WEB_ROOT",        "https://genius.com/")
+
+# --- Логирование ---
+LOG_FILE = "server.log"
+LOGGING_CONFIG = {
+    "version": 1,
+    "handlers": {
+        "file": {"class": "logging.FileHandler", "filename": LOG_FILE, "formatter": "default"},
+        "console": {"class": "logging.StreamHandler", "formatter": "default"},
+    },
+    "formatters": {"default": {"format": "%(asctime)s - %(levelname)s - %(message)s"}},
+    "root": {"handlers": ["file", "console"], "level": "INFO"},
+}
+logging.config.dictConfig(LOGGING_CONFIG)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# --- Гиперпараметры для /find_similar ---
+SBERT_WEIGHT         = float(os.getenv("SBERT_WEIGHT",         "0.35"))  # семантика текста
+E5_WEIGHT            = float(os.getenv("E5_WEIGHT",            "0.35"))  # глубокая семантика
+EMO_WEIGHT           = float(os.getenv("EMO_WEIGHT",           "0.30"))  # эмоции в доп.весе
+
+THEME_BONUS          = float(os.getenv("THEME_BONUS",          "0.25"))  # темы чуть ниже жанра
+GENRE_BONUS          = float(os.getenv("GENRE_BONUS",          "0.50"))  # жанр важен, но не доминирует
+OVERLAP_RATIO_BONUS  = float(os.getenv("OVERLAP_RATIO_BONUS",  "0.10"))  # умеренный буст пересечения
+
+LENGTH_NORMALIZATION = int(os.getenv("LENGTH_NORMALIZATION",   "200"))
+DUPLICATE_PENALTY    = float(os.getenv("DUPLICATE_PENALTY",     "0.05"))  # почти исключает оригинал
+FIND_SIMILAR_BATCH_MAX = int(os.getenv("FIND_SIMILAR_BATCH_MAX", "100"))  # затравок в /find_similar_batch
+
+# --- Кеш ответов /find_similar ---
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESULT_CACHE_IDF_RTOL  = float(os.getenv("RESULT_CACHE_IDF_RTOL", "0.001"))  # допустимый сдвиг IDF без сброса
+
+# --- Очередь задач загрузки (/get_lyrics) ---
+INGEST_WORKERS       = int(os.getenv("INGEST_WORKERS",         "2"))     # параллельных пайплайнов
+INGEST_JOB_TTL       = float(os.getenv("INGEST_JOB_TTL",       "900"))   # сек. хранения завершённых задач
+INGEST_FRESH_TTL     = float(os.getenv("INGEST_FRESH_TTL",     str(7 * 86400)))  # сек., когда анализ из БД считается свежим
+
+# --- Кеш Genius ---
+GENIUS_CACHE_TTL     = float(os.getenv("GENIUS_CACHE_TTL",     str(30 * 86400)))  # сек. для найденных песен
+GENIUS_NEGATIVE_TTL  = float(os.getenv("GENIUS_NEGATIVE_TTL",  str(86400)))       # сек. для "не найдено"
+
+# --- Внешний I/O (Genius, Last.fm) ---
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS",   "32"))    # keep-alive пул на процесс
+HTTP_TIMEOUT         = float(os.getenv("HTTP_TIMEOUT",         "5"))
+LASTFM_CONCURRENCY   = int(os.getenv("LASTFM_CONCURRENCY",     "4"))     # параллельных запросов на хост
+GENIUS_CONCURRENCY   = int(os.getenv("GENIUS_CONCURRENCY",     "2"))
+
+# --- Выбор популярной версии трека (Last.fm) ---
+LASTFM_VERSION_TOP_N    = int(os.getenv("LASTFM_VERSION_TOP_N",      "3"))      # getInfo только для N лучших по listeners
+LASTFM_VERSION_BUDGET   = float(os.getenv("LASTFM_VERSION_BUDGET",   "4"))      # сек. на все getInfo одного трека
+LASTFM_ARTIST_MEMO_SIZE = int(os.getenv("LASTFM_ARTIST_MEMO_SIZE",   "10000"))  # запомненных каноничных артистов
+
+# --- Кеш ответов Last.fm ---
+LASTFM_CACHE_TTLS = {  # сек. по методам API
+    "track.search":      float(os.getenv("LASTFM_TTL_SEARCH",  str(7 * 86400))),
+    "track.getInfo":     float(os.getenv("LASTFM_TTL_INFO",    str(86400))),       # playcount меняется быстро
+    "track.getTopTags":  float(os.getenv("LASTFM_TTL_TAGS",    str(30 * 86400))),
+    "web.tags":          float(os.getenv("LASTFM_TTL_WEB",     str(30 * 86400))),  # HTML-скрейп last.fm
+}
+LASTFM_NEGATIVE_TTL     = float(os.getenv("LASTFM_NEGATIVE_TTL",     str(86400)))
+LASTFM_CACHE_MAX_BYTES  = int(os.getenv("LASTFM_CACHE_MAX_BYTES",    str(64 * 1024 * 1024)))
+
+# --- Микробатчинг инференса ---
+E5_MAX_BATCH         = int(os.getenv("E5_MAX_BATCH",           "16"))    # чанков в одном прогоне E5
+E5_BULK_BATCH        = int(os.getenv("E5_BULK_BATCH",          "32"))    # батч encode_many
+E5_MAX_LENGTH        = int(os.getenv("E5_MAX_LENGTH",          "256"))   # окно чанка в токенах
+SBERT_MAX_BATCH      = int(os.getenv("SBERT_MAX_BATCH",        "16"))
+EMO_MAX_BATCH        = int(os.getenv("EMO_MAX_BATCH",          "8"))     # тексты до 512 токенов
+INFER_MAX_WAIT_MS    = float(os.getenv("INFER_MAX_WAIT_MS",    "10"))    # ожидание добора батча
+
+# --- Снимки FAISS ---
+FAISS_SNAPSHOT_DIR   = os.getenv("FAISS_SNAPSHOT_DIR", os.path.join(DATA_DIR, "faiss"))
+FAISS_SNAPSHOT_INTERVAL = float(os.getenv("FAISS_SNAPSHOT_INTERVAL", "600"))  # сек., 0 — только при остановке
+FAISS_MMAP           = os.getenv("FAISS_MMAP", "1") == "1"                    # отображать снимок в память
+FAISS_COMPACT_RATIO  = float(os.getenv("FAISS_COMPACT_RATIO",  "0.1"))  # доля надгробий до перестройки графа
+FAISS_FILTER_EXACT_MAX = int(os.getenv("FAISS_FILTER_EXACT_MAX", "2000"))  # узкий фильтр — точный перебор
+FAISS_FUSION_OVERSAMPLE = int(os.getenv("FAISS_FUSION_OVERSAMPLE", "2"))   # кандидатов на модальность = top_k * N
+FAISS_BATCH_OVERSAMPLE = int(os.getenv("FAISS_BATCH_OVERSAMPLE", "4"))    # запас пакетного поиска под пост-фильтр
+
+# --- Тип индекса FAISS ---
+# hnsw_flat | hnsw_sq8 | ivf_pq | opq_ivf_pq; сжатые типы обучаются на выборке векторов
+FAISS_INDEX_TYPE     = os.getenv("FAISS_INDEX_TYPE",     "hnsw_flat")
+FAISS_HNSW_M         = int(os.getenv("FAISS_HNSW_M",     "64"))
+FAISS_IVF_NLIST      = int(os.getenv("FAISS_IVF_NLIST",  "0"))       # 0 — подобрать по числу векторов
+FAISS_IVF_NPROBE     = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+FAISS_PQ_M           = int(os.getenv("FAISS_PQ_M",       "16"))      # подквантователей (делитель размерности)
+FAISS_TRAIN_SAMPLE   = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))
+FAISS_MIN_TRAIN      = int(os.getenv("FAISS_MIN_TRAIN",  "10000"))   # меньше — откат на hnsw_flat
@@ -1,34 +1,74 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, Session
-from config import DEFAULT_DATABASE_URL
-from models import Base
-import logging
-from typing import Generator
-
-logger = logging.getLogger(__name__)
-
-engine = create_engine(DEFAULT_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine)
-
-def init_db():
-    Base.metadata.create_all(bind=engine)
-    with engine.begin() as conn:
-        cols = [row[1] for row in conn.execute(text("PRAGMA table_info(lyrics)"))]
-        if 'genre' not in cols:
-            conn.execute(text("ALTER TABLE lyrics ADD COLUMN genre TEXT"))
-        if 'lyrics_hash' not in cols:
-            conn.execute(text("ALTER TABLE lyrics ADD COLUMN lyrics_hash TEXT"))
-        if 'sbert_embedding' not in cols:
-            conn.execute(text("ALTER TABLE lyrics ADD COLUMN sbert_embedding BLOB"))
-        if 'deep_emotion_vec' not in cols:
-            conn.execute(text("ALTER TABLE lyrics ADD COLUMN deep_emotion_vec BLOB"))
-    logger.info("База данных инициализирована и схема проверена")
-
-# Зависимость FastAPI
-
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
+import sqlite3
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker, Session
+from models import Base
+from storage import write_engine, read_engine
+import logging
+from typing import Generator
+
+logger = logging.getLogger(__name__)
+
+engine = write_engine
+SessionLocal = sessionmaker(bind=write_engine)
+# Только чтение (PRAGMA query_only): выборки для поиска, индексов и кешей
+ReadSessionLocal = sessionmaker(bind=read_engine)
+
+# Старые BLOB-колонки lyrics → колонки track_vectors
+LEGACY_VECTOR_COLUMNS = {"embedding": "e5", "sbert_embedding": "sbert", "deep_emotion_vec": "emotion"}
+
+def _move_vectors(conn, cols: list[str]):
+    """
+    Разовый перенос векторов из строк lyrics в track_vectors и удаление старых колонок
+    (на SQLite старше 3.35 колонки остаются, но обнуляются).
+    """
+    legacy = {old: new for old, new in LEGACY_VECTOR_COLUMNS.items() if old in cols}
+    moved = conn.execute(text(
+        f"INSERT OR IGNORE INTO track_vectors (track_id, {', '.join(legacy.values())}) "
+        f"SELECT id, {', '.join(legacy)} FROM lyrics "
+        f"WHERE {' OR '.join(f'{old} IS NOT NULL' for old in legacy)}"
+    )).rowcount
+    for old in legacy:
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            conn.execute(text(f"ALTER TABLE lyrics DROP COLUMN {old}"))
+        else:
+            conn.execute(text(f"UPDATE lyrics SET {old} = NULL WHERE {old} IS NOT NULL"))
+    logger.info(f"Векторы {moved} треков перенесены в track_vectors; место в файле БД вернёт VACUUM")
+
+def init_db():
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        cols = [row[1] for row in conn.execute(text("PRAGMA table_info(lyrics)"))]
+        if 'genre' not in cols:
+            conn.execute(text("ALTER TABLE lyrics ADD COLUMN genre TEXT"))
+        if 'lyrics_hash' not in cols:
+            conn.execute(text("ALTER TABLE lyrics ADD COLUMN lyrics_hash TEXT"))
+        if 'updated_at' not in cols:
+            conn.execute(text("ALTER TABLE lyrics ADD COLUMN updated_at DATETIME"))
+        # Уникальный индекс по ключу создаётся после слияния дубликатов (services.duplicates)
+        if 'match_key' not in cols:
+            conn.execute(text("ALTER TABLE lyrics ADD COLUMN match_key VARCHAR(420)"))
+        if any(old in cols for old in LEGACY_VECTOR_COLUMNS):
+            _move_vectors(conn, cols)
+        vector_cols = [row[1] for row in conn.execute(text("PRAGMA table_info(track_vectors)"))]
+        if 'e5_scheme' not in vector_cols:
+            conn.execute(text("ALTER TABLE track_vectors ADD COLUMN e5_scheme INTEGER"))
+        # Векторы треков, удалённых в обход ORM
+        conn.execute(text("DELETE FROM track_vectors WHERE track_id NOT IN (SELECT id FROM lyrics)"))
+    logger.info("База данных инициализирована и схема проверена")
+
+# Зависимость FastAPI
+
+def get_db() -> Generator[Session, None, None]:
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db() -> Generator[Session, None, None]:
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
         db.close()
\ No newline at end of file
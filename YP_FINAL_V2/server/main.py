@@ -1,41 +1,90 @@
-import asyncio
-
-from fastapi import FastAPI
-from config import logger, GENIUS_TOKEN
-import lyricsgenius
-
-from database import init_db
-from services.faiss_index import faiss_service
-from services.idf_cache import idf_service
-from api.endpoints import router as api_router
-
-# 1) Инициализация БД и схемы
-init_db()
-
-# 2) Построение FAISS-индекса
-faiss_service.build_index()
-
-# 3) Первичный расчёт IDF-кеша
-idf_service.refresh()
-
-app = FastAPI(title="Lyrics Semantic API")
-
-genius = lyricsgenius.Genius(GENIUS_TOKEN)
-genius.verbose = False
-genius.remove_section_headers = True
-
-def start_periodic_tasks():
-    async def refresh_idf():
-        while True:
-            await asyncio.sleep(3600)  # каждый час
-            idf_service.refresh()
-            logger.info("Periodic IDF cache refresh complete")
-    asyncio.create_task(refresh_idf())
-
-@app.on_event("startup")
-async def startup_tasks():
-    start_periodic_tasks()
-    logger.info("FastAPI startup complete, background tasks running")
-
-app.include_router(api_router)
-logger.info("FastAPI приложение инициализировано, FAISS-индекс и IDF-кеш готовы")
+import asyncio
+
+from fastapi import FastAPI
+from config import logger, GENIUS_TOKEN, FAISS_SNAPSHOT_INTERVAL, SQLITE_CHECKPOINT_INTERVAL
+import lyricsgenius
+
+from database import init_db, ReadSessionLocal
+from storage import checkpoint
+from services.duplicates import ensure_unique_keys
+from services.vector_store import count_stale_e5
+from services.faiss_index import faiss_service
+from services.feature_store import feature_store
+from services.idf_cache import idf_service
+from services.jobs import ingest_queue
+from services.external_io import external_io
+from services.request_log import request_log
+from api.endpoints import router as api_router
+
+# 1) Инициализация БД и схемы; при первом запуске с match_key — слияние дубликатов
+init_db()
+ensure_unique_keys()
+with ReadSessionLocal() as db:
+    stale_e5 = count_stale_e5(db)
+if stale_e5:
+    logger.warning(f"{stale_e5} векторов E5 прежней схемы: пересчёт — python -m tools.reencode_e5")
+
+# 2) FAISS-индекс: снимок с диска + догрузка новых строк (или полная сборка в фоне)
+faiss_service.load_or_build(background=True)
+
+# 3) Хранилище признаков для ранжирования в /find_similar
+feature_store.load()
+
+# 4) Счётчики IDF (при первом запуске заполняются полным пересчётом)
+idf_service.load()
+
+app = FastAPI(title="Lyrics Semantic API")
+
+genius = lyricsgenius.Genius(GENIUS_TOKEN)
+genius.verbose = False
+genius.remove_section_headers = True
+
+def start_periodic_tasks():
+    async def check_idf():
+        while True:
+            await asyncio.sleep(3600)  # каждый час
+            try:
+                corrected = await asyncio.to_thread(idf_service.check)
+                logger.info(f"Periodic IDF consistency check complete, corrected {corrected}")
+            except Exception:
+                logger.exception("Не удалось сверить счётчики IDF")
+    asyncio.create_task(check_idf())
+
+    async def snapshot_faiss():
+        while True:
+            await asyncio.sleep(FAISS_SNAPSHOT_INTERVAL)
+            try:
+                await asyncio.to_thread(faiss_service.write_snapshot)
+            except Exception:
+                logger.exception("Не удалось записать снимок FAISS")
+    if FAISS_SNAPSHOT_INTERVAL > 0:
+        asyncio.create_task(snapshot_faiss())
+
+    async def checkpoint_wal():
+        while True:
+            await asyncio.sleep(SQLITE_CHECKPOINT_INTERVAL)
+            try:
+                await asyncio.to_thread(checkpoint)
+            except Exception:
+                logger.exception("Не удалось выполнить checkpoint WAL")
+    if SQLITE_CHECKPOINT_INTERVAL > 0:
+        asyncio.create_task(checkpoint_wal())
+
+@app.on_event("startup")
+async def startup_tasks():
+    start_periodic_tasks()
+    logger.info("FastAPI startup complete, background tasks running")
+
+@app.on_event("shutdown")
+async def shutdown_tasks():
+    ingest_queue.shutdown()
+    external_io.shutdown()
+    faiss_service.write_snapshot()
+    # Накопленные строки журнала дописываются до checkpoint
+    request_log.shutdown()
+    # WAL переносится в основной файл БД и обрезается: файл БД самодостаточен после остановки
+    checkpoint("TRUNCATE")
+    logger.info("Очередь загрузки и внешний I/O остановлены, снимок FAISS сохранён, журнал дописан, WAL перенесён в БД")
+
+app.include_router(api_router)
+logger.info("FastAPI приложение инициализировано, FAISS-индекс, хранилище признаков и IDF-кеш готовы")
@@ -1,31 +1,93 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, BLOB, JSON
-from sqlalchemy.orm import declarative_base
-from datetime import datetime
-
-Base = declarative_base()
-
-class Lyrics(Base):
-    __tablename__ = "lyrics"
-
-    id              = Column(Integer, primary_key=True)
-    track_name      = Column(String(200), index=True)
-    artist          = Column(String(200), index=True)
-    lyrics          = Column(Text)
-    embedding       = Column(BLOB)
-    sbert_embedding = Column(BLOB)
-    deep_emotion    = Column(Float)
-    deep_emotion_vec= Column(BLOB)
-    themes          = Column(JSON, default=list)
-    genre           = Column(JSON, default=list)
-    created_at      = Column(DateTime, default=datetime.utcnow)
-    lyrics_hash     = Column(String(32), index=True)
-
-class Log(Base):
-    __tablename__ = "logs"
-
-    id          = Column(Integer, primary_key=True)
-    timestamp   = Column(DateTime, default=datetime.utcnow)
-    ip_address  = Column(String(15))
-    operation   = Column(String(50))
-    status      = Column(String(20))
-    device_info = Column(Text)
\ No newline at end of file
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, BLOB, JSON, Boolean, ForeignKey
+from sqlalchemy.orm import declarative_base, relationship
+from datetime import datetime
+
+Base = declarative_base()
+
+
+def _vector_attr(name: str) -> property:
+    """
+    Прежний атрибут строки lyrics (embedding и т.п.), проксирующий в TrackVectors:
+    чтение подгружает векторы трека отдельным запросом, запись создаёт их при необходимости.
+    """
+    def get(self):
+        return getattr(self.vectors, name) if self.vectors is not None else None
+
+    def set(self, value):
+        if self.vectors is None:
+            self.vectors = TrackVectors()
+        setattr(self.vectors, name, value)
+
+    return property(get, set)
+
+
+class Lyrics(Base):
+    __tablename__ = "lyrics"
+
+    id              = Column(Integer, primary_key=True)
+    track_name      = Column(String(200), index=True)
+    artist          = Column(String(200), index=True)
+    match_key       = Column(String(420), unique=True, index=True)  # normalize.match_key
+    lyrics          = Column(Text)
+    deep_emotion    = Column(Float)
+    themes          = Column(JSON, default=list)
+    genre           = Column(JSON, default=list)
+    created_at      = Column(DateTime, default=datetime.utcnow)
+    updated_at      = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    lyrics_hash     = Column(String(32), index=True)
+
+    # Векторы лежат в track_vectors и читаются только при обращении
+    vectors = relationship("TrackVectors", uselist=False, lazy="select", cascade="all, delete-orphan")
+
+    embedding        = _vector_attr("e5")
+    sbert_embedding  = _vector_attr("sbert")
+    deep_emotion_vec = _vector_attr("emotion")
+
+class TrackVectors(Base):
+    __tablename__ = "track_vectors"
+
+    track_id = Column(Integer, ForeignKey("lyrics.id", ondelete="CASCADE"), primary_key=True)
+    e5       = Column(BLOB)     # float32, эмбеддинг E5
+    sbert    = Column(BLOB)     # float32, эмбеддинг SBERT
+    emotion  = Column(BLOB)     # float32, вектор эмоций
+    e5_scheme = Column(Integer) # vector_store.E5_SCHEME; NULL — чанки по 200 слов (до окон токенов)
+
+class TagFrequency(Base):
+    __tablename__ = "tag_frequency"
+
+    kind = Column(String(1), primary_key=True)    # "g" — жанр, "t" — тема, "n" — всего документов
+    tag  = Column(String(200), primary_key=True)  # для "n" — пустая строка
+    docs = Column(Integer, default=0)             # строк lyrics с этим тегом
+
+class Log(Base):
+    __tablename__ = "logs"
+
+    id          = Column(Integer, primary_key=True)
+    timestamp   = Column(DateTime, default=datetime.utcnow)
+    ip_address  = Column(String(15))
+    operation   = Column(String(50))
+    status      = Column(String(20))
+    device_info = Column(Text)
+
+class GeniusCache(Base):
+    __tablename__ = "genius_cache"
+
+    key           = Column(String(420), primary_key=True)  # normalize.match_key
+    track_name    = Column(String(200))
+    artist        = Column(String(200))
+    found         = Column(Boolean, default=True)           # False — негативный кеш
+    lyrics        = Column(Text)
+    genius_artist = Column(String(200))
+    song_id       = Column(Integer)
+    fetched_at    = Column(DateTime, default=datetime.utcnow, index=True)
+
+class LastfmCache(Base):
+    __tablename__ = "lastfm_cache"
+
+    key         = Column(String(600), primary_key=True)  # метод + нормализованные параметры
+    method      = Column(String(40), index=True)
+    payload     = Column(Text)                           # JSON-ответ
+    negative    = Column(Boolean, default=False)         # «не найдено»
+    size        = Column(Integer, default=0)             # байт в payload
+    fetched_at  = Column(DateTime, default=datetime.utcnow, index=True)
+    expires_at  = Column(DateTime, index=True)
\ No newline at end of file
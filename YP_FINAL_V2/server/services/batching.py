@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Sequence
+
+from config import logger
+from .metrics import Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+
+class MicroBatcher:
+    """
+    Динамический микробатчинг для модели: запросы конкурентных вызывающих
+    копятся до max_batch элементов или max_wait_ms с момента первого запроса
+    и прогоняются одним вызовом batch_fn в выделенном потоке.
+    Результаты возвращаются через concurrent.futures.Future.
+
+    batch_fn принимает список входов и возвращает последовательность
+    результатов той же длины и в том же порядке.
+    """
+    def __init__(self, name: str, batch_fn: Callable[[list], Sequence], max_batch: int, max_wait_ms: float):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[tuple[Any, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_latency_ms = Histogram(QUEUE_LATENCY_BUCKETS_MS)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=f"batcher-{self.name}", daemon=True)
+                self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        self._ensure_thread()
+        future: Future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def submit_many(self, items: Sequence) -> list[Future]:
+        return [self.submit(item) for item in items]
+
+    def run(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self.batch_sizes.observe(len(batch))
+            for _, _, enqueued in batch:
+                self.queue_latency_ms.observe((started - enqueued) * 1000)
+
+            try:
+                results = self.batch_fn([item for item, _, _ in batch])
+            except Exception as e:
+                logger.exception(f"Ошибка батча модели {self.name} ({len(batch)} шт.)")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch":        self.max_batch,
+            "max_wait_ms":      self.max_wait * 1000,
+            "queued":           self._queue.qsize(),
+            "batch_size":       self.batch_sizes.snapshot(),
+            "queue_latency_ms": self.queue_latency_ms.snapshot(),
+        }
@@ -0,0 +1,116 @@
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import bindparam, func, inspect, select, text, update
+
+from config import logger
+from database import SessionLocal, engine
+from models import Lyrics
+from .faiss_index import faiss_service
+from .feature_store import feature_store
+from .idf_cache import idf_service  # слушатели счётчиков IDF должны видеть удаления
+from .normalize import match_key
+from .result_cache import result_cache
+
+MATCH_KEY_INDEX = "ix_lyrics_match_key"
+BACKFILL_CHUNK = 1000
+
+
+def has_unique_index() -> bool:
+    return any(ix["name"] == MATCH_KEY_INDEX for ix in inspect(engine).get_indexes("lyrics"))
+
+
+def backfill_keys(db) -> int:
+    """
+    Заполняет match_key у строк, где его нет (записи до появления колонки).
+    updated_at не трогается: иначе все треки разом стали бы «свежими».
+    """
+    table = Lyrics.__table__
+    rows = db.execute(
+        select(table.c.id, table.c.track_name, table.c.artist).where(table.c.match_key == None)
+    ).all()
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(match_key=bindparam("key"), updated_at=table.c.updated_at)
+    )
+    for start in range(0, len(rows), BACKFILL_CHUNK):
+        db.execute(stmt, [
+            {"row_id": i, "key": match_key(track or "", artist or "")}
+            for i, track, artist in rows[start:start + BACKFILL_CHUNK]
+        ])
+    return len(rows)
+
+
+def _keep_order(obj: Lyrics) -> tuple:
+    # По убыванию: проанализированные, затем самые свежие, затем меньший id
+    analyzed = bool(obj.embedding and obj.sbert_embedding and obj.deep_emotion_vec)
+    return analyzed, obj.updated_at or obj.created_at or datetime.min, -obj.id
+
+
+def _forget(ids: list[int]):
+    """
+    Снимает удалённые строки с индексов этого процесса: FAISS, хранилище признаков, кеш ответов.
+    """
+    tracks = []
+    for obj_id in ids:
+        genres, themes = feature_store.tags(obj_id)
+        faiss_service.remove(obj_id)
+        feature_store.remove(obj_id)
+        tracks.append((obj_id, genres, themes))
+    result_cache.invalidate_tracks(tracks)
+
+
+def merge_duplicates(dry_run: bool = False) -> dict:
+    """
+    Разовая задача: сливает строки lyrics с одинаковым match_key в одну.
+    Из группы остаётся проанализированная и самая свежая строка, остальные
+    удаляются через ORM (вместе с векторами, счётчики IDF меняются на дельту;
+    на БД без счётчиков они сперва заполняются полным пересчётом, иначе
+    дельты удалений легли бы в пустую таблицу отрицательными значениями).
+    Затем создаётся уникальный индекс по match_key — после него дубликаты
+    не появляются: загрузка пишет через INSERT ... ON CONFLICT.
+    Запускается при старте, пока индекса нет, или вручную: python -m tools.merge_duplicates.
+    Удалённые строки сразу снимаются с FAISS, хранилища признаков и кеша ответов
+    этого процесса; снимок FAISS другого процесса догонит БД при старте (replay).
+    """
+    if not dry_run:
+        idf_service.load()
+    db = SessionLocal()
+    try:
+        filled = backfill_keys(db)
+        keys = [k for k, in db.query(Lyrics.match_key).group_by(Lyrics.match_key).having(func.count() > 1)]
+        groups, removed = 0, []
+        for start in range(0, len(keys), BACKFILL_CHUNK):
+            objs = db.query(Lyrics).filter(
+                Lyrics.match_key.in_(keys[start:start + BACKFILL_CHUNK])
+            ).order_by(Lyrics.match_key).all()
+            for _, group in groupby(objs, key=lambda o: o.match_key):
+                extra = sorted(group, key=_keep_order, reverse=True)[1:]
+                groups += 1
+                removed += [obj.id for obj in extra]
+                if not dry_run:
+                    for obj in extra:
+                        db.delete(obj)
+            if not dry_run:
+                db.flush()
+        if dry_run:
+            db.rollback()
+        else:
+            db.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {MATCH_KEY_INDEX} ON lyrics (match_key)"))
+            db.commit()
+    finally:
+        db.close()
+    if not dry_run and removed:
+        _forget(removed)
+    result = {"keys_filled": filled, "groups": groups, "removed": len(removed), "dry_run": dry_run}
+    logger.info(f"Дубликаты lyrics: {result}")
+    return result
+
+
+def ensure_unique_keys():
+    """
+    Старт сервиса: без уникального индекса (БД до появления match_key) — слияние дубликатов.
+    """
+    if not has_unique_index():
+        merge_duplicates()
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import (
+    logger,
+    LASTFM_API_URL, LASTFM_WEB_URL,
+    GENIUS_API_ROOT, GENIUS_PUBLIC_API_ROOT, GENIUS_WEB_ROOT,
+    HTTP_MAX_CONNECTIONS, HTTP_TIMEOUT,
+    LASTFM_CONCURRENCY, GENIUS_CONCURRENCY
+)
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+class ExternalIO:
+    """
+    Слой внешнего I/O: отдельный поток с event loop, общий keep-alive пул httpx
+    и ограничение числа одновременных запросов на каждый хост.
+
+    Синхронный код (воркеры очереди) отправляет корутины через submit()
+    и получает concurrent.futures.Future, поэтому сетевые запросы
+    идут параллельно с инференсом моделей в вызывающем потоке.
+    """
+    def __init__(self, host_limits: dict[str, int], default_limit: int, max_connections: int, timeout: float):
+        self.host_limits = host_limits
+        self.default_limit = default_limit
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._inflight: dict[str, int] = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="external-io", daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro: Coroutine) -> Any:
+        return self.submit(coro).result()
+
+    def _client_for_loop(self) -> httpx.AsyncClient:
+        # Клиент создаётся внутри loop при первом запросе
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.host_limits.get(host, self.default_limit))
+            self._semaphores[host] = sem
+        return sem
+
+    async def _limited(self, host: str, coro: Coroutine) -> Any:
+        async with self._semaphore(host):
+            self._inflight[host] = self._inflight.get(host, 0) + 1
+            try:
+                return await coro
+            finally:
+                self._inflight[host] -= 1
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self._limited(host_of(url), self._client_for_loop().get(url, **kwargs))
+
+    async def call_blocking(self, host: str, fn: Callable, *args) -> Any:
+        """
+        Синхронный клиент (lyricsgenius) в пуле потоков под лимитом хоста.
+        """
+        return await self._limited(host, asyncio.to_thread(fn, *args))
+
+    def stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "hosts": {
+                host: {
+                    "limit":     self.host_limits.get(host, self.default_limit),
+                    "in_flight": self._inflight.get(host, 0),
+                }
+                for host in list(self._semaphores)
+            },
+        }
+
+    def shutdown(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._client is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(timeout=5)
+            except Exception as e:
+                logger.warning(f"Не удалось закрыть HTTP-клиент: {e!r}")
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+
+
+# Singleton instance
+external_io = ExternalIO(
+    host_limits={
+        host_of(LASTFM_API_URL):         LASTFM_CONCURRENCY,
+        host_of(LASTFM_WEB_URL):         LASTFM_CONCURRENCY,
+        host_of(GENIUS_API_ROOT):        GENIUS_CONCURRENCY,
+        host_of(GENIUS_PUBLIC_API_ROOT): GENIUS_CONCURRENCY,
+        host_of(GENIUS_WEB_ROOT):        GENIUS_CONCURRENCY,
+    },
+    default_limit=LASTFM_CONCURRENCY,
+    max_connections=HTTP_MAX_CONNECTIONS,
+    timeout=HTTP_TIMEOUT,
+)
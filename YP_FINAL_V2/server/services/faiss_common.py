@@ -0,0 +1,173 @@
+import json
+from datetime import datetime
+from typing import Iterable, Optional
+
+import numpy as np
+import faiss
+from config import (
+    logger, SBERT_WEIGHT, E5_WEIGHT, EMO_WEIGHT,
+    FAISS_HNSW_M, FAISS_IVF_NLIST, FAISS_IVF_NPROBE, FAISS_PQ_M, FAISS_TRAIN_SAMPLE, FAISS_MIN_TRAIN
+)
+
+# Модальности: у каждой свой индекс, слияние — во время запроса
+MODALITIES = ("e5", "sbert", "emotion")
+
+# Семейства базовых индексов; сжатые требуют обучения на выборке векторов
+INDEX_TYPES = ("hnsw_flat", "hnsw_sq8", "ivf_pq", "opq_ivf_pq")
+TRAINED_TYPES = ("ivf_pq", "opq_ivf_pq")
+
+
+def default_weights() -> dict[str, float]:
+    return {"e5": E5_WEIGHT, "sbert": SBERT_WEIGHT, "emotion": EMO_WEIGHT}
+
+
+def normalize(vec: np.ndarray) -> np.ndarray:
+    return (vec / (np.linalg.norm(vec) + 1e-10)).astype(np.float32)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    return (matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-10)).astype(np.float32)
+
+
+def modality_vectors(e5: np.ndarray, sb: np.ndarray, emo: np.ndarray) -> dict[str, np.ndarray]:
+    return {"e5": normalize(e5), "sbert": normalize(sb), "emotion": normalize(emo)}
+
+
+def row_vectors(obj) -> dict[str, np.ndarray]:
+    return modality_vectors(
+        np.frombuffer(obj.embedding, dtype=np.float32),
+        np.frombuffer(obj.sbert_embedding, dtype=np.float32),
+        np.frombuffer(obj.deep_emotion_vec, dtype=np.float32),
+    )
+
+
+def row_stamp(obj) -> Optional[datetime]:
+    return obj.updated_at or obj.created_at
+
+
+def pq_subquantizers(dim: int, target: int = FAISS_PQ_M) -> int:
+    # PQ делит вектор на равные части: берём наибольший делитель размерности не больше target
+    return max(m for m in range(1, min(target, dim) + 1) if dim % m == 0)
+
+
+def index_spec(kind: str, dim: int, n: int) -> str:
+    """
+    Строка index_factory для семейства kind.
+    """
+    if kind == "hnsw_flat":
+        return f"HNSW{FAISS_HNSW_M}"
+    if kind == "hnsw_sq8":
+        return f"HNSW{FAISS_HNSW_M}_SQ8"
+    nlist = FAISS_IVF_NLIST or max(1, min(int(4 * np.sqrt(n)), n // 39))
+    pq = pq_subquantizers(dim)
+    if kind == "ivf_pq":
+        return f"IVF{nlist},PQ{pq}"
+    if kind == "opq_ivf_pq":
+        return f"OPQ{pq},IVF{nlist},PQ{pq}"
+    raise ValueError(f"Unknown FAISS index type: {kind}")
+
+
+def resolve_index_type(kind: str, n: int) -> str:
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {kind}")
+    if kind in TRAINED_TYPES and n < FAISS_MIN_TRAIN:
+        # 8-битным кодбукам PQ нужно ~10k точек, на малой базе обучение бессмысленно
+        logger.info(f"FAISS: {n} векторов мало для {kind}, используется hnsw_flat")
+        return "hnsw_flat"
+    return kind
+
+
+def tune_index(index):
+    """
+    Параметры поиска по умолчанию: efSearch для HNSW, nprobe для IVF.
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexPreTransform) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = 64
+    elif isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = FAISS_IVF_NPROBE
+    return index
+
+
+def make_index(kind: str, matrix: np.ndarray, chunk: int = 65536):
+    """
+    Строит базовый индекс семейства kind по матрице векторов.
+    Сжатые типы обучаются на случайной выборке до FAISS_TRAIN_SAMPLE строк.
+    """
+    n, dim = matrix.shape
+    kind = resolve_index_type(kind, n)
+    index = faiss.index_factory(dim, index_spec(kind, dim, n))
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = 128
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(n, min(n, FAISS_TRAIN_SAMPLE), replace=False))
+        index.train(np.ascontiguousarray(matrix[sample], dtype=np.float32))
+    for start in range(0, n, chunk):
+        index.add(np.ascontiguousarray(matrix[start:start + chunk], dtype=np.float32))
+    return tune_index(index)
+
+
+def search_params(index, k: int, sel=None):
+    """
+    SearchParameters под тип индекса; sel — необязательный IDSelector.
+    """
+    pretransform = isinstance(index, faiss.IndexPreTransform)
+    inner = faiss.downcast_index(index.index) if pretransform else index
+    if isinstance(inner, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = max(64, k)
+    elif isinstance(inner, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = inner.nprobe
+    else:
+        params = faiss.SearchParameters()
+    if sel is not None:
+        params.sel = sel
+        params.sel_ref = sel
+    if pretransform:
+        outer = faiss.SearchParametersPreTransform()
+        outer.index_params = params
+        # SWIG не держит ссылку на вложенные параметры
+        outer.index_params_ref = params
+        return outer
+    return params
+
+
+def new_delta(dim: int):
+    # Точный индекс с ключами = id строк lyrics, поддерживает замену и удаление
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+
+def as_ids(values) -> np.ndarray:
+    return np.asarray(list(values), dtype=np.int64)
+
+
+def _as_list(value) -> list:
+    # поддержка JSON-типа (list) и старых строковых колонок
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+        return value if isinstance(value, list) else []
+    return []
+
+
+def posting_keys(genres, themes) -> frozenset:
+    """
+    Ключи инвертированных списков трека: "g:<жанр>" и "t:<тема>".
+    """
+    return frozenset(
+        [f"g:{g}" for g in _as_list(genres)] + [f"t:{t}" for t in _as_list(themes)]
+    )
+
+
+def tag_names(keys: Iterable[str]) -> tuple[set[str], set[str]]:
+    """
+    Обратное к posting_keys: жанры и темы по ключам трека.
+    """
+    keys = list(keys)
+    return {k[2:] for k in keys if k.startswith("g:")}, {k[2:] for k in keys if k.startswith("t:")}
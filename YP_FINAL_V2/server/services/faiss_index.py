@@ -1,108 +1,416 @@
-import numpy as np
-import faiss
-from typing import List
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import Lyrics
-from config import SBERT_WEIGHT, E5_WEIGHT, EMO_WEIGHT
-
-class FaissIndexService:
-    def __init__(self):
-        self.index = None
-        self.id_map: List[int] = []
-        self.dim = None
-
-    def build_index(self):
-        db: Session = SessionLocal()
-        try:
-            from sqlalchemy import inspect
-            inspector = inspect(db.bind)
-            if 'lyrics' not in inspector.get_table_names():
-                return
-
-            objs = db.query(Lyrics).filter(
-                Lyrics.embedding != None,
-                Lyrics.sbert_embedding != None,
-                Lyrics.deep_emotion_vec != None
-            ).all()
-            if not objs:
-                return
-
-            vectors = []
-            self.id_map = []
-            for o in objs:
-                e5  = np.frombuffer(o.embedding, dtype=np.float32).copy()
-                sb  = np.frombuffer(o.sbert_embedding, dtype=np.float32).copy()
-                emo = np.frombuffer(o.deep_emotion_vec, dtype=np.float32).copy()
-
-                # normalize each segment
-                e5  /= (np.linalg.norm(e5)  + 1e-10)
-                sb  /= (np.linalg.norm(sb)  + 1e-10)
-                emo /= (np.linalg.norm(emo) + 1e-10)
-
-                # weighted concatenation
-                part = np.concatenate([
-                    E5_WEIGHT  * e5,
-                    SBERT_WEIGHT * sb,
-                    EMO_WEIGHT   * emo
-                ])
-                vec = part / (np.linalg.norm(part) + 1e-10)
-
-                vectors.append(vec)
-                self.id_map.append(o.id)
-
-            emb_matrix = np.vstack(vectors)
-            self.dim = emb_matrix.shape[1]
-
-            # HNSW parameters tuned for recall
-            self.index = faiss.IndexHNSWFlat(self.dim, 64)
-            self.index.hnsw.efConstruction = 128
-            self.index.hnsw.efSearch = 64
-            self.index.add(emb_matrix)
-        finally:
-            db.close()
-
-    def add(self, obj: Lyrics):
-        e5  = np.frombuffer(obj.embedding, dtype=np.float32).copy()
-        sb  = np.frombuffer(obj.sbert_embedding, dtype=np.float32).copy()
-        emo = np.frombuffer(obj.deep_emotion_vec, dtype=np.float32).copy()
-
-        e5  /= (np.linalg.norm(e5)  + 1e-10)
-        sb  /= (np.linalg.norm(sb)  + 1e-10)
-        emo /= (np.linalg.norm(emo) + 1e-10)
-
-        part = np.concatenate([
-            E5_WEIGHT   * e5,
-            SBERT_WEIGHT* sb,
-            EMO_WEIGHT  * emo
-        ])
-        vec = part / (np.linalg.norm(part) + 1e-10)
-
-        if self.index is None:
-            self.dim = vec.shape[0]
-            self.index = faiss.IndexHNSWFlat(self.dim, 64)
-            self.index.hnsw.efConstruction = 128
-            self.index.hnsw.efSearch = 64
-
-        self.index.add(vec.reshape(1, -1))
-        self.id_map.append(obj.id)
-
-    def search(self, query_e5: np.ndarray, query_sbert: np.ndarray, query_emo: np.ndarray, top_k: int) -> List[int]:
-        q_e5  = query_e5   / (np.linalg.norm(query_e5)  + 1e-10)
-        q_sb  = query_sbert/ (np.linalg.norm(query_sbert)+ 1e-10)
-        q_emo = query_emo  / (np.linalg.norm(query_emo)  + 1e-10)
-
-        part = np.concatenate([
-            E5_WEIGHT   * q_e5,
-            SBERT_WEIGHT* q_sb,
-            EMO_WEIGHT  * q_emo
-        ])
-        q_vec = part / (np.linalg.norm(part) + 1e-10)
-
-        if self.index is None or not self.id_map:
-            return []
-        _, idxs = self.index.search(q_vec.reshape(1, -1), min(top_k, len(self.id_map)))
-        return [self.id_map[i] for i in idxs[0] if i < len(self.id_map)]
-
-# Singleton instance
-faiss_service = FaissIndexService()
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from database import ReadSessionLocal
+from models import Lyrics
+from .vector_store import analyzed_tracks, read_vectors, count_vectors
+from .result_cache import result_cache
+from .faiss_common import (
+    MODALITIES, default_weights, modality_vectors, normalize_rows, row_vectors, row_stamp,
+    make_index, as_ids, posting_keys, tag_names
+)
+from .faiss_snapshot import Snapshot, SnapshotStore
+from .faiss_search import SearchView
+from .faiss_state import IndexState
+from config import logger, FAISS_SNAPSHOT_DIR, FAISS_MMAP, FAISS_INDEX_TYPE
+
+# Строк на чтение при полной перестройке
+BUILD_CHUNK = 1000
+
+
+class RebuildProgress:
+    """
+    Ход фоновой перестройки индекса: этап (read → build → swap → snapshot),
+    сделано / всего на этапе, время начала и конца, ошибка.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self._state = {"state": "idle"}
+
+    def start(self):
+        with self._lock:
+            self.running = True
+            self._state = {"state": "running", "phase": "start", "done": 0, "total": 0,
+                           "started_at": datetime.utcnow().isoformat()}
+
+    def phase(self, name: str, total: int):
+        with self._lock:
+            self._state.update(phase=name, done=0, total=total)
+
+    def advance(self, n: int):
+        with self._lock:
+            self._state["done"] = self._state.get("done", 0) + n
+
+    def finish(self, error: Optional[str] = None):
+        with self._lock:
+            self.running = False
+            self._state.update(
+                state="failed" if error else "done", error=error,
+                finished_at=datetime.utcnow().isoformat()
+            )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._state)
+
+
+class FaissIndexService:
+    """
+    ANN-индексы по модальностям (E5, SBERT, эмоции), ключ — id строки lyrics;
+    веса модальностей применяются во время запроса (faiss_search.SearchView).
+    База — снимок на диске (faiss_snapshot), новые и заменённые векторы — в delta,
+    заменённые метки базы — надгробия (faiss_state.IndexState).
+    Перестройка и запись снимка идут без блокировки поиска; изменения за это время
+    копятся в state.touched и переносятся поверх новой базы.
+    """
+    def __init__(self, snapshot_dir: str = FAISS_SNAPSHOT_DIR, use_mmap: bool = FAISS_MMAP):
+        self.index_type = FAISS_INDEX_TYPE
+        self.store = SnapshotStore(snapshot_dir, use_mmap, self.index_type)
+        self.state = IndexState()
+        self.version = 0
+        # Растёт, только когда база собрана заново (перестройка, уплотнение, загрузка снимка).
+        # Слияние delta в базу переводит её треки из точного поиска в приближённый —
+        # их записи кеша ответов сбрасываются точечно, как и при загрузке треков
+        self.generation = 0
+        self.max_id = 0
+        self.watermark: Optional[datetime] = None
+        self._index_files: dict[str, str] = {}
+        self._base_mmapped = False
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()     # запись снимка и перестройка идут по одной
+        self._rebuild_guard = threading.Lock()
+        self.rebuild_progress = RebuildProgress()
+
+    # --- Построение и загрузка ---
+
+    def build_index(self) -> bool:
+        """
+        Полная перестройка из таблицы lyrics без блокировки поиска.
+        False — строить не из чего.
+        """
+        progress = self.rebuild_progress
+        with self._snapshot_lock:
+            with self._lock:
+                self.state.touched = set()
+            try:
+                built = self._build_generation(progress)
+            finally:
+                with self._lock:
+                    self.state.touched = None
+        return built
+
+    def _build_generation(self, progress: "RebuildProgress") -> bool:
+        db: Session = ReadSessionLocal()
+        try:
+            from sqlalchemy import inspect
+            inspector = inspect(db.bind)
+            if not {'lyrics', 'track_vectors'} <= set(inspector.get_table_names()):
+                return False
+
+            # Метаданные — лёгкие колонки lyrics; векторы — последовательным чтением track_vectors
+            meta = {
+                i: (posting_keys(genre, themes), updated_at or created_at)
+                for i, genre, themes, created_at, updated_at in db.query(
+                    Lyrics.id, Lyrics.genre, Lyrics.themes, Lyrics.created_at, Lyrics.updated_at
+                ).yield_per(BUILD_CHUNK)
+            }
+            progress.phase("read", count_vectors(db))
+            parts = {m: [] for m in MODALITIES}
+            ids, tags, stamps = [], {}, []
+            for chunk_ids, matrices in read_vectors(db, BUILD_CHUNK):
+                progress.advance(len(chunk_ids))
+                # Векторы треков, удалённых в обход ORM, пропускаются
+                keep = np.fromiter((int(i) in meta for i in chunk_ids), dtype=bool, count=len(chunk_ids))
+                if not keep.any():
+                    continue
+                for m in MODALITIES:
+                    parts[m].append(normalize_rows(matrices[m][keep]))
+                for i in chunk_ids[keep].tolist():
+                    tags[i], stamp = meta[i]
+                    ids.append(i)
+                    if stamp is not None:
+                        stamps.append(stamp)
+        finally:
+            db.close()
+        if not ids:
+            return False
+
+        vectors = {m: np.vstack(parts[m]) for m in MODALITIES}
+        del parts
+        progress.phase("build", len(MODALITIES))
+        indexes = {}
+        for m in MODALITIES:
+            indexes[m] = make_index(self.index_type, vectors[m])
+            progress.advance(1)
+
+        progress.phase("swap", 1)
+        with self._lock:
+            self.state.swap(indexes, vectors, as_ids(ids), set(), tags)
+            self._next_generation()
+            self.max_id = max(self.max_id, max(ids))
+            if stamps and (self.watermark is None or max(stamps) > self.watermark):
+                self.watermark = max(stamps)
+            self._index_files = {}
+            self._base_mmapped = False
+            self._dirty = True
+        progress.advance(1)
+        return True
+
+    def start_rebuild(self) -> bool:
+        """
+        Перестройка и запись снимка в фоновом потоке. False — она уже идёт.
+        """
+        with self._rebuild_guard:
+            if self.rebuild_progress.running:
+                return False
+            self.rebuild_progress.start()
+            threading.Thread(target=self._run_rebuild, name="faiss-rebuild", daemon=True).start()
+            return True
+
+    def _run_rebuild(self):
+        progress = self.rebuild_progress
+        try:
+            if self.build_index():
+                progress.phase("snapshot", 1)
+                self._write_snapshot()
+                progress.advance(1)
+                logger.info(f"FAISS: фоновая перестройка завершена ({len(self)} векторов)")
+            progress.finish()
+        except Exception as e:
+            logger.exception("FAISS: фоновая перестройка не удалась")
+            progress.finish(repr(e))
+
+    def _next_generation(self):
+        # Записи кеша ответов прежнего поколения по ключу уже не достать — память освобождается сразу
+        self.generation += 1
+        result_cache.clear()
+
+    def _load_tags(self, ids: Iterable[int]) -> dict[int, frozenset]:
+        wanted = set(ids)
+        db = ReadSessionLocal()
+        try:
+            return {
+                i: posting_keys(genre, themes)
+                for i, genre, themes in db.query(Lyrics.id, Lyrics.genre, Lyrics.themes).all()
+                if i in wanted
+            }
+        finally:
+            db.close()
+
+    def load_or_build(self, background: bool = False):
+        """
+        Старт: снимок с диска и догрузка строк новее него, иначе полная перестройка
+        (с background=True — в фоне, не задерживая старт).
+        """
+        meta = self.store.read_meta()
+        if meta is not None and self.store.valid(meta):
+            try:
+                self._load_snapshot(meta)
+                replayed = self.replay()
+                logger.info(
+                    f"FAISS: снимок v{self.version} загружен ({len(self.state.labels)} векторов), "
+                    f"догружено {replayed}"
+                )
+                return
+            except Exception:
+                logger.exception("FAISS: не удалось загрузить снимок, перестраиваем индекс")
+
+        if background:
+            self.start_rebuild()
+            logger.info("FAISS: действующего снимка нет, индекс строится в фоне")
+            return
+        if self.build_index():
+            self._write_snapshot()
+
+    def _load_snapshot(self, meta: dict):
+        snapshot = self.store.load(meta)
+        tags = self._load_tags(snapshot.id_map.tolist())
+        with self._lock:
+            self.state.swap(snapshot.indexes, snapshot.vectors, snapshot.id_map, snapshot.removed, tags)
+            self._next_generation()
+            self.version = meta["version"]
+            self.max_id = meta["max_id"]
+            self.watermark = datetime.fromisoformat(meta["watermark"]) if meta.get("watermark") else None
+            self._index_files = snapshot.index_files
+            self._base_mmapped = snapshot.mmapped
+            self._dirty = False
+
+    def replay(self) -> int:
+        """
+        Догружает строки, появившиеся или изменившиеся после снимка, и удаляет треки,
+        которых в БД больше нет. Строки с неизменными векторами пропускаются.
+        """
+        db: Session = ReadSessionLocal()
+        try:
+            query = analyzed_tracks(db)
+            conds = [Lyrics.id > self.max_id]
+            if self.watermark is not None:
+                conds.append(func.coalesce(Lyrics.updated_at, Lyrics.created_at) > self.watermark)
+            objs = query.filter(or_(*conds)).order_by(Lyrics.id).all()
+            db_ids = {i for i, in db.query(Lyrics.id).all()}
+        finally:
+            db.close()
+
+        for obj_id in [i for i in self.state.labels if i not in db_ids]:
+            self.remove(obj_id)
+
+        replayed = 0
+        for o in objs:
+            vecs = row_vectors(o)
+            label = self.state.labels.get(o.id)
+            if label is not None and all(
+                np.allclose(self.state.vectors[m][label], vecs[m], atol=1e-6) for m in MODALITIES
+            ):
+                continue
+            self._upsert(o.id, vecs, row_stamp(o), posting_keys(o.genre, o.themes))
+            replayed += 1
+        return replayed
+
+    # --- Обновление ---
+
+    def _upsert(self, obj_id: int, vecs: dict[str, np.ndarray], stamp: Optional[datetime], tags: frozenset):
+        with self._lock:
+            self.state.upsert(obj_id, vecs, tags)
+            self._dirty = True
+            self.max_id = max(self.max_id, obj_id)
+            if stamp is not None and (self.watermark is None or stamp > self.watermark):
+                self.watermark = stamp
+
+    def add(self, obj: Lyrics):
+        """
+        Добавляет или заменяет векторы трека; повторная загрузка не создаёт дубликатов.
+        """
+        self._upsert(obj.id, row_vectors(obj), row_stamp(obj), posting_keys(obj.genre, obj.themes))
+
+    def remove(self, obj_id: int) -> bool:
+        """
+        Удаляет трек из индекса. Возвращает False, если его там не было.
+        """
+        with self._lock:
+            found = self.state.remove(obj_id)
+            self._dirty = self._dirty or found
+            return found
+
+    # --- Снимки ---
+
+    def write_snapshot(self) -> bool:
+        """
+        Сливает базу и delta в новый снимок без блокировки поиска.
+        Во время фоновой перестройки ничего не делает — снимок запишет она сама.
+        """
+        if self.rebuild_progress.running:
+            return False
+        return self._write_snapshot()
+
+    def _write_snapshot(self) -> bool:
+        with self._snapshot_lock:
+            with self._lock:
+                state = self.state
+                if not self._dirty or not state.dims:
+                    return False
+                delta_ids = as_ids(state.delta_ids)
+                delta_vecs = state.delta_matrix(delta_ids)
+                base = Snapshot(
+                    dict(state.indexes), dict(state.vectors), state.id_map, set(state.removed),
+                    dict(self._index_files), self._base_mmapped
+                )
+                max_id, watermark, dims = self.max_id, self.watermark, dict(state.dims)
+                version = self.version + 1
+                state.touched = set()
+
+            try:
+                snapshot, rebuild = self.store.write(version, base, delta_ids, delta_vecs, dims, max_id, watermark)
+            except Exception:
+                with self._lock:
+                    state.touched = None
+                raise
+
+            with self._lock:
+                touched = state.swap(snapshot.indexes, snapshot.vectors, snapshot.id_map, snapshot.removed)
+                if rebuild:
+                    self._next_generation()
+                    moved = []
+                else:
+                    moved = [(i, *tag_names(state.tags.get(i, ()))) for i in delta_ids.tolist() if i not in touched]
+                self.version = version
+                self._index_files = snapshot.index_files
+                self._base_mmapped = snapshot.mmapped
+                self._dirty = bool(touched)
+
+            if moved:
+                result_cache.invalidate_tracks(moved)
+            self.store.remove_old(snapshot.meta)
+            logger.info(
+                f"FAISS: снимок v{version} записан ({snapshot.meta['count']} векторов"
+                f"{', индексы перестроены' if rebuild else ''})"
+            )
+            return True
+
+    # --- Поиск ---
+
+    def _view(self) -> SearchView:
+        with self._lock:
+            return self.state.view()
+
+    def search(
+        self, query_e5: np.ndarray, query_sbert: np.ndarray, query_emo: np.ndarray, top_k: int,
+        genres: Optional[Iterable[str]] = None, themes: Optional[Iterable[str]] = None,
+        weights: Optional[dict[str, float]] = None
+    ) -> List[int]:
+        """
+        Ближайшие треки по взвешенной сумме косинусов модальностей; weights переопределяет config.
+        С genres и themes фильтр «общий жанр и общая тема» применяется внутри поиска.
+        """
+        weights = {**default_weights(), **(weights or {})}
+        active = [m for m in MODALITIES if weights.get(m, 0) > 0]
+        if not active:
+            return []
+        q = modality_vectors(query_e5, query_sbert, query_emo)
+        return self._view().search(q, top_k, active, weights, genres, themes)
+
+    def search_batch(
+        self, queries_e5: np.ndarray, queries_sbert: np.ndarray, queries_emo: np.ndarray, top_k: int,
+        genres: Optional[list] = None, themes: Optional[list] = None,
+        weights: Optional[dict[str, float]] = None
+    ) -> List[List[int]]:
+        """
+        search() для нескольких запросов: строки матриц queries_*, genres/themes — по запросам.
+        """
+        weights = {**default_weights(), **(weights or {})}
+        active = [m for m in MODALITIES if weights.get(m, 0) > 0]
+        n = len(queries_e5)
+        if not active or not n:
+            return [[] for _ in range(n)]
+        rows = [modality_vectors(*vecs) for vecs in zip(queries_e5, queries_sbert, queries_emo)]
+        q = {m: np.vstack([r[m] for r in rows]) for m in MODALITIES}
+        return self._view().search_batch(q, n, top_k, active, weights, genres, themes)
+
+    def __len__(self) -> int:
+        return len(self.state)
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = self.state
+            return {
+                "version":    self.version,
+                "generation": self.generation,
+                "index_type": {m: type(index).__name__ for m, index in state.indexes.items()},
+                "modalities": dict(state.dims),
+                "vectors":    len(state),
+                "snapshot":   len(state.labels),
+                "removed":    len(state.removed),
+                "delta":      len(state.delta_ids),
+                "mmapped":    self._base_mmapped,
+                "dirty":      self._dirty,
+                "watermark":  self.watermark.isoformat() if self.watermark else None,
+                "rebuild":    self.rebuild_progress.snapshot(),
+            }
+
+# Singleton instance
+faiss_service = FaissIndexService()
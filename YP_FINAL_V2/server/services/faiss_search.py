@@ -0,0 +1,197 @@
+from typing import Iterable, List, Optional
+
+import numpy as np
+import faiss
+from config import FAISS_FILTER_EXACT_MAX, FAISS_FUSION_OVERSAMPLE, FAISS_BATCH_OVERSAMPLE
+from .faiss_common import MODALITIES, as_ids, search_params
+
+
+class SearchView:
+    """
+    Срез индекса для одного запроса: берётся под блокировкой, поиск по нему
+    идёт без неё. Запись подменяет захваченные объекты, а не меняет их (IndexState.unshare()).
+    """
+    __slots__ = ("indexes", "vectors", "id_map", "live", "postings", "n_labels", "selector", "deltas", "delta_tags")
+
+    def __init__(self, state):
+        self.indexes = state.indexes
+        self.vectors = state.vectors
+        self.id_map = state.id_map
+        self.live = state.live
+        self.postings = state.postings
+        self.n_labels = len(state.labels)
+        self.selector = state.base_selector()
+        self.deltas = state.deltas
+        # id треков delta → их жанры и темы на момент среза
+        self.delta_tags = {i: state.tags.get(i, frozenset()) for i in state.delta_ids}
+
+    def search_params(self, m: str, k: int):
+        return search_params(self.indexes[m], k, self.selector)
+
+    def filter_mask(self, genres: Iterable[str], themes: Iterable[str]) -> np.ndarray:
+        """
+        Маска меток базы: живые треки с общим жанром и общей темой.
+        """
+        def union(keys: list[str]) -> np.ndarray:
+            mask = np.zeros(len(self.id_map), dtype=bool)
+            for key in keys:
+                labels = self.postings.get(key)
+                if labels is not None:
+                    mask[labels] = True
+            return mask
+
+        return (
+            union([f"g:{g}" for g in genres])
+            & union([f"t:{t}" for t in themes])
+            & self.live
+        )
+
+    def delta_allowed(self, genres: Iterable[str], themes: Iterable[str]) -> list[int]:
+        genre_keys = {f"g:{g}" for g in genres}
+        theme_keys = {f"t:{t}" for t in themes}
+        return [i for i, tags in self.delta_tags.items() if tags & genre_keys and tags & theme_keys]
+
+    def base_candidates(self, m: str, q: np.ndarray, k: int, mask: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Метки кандидатов из базового индекса модальности m.
+        """
+        if mask is None:
+            k = min(k, self.n_labels)
+            params = self.search_params(m, k)
+        else:
+            k = min(k, int(mask.sum()))
+            bitmap = np.packbits(mask, bitorder="little")
+            params = search_params(self.indexes[m], k, faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap)))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        _, idxs = self.indexes[m].search(q.reshape(1, -1), k, params=params)
+        return idxs[0][idxs[0] >= 0]
+
+    def delta_candidates(self, active: list[str], q: dict, k: int, allowed: Optional[list[int]]) -> set[int]:
+        params = None
+        if allowed is not None:
+            if not allowed:
+                return set()
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(as_ids(allowed)))
+        k = min(k, len(self.delta_tags))
+        found = set()
+        for m in active:
+            _, ids = self.deltas[m].search(q[m].reshape(1, -1), k, params=params)
+            found.update(int(i) for i in ids[0] if i >= 0)
+        return found
+
+    def delta_scored(
+        self, active: list[str], q: dict, k: int, allowed: Optional[list[int]], weights: dict[str, float]
+    ) -> list[tuple[float, int]]:
+        return [
+            (sum(weights[m] * float(self.deltas[m].reconstruct(obj_id) @ q[m]) for m in active), obj_id)
+            for obj_id in self.delta_candidates(active, q, k, allowed)
+        ]
+
+    def search(
+        self, q: dict, top_k: int, active: list[str], weights: dict[str, float],
+        genres: Optional[Iterable[str]] = None, themes: Optional[Iterable[str]] = None
+    ) -> List[int]:
+        """
+        Кандидаты из индексов активных модальностей, точный пересчёт взвешенной суммой.
+        """
+        n_cand = top_k * FAISS_FUSION_OVERSAMPLE
+        filtered = genres is not None and themes is not None
+
+        scored = []
+        if self.indexes and self.n_labels:
+            mask = self.filter_mask(genres, themes) if filtered else None
+            if mask is not None and mask.sum() <= FAISS_FILTER_EXACT_MAX:
+                # Узкий фильтр: все разрешённые метки сразу идут на точный пересчёт,
+                # обход графа, где почти все узлы отсеяны, теряет полноту
+                labels = np.flatnonzero(mask)
+            else:
+                labels = np.unique(np.concatenate([
+                    self.base_candidates(m, q[m], n_cand, mask) for m in active
+                ]))
+            if len(labels):
+                score = sum(
+                    weights[m] * (self.vectors[m][labels] @ q[m]) for m in active
+                )
+                scored.extend(zip(score.tolist(), self.id_map[labels].tolist()))
+
+        if self.delta_tags:
+            allowed = self.delta_allowed(genres, themes) if filtered else None
+            scored.extend(self.delta_scored(active, q, n_cand, allowed, weights))
+
+        # У каждого id не более одного живого вектора — дубликатов нет по построению
+        scored.sort(key=lambda x: -x[0])
+        return [obj_id for _, obj_id in scored[:top_k]]
+
+    def search_batch(
+        self, q: dict, n: int, top_k: int, active: list[str], weights: dict[str, float],
+        genres: Optional[list] = None, themes: Optional[list] = None
+    ) -> List[List[int]]:
+        """
+        search() для n запросов (строки q[m]): один матричный поиск с запасом
+        FAISS_BATCH_OVERSAMPLE; узкие фильтры ищутся по отдельности.
+        """
+        n_cand = top_k * FAISS_FUSION_OVERSAMPLE
+        filtered = genres is not None and themes is not None
+
+        scored: list[list[tuple[float, int]]] = [[] for _ in range(n)]
+        if self.indexes and self.n_labels:
+            masks = [self.filter_mask(genres[i], themes[i]) for i in range(n)] if filtered else [None] * n
+            labels: list = [None] * n
+            k = min(n_cand * (FAISS_BATCH_OVERSAMPLE if filtered else 1), self.n_labels)
+            batched = []
+            for i, mask in enumerate(masks):
+                allowed = self.n_labels if mask is None else int(mask.sum())
+                if mask is not None and allowed <= FAISS_FILTER_EXACT_MAX:
+                    labels[i] = np.flatnonzero(mask)
+                elif mask is not None and k * allowed < 2 * n_cand * self.n_labels:
+                    # Фильтр отсекает слишком много: после пакетного поиска кандидатов
+                    # не хватит, сразу ищем с фильтром внутри индекса
+                    labels[i] = np.unique(np.concatenate([
+                        self.base_candidates(m, q[m][i], n_cand, mask) for m in active
+                    ]))
+                else:
+                    batched.append(i)
+
+            if batched:
+                found = {i: [] for i in batched}
+                for m in active:
+                    _, idxs = self.indexes[m].search(q[m][batched], k, params=self.search_params(m, k))
+                    for row, i in enumerate(batched):
+                        found[i].append(idxs[row][idxs[row] >= 0])
+                for i in batched:
+                    cand = np.unique(np.concatenate(found[i]))
+                    mask = masks[i]
+                    if mask is not None:
+                        cand = cand[mask[cand]]
+                        if len(cand) < min(n_cand, int(mask.sum())):
+                            cand = np.unique(np.concatenate([
+                                self.base_candidates(m, q[m][i], n_cand, mask) for m in active
+                            ]))
+                    labels[i] = cand
+
+            # Все пары (запрос, кандидат) одной выборкой векторов и построчным скалярным произведением
+            flat = np.concatenate(labels).astype(np.int64)
+            if len(flat):
+                owner = np.repeat(np.arange(n), [len(x) for x in labels])
+                scores = sum(
+                    weights[m] * np.einsum("ij,ij->i", self.vectors[m][flat], q[m][owner]) for m in active
+                )
+                ids = self.id_map[flat]
+                bounds = np.cumsum([0] + [len(x) for x in labels])
+                for i in range(n):
+                    part, part_ids = scores[bounds[i]:bounds[i + 1]], ids[bounds[i]:bounds[i + 1]]
+                    if len(part) > top_k:
+                        top = np.argpartition(-part, top_k)[:top_k]
+                        part, part_ids = part[top], part_ids[top]
+                    scored[i].extend(zip(part.tolist(), part_ids.tolist()))
+
+        if self.delta_tags:
+            for i in range(n):
+                allowed = self.delta_allowed(genres[i], themes[i]) if filtered else None
+                q_i = {m: q[m][i] for m in MODALITIES}
+                scored[i].extend(self.delta_scored(active, q_i, n_cand, allowed, weights))
+
+        for row in scored:
+            row.sort(key=lambda x: -x[0])
+        return [[obj_id for _, obj_id in row[:top_k]] for row in scored]
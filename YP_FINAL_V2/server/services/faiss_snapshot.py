@@ -0,0 +1,205 @@
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import faiss
+from sqlalchemy import func
+from database import ReadSessionLocal
+from models import Lyrics
+from config import logger, FAISS_COMPACT_RATIO
+from .faiss_common import MODALITIES, as_ids, make_index, tune_index
+
+# 5: E5 — окна токенов (vector_store.E5_SCHEME), снимки с прежними векторами перестраиваются
+SNAPSHOT_FORMAT = 5
+META_FILE = "snapshot.json"
+SNAPSHOT_PREFIXES = ("index-", "vectors-", "ids-", "removed-")
+
+# Флаг mmap без копирования (faiss >= 1.10) — индекс только для чтения
+MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+def save_matrix(path: str, parts: list[np.ndarray], dim: int) -> np.ndarray:
+    """
+    Пишет части матрицы в .npy по порядку, не собирая её целиком в памяти.
+    """
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(sum(len(p) for p in parts), dim))
+    start = 0
+    for part in parts:
+        out[start:start + len(part)] = part
+        start += len(part)
+    out.flush()
+    return out
+
+
+@dataclass
+class Snapshot:
+    """
+    База одного поколения: индексы, точные векторы, карта метка → id, надгробия.
+    """
+    indexes: dict
+    vectors: dict
+    id_map: np.ndarray
+    removed: set[int]
+    index_files: dict[str, str] = field(default_factory=dict)   # пусто — база собрана в памяти
+    mmapped: bool = False
+    meta: dict = field(default_factory=dict)
+
+
+class SnapshotStore:
+    """
+    Файлы снимков в snapshot_dir; действующий указан в snapshot.json.
+    """
+    def __init__(self, snapshot_dir: str, use_mmap: bool, index_type: str):
+        self.snapshot_dir = snapshot_dir
+        self.use_mmap = use_mmap
+        self.index_type = index_type
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.snapshot_dir, name)
+
+    def read_meta(self) -> Optional[dict]:
+        path = self._path(META_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"FAISS: повреждён {path}: {e!r}")
+            return None
+
+    def valid(self, meta: dict) -> bool:
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            return False
+        if meta.get("index_type") != self.index_type:
+            logger.info(f"FAISS: тип индекса сменился на {self.index_type}, снимок перестраивается")
+            return False
+        index_files = meta.get("index_files") or {}
+        vector_files = meta.get("vector_files") or {}
+        names = (
+            [index_files.get(m) for m in MODALITIES] + [vector_files.get(m) for m in MODALITIES]
+            + [meta.get("ids_file"), meta.get("removed_file")]
+        )
+        if not all(name and os.path.exists(self._path(name)) for name in names):
+            return False
+        # БД пересоздана или откатилась — снимок ссылается на чужие id
+        db = ReadSessionLocal()
+        try:
+            db_max_id = db.query(func.max(Lyrics.id)).scalar() or 0
+        finally:
+            db.close()
+        return db_max_id >= meta.get("max_id", 0)
+
+    def read_index(self, path: str):
+        index = faiss.read_index(path, MMAP_FLAG) if self.use_mmap else faiss.read_index(path)
+        return tune_index(index)
+
+    def read_vectors(self, path: str) -> np.ndarray:
+        return np.load(path, mmap_mode="r" if self.use_mmap else None)
+
+    def load(self, meta: dict) -> Snapshot:
+        index_files = {m: self._path(meta["index_files"][m]) for m in MODALITIES}
+        return Snapshot(
+            indexes={m: self.read_index(path) for m, path in index_files.items()},
+            vectors={m: self.read_vectors(self._path(meta["vector_files"][m])) for m in MODALITIES},
+            id_map=np.load(self._path(meta["ids_file"])),
+            removed=set(np.load(self._path(meta["removed_file"])).tolist()),
+            index_files=index_files,
+            mmapped=self.use_mmap,
+            meta=meta,
+        )
+
+    def write(
+        self, version: int, base: Snapshot, delta_ids: np.ndarray, delta_vecs: Optional[dict],
+        dims: dict[str, int], max_id: int, watermark: Optional[datetime]
+    ) -> tuple[Snapshot, bool]:
+        """
+        Пишет снимок version: база плюс delta; при избытке надгробий (FAISS_COMPACT_RATIO)
+        индексы перестраиваются из живых векторов. Возвращает снимок и признак перестройки.
+        """
+        removed = set(base.removed)
+        rebuild = not base.indexes or len(removed) > FAISS_COMPACT_RATIO * max(len(base.id_map), 1)
+        live = np.array([label not in removed for label in range(len(base.id_map))], dtype=bool)
+        new_ids = [base.id_map[live] if rebuild else base.id_map]
+        if delta_vecs is not None:
+            new_ids.append(delta_ids)
+        new_ids = np.concatenate(new_ids).astype(np.int64)
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        index_names = {m: f"index-{version:06d}-{m}.faiss" for m in MODALITIES}
+        vector_names = {m: f"vectors-{version:06d}-{m}.npy" for m in MODALITIES}
+        ids_name = f"ids-{version:06d}.npy"
+        removed_name = f"removed-{version:06d}.npy"
+        index_paths = {m: self._path(name) for m, name in index_names.items()}
+        vector_paths = {m: self._path(name) for m, name in vector_names.items()}
+        merged_indexes = {}
+        for m in MODALITIES:
+            parts = [base.vectors[m][live] if rebuild else base.vectors[m]] if base.indexes else []
+            if delta_vecs is not None:
+                parts.append(delta_vecs[m])
+            matrix = save_matrix(vector_paths[m], parts, dims[m])
+            if rebuild:
+                # Индекс перестраивается (и переобучается) только из живых векторов
+                merged = make_index(self.index_type, matrix)
+            else:
+                # mmap-индекс не изменяемый: для слияния читаем его копию с диска
+                merged = faiss.read_index(base.index_files[m]) if base.mmapped else faiss.clone_index(base.indexes[m])
+                if delta_vecs is not None:
+                    merged.add(delta_vecs[m])
+            del matrix
+            faiss.write_index(merged, index_paths[m])
+            merged_indexes[m] = tune_index(merged)
+        if rebuild:
+            removed = set()
+        np.save(self._path(ids_name), new_ids)
+        np.save(self._path(removed_name), as_ids(sorted(removed)))
+
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "index_type": self.index_type,
+            "index_files": index_names,
+            "vector_files": vector_names,
+            "ids_file": ids_name,
+            "removed_file": removed_name,
+            "dims": dims,
+            "count": len(new_ids) - len(removed),
+            "max_id": max_id,
+            "watermark": watermark.isoformat() if watermark else None,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        meta_path = self._path(META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        snapshot = Snapshot(
+            indexes={m: self.read_index(path) for m, path in index_paths.items()} if self.use_mmap else merged_indexes,
+            vectors={m: self.read_vectors(path) for m, path in vector_paths.items()},
+            id_map=new_ids,
+            removed=removed,
+            index_files=index_paths,
+            mmapped=self.use_mmap,
+            meta=meta,
+        )
+        return snapshot, rebuild
+
+    def remove_old(self, meta: dict):
+        """
+        Удаляет файлы снимков, кроме перечисленных в meta.
+        """
+        keep = (
+            set(meta["index_files"].values()) | set(meta["vector_files"].values())
+            | {meta["ids_file"], meta["removed_file"]}
+        )
+        for name in os.listdir(self.snapshot_dir):
+            if name in keep or not name.startswith(SNAPSHOT_PREFIXES):
+                continue
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                # Под Windows файл может быть ещё отображён в память — удалим в следующий раз
+                pass
@@ -0,0 +1,148 @@
+from typing import Optional
+
+import numpy as np
+import faiss
+from .faiss_common import MODALITIES, as_ids, new_delta
+from .faiss_search import SearchView
+
+
+class IndexState:
+    """
+    База (индексы, точные векторы, метки, надгробия) и delta с тегами треков.
+    Вызывается под блокировкой FaissIndexService.
+    """
+    def __init__(self):
+        self.indexes: dict[str, faiss.Index] = {}   # модальность → базовый индекс
+        self.vectors: dict[str, np.ndarray] = {}    # модальность → точные векторы базы по меткам
+        self.id_map = np.zeros(0, dtype=np.int64)   # метка базы → id трека
+        self.labels: dict[int, int] = {}            # id трека → живая метка базы
+        self.removed: set[int] = set()              # надгробия (метки базы)
+        self.live = np.zeros(0, dtype=bool)         # маска живых меток базы
+        self.tags: dict[int, frozenset] = {}        # id трека → ключи жанров и тем
+        self.postings: dict[str, np.ndarray] = {}   # ключ → метки базы
+        self.deltas: dict[str, faiss.Index] = {}    # точные индексы с ключами = id треков
+        self.delta_ids: set[int] = set()
+        self.dims: dict[str, int] = {}
+        self.touched: Optional[set[int]] = None     # id, изменённые во время записи снимка или перестройки
+        self._selector = None
+        self._shared = False                        # live и deltas захвачены срезом поиска
+
+    def __len__(self) -> int:
+        return len(self.labels) + len(self.delta_ids)
+
+    def swap(
+        self, indexes: dict, vectors: dict, id_map: np.ndarray, removed: set[int],
+        tags: Optional[dict[int, frozenset]] = None
+    ) -> set[int]:
+        """
+        Подменяет базу; треки из touched уходят в надгробия, их текущие векторы — в новый delta.
+        tags — теги нового поколения, если оно прочитано из БД. Возвращает touched.
+        """
+        touched, self.touched = self.touched or set(), None
+        kept = [i for i in self.delta_ids if i in touched]
+        current = self.delta_matrix(kept)
+        if tags is not None:
+            for obj_id in touched:
+                if obj_id in self.tags:
+                    tags[obj_id] = self.tags[obj_id]
+                else:
+                    tags.pop(obj_id, None)
+            self.tags = tags
+        self.indexes = indexes
+        self.vectors = vectors
+        self.id_map = id_map
+        self.removed = removed
+        self.labels = {int(i): label for label, i in enumerate(id_map) if label not in removed}
+        self.live = np.ones(len(id_map), dtype=bool)
+        if removed:
+            self.live[as_ids(removed)] = False
+        self._selector = None
+        self.build_postings()
+        self.dims = {m: index.d for m, index in indexes.items()}
+        # Треки, изменённые во время сборки: их версия в новой базе уже устарела
+        for obj_id in touched:
+            label = self.labels.pop(obj_id, None)
+            if label is not None:
+                self.removed.add(label)
+                self.live[label] = False
+        self.deltas, self.delta_ids = {}, set()
+        if current is not None:
+            for m in MODALITIES:
+                self.deltas[m] = new_delta(self.dims[m])
+                self.deltas[m].add_with_ids(current[m], as_ids(kept))
+            self.delta_ids = set(kept)
+        self._shared = False
+        return touched
+
+    def build_postings(self):
+        lists: dict[str, list[int]] = {}
+        for obj_id, label in self.labels.items():
+            for key in self.tags.get(obj_id, ()):
+                lists.setdefault(key, []).append(label)
+        self.postings = {key: np.asarray(sorted(v), dtype=np.int64) for key, v in lists.items()}
+
+    def delta_matrix(self, ids) -> Optional[dict[str, np.ndarray]]:
+        # Векторы delta по модальностям в порядке ids; None, если ids пуст
+        if not len(ids):
+            return None
+        return {m: np.vstack([self.deltas[m].reconstruct(int(i)) for i in ids]) for m in MODALITIES}
+
+    def drop(self, obj_id: int) -> bool:
+        """
+        Убирает живые векторы трека: метка базы уходит в надгробия, записи delta удаляются.
+        """
+        found = False
+        label = self.labels.pop(obj_id, None)
+        if label is not None or obj_id in self.delta_ids:
+            self.unshare()
+        if label is not None:
+            self.removed.add(label)
+            self.live[label] = False
+            self._selector = None
+            found = True
+        if obj_id in self.delta_ids:
+            for delta in self.deltas.values():
+                delta.remove_ids(as_ids([obj_id]))
+            self.delta_ids.discard(obj_id)
+            found = True
+        if self.touched is not None:
+            self.touched.add(obj_id)
+        return found
+
+    def upsert(self, obj_id: int, vecs: dict[str, np.ndarray], tags: frozenset):
+        self.drop(obj_id)
+        self.tags[obj_id] = tags
+        self.unshare()
+        for m in MODALITIES:
+            if m not in self.deltas:
+                self.dims[m] = vecs[m].shape[0]
+                self.deltas[m] = new_delta(self.dims[m])
+            self.deltas[m].add_with_ids(vecs[m].reshape(1, -1), as_ids([obj_id]))
+        self.delta_ids.add(obj_id)
+
+    def remove(self, obj_id: int) -> bool:
+        self.tags.pop(obj_id, None)
+        return self.drop(obj_id)
+
+    def base_selector(self):
+        """
+        IDSelector, исключающий надгробия базы (None, если их нет); строится один раз на набор.
+        """
+        if not self.removed:
+            return None
+        if self._selector is None:
+            excluded = faiss.IDSelectorBatch(as_ids(self.removed))
+            # Ссылка на вложенный селектор держится, пока жив внешний
+            self._selector = (excluded, faiss.IDSelectorNot(excluded))
+        return self._selector[1]
+
+    def unshare(self):
+        # Копирование при записи: маска и delta, которые видит взятый срез поиска, не меняются
+        if self._shared:
+            self.live = self.live.copy()
+            self.deltas = {m: faiss.clone_index(delta) for m, delta in self.deltas.items()}
+            self._shared = False
+
+    def view(self) -> SearchView:
+        self._shared = True
+        return SearchView(self)
@@ -0,0 +1,258 @@
+import threading
+from itertools import islice
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+from database import ReadSessionLocal
+from models import Lyrics
+from config import logger
+from .faiss_common import MODALITIES, row_vectors, _as_list
+from .vector_store import analyzed_tracks
+from .ranking import FeatureRows, TagIncidence, idf_vector
+
+LOAD_CHUNK = 1000
+
+
+class _Column:
+    """
+    Массив с запасом ёмкости: дописывание строк за амортизированное O(1).
+    """
+    def __init__(self, dtype, width: Optional[int] = None):
+        self.data = np.zeros((0,) if width is None else (0, width), dtype=dtype)
+        self.size = 0
+
+    def append(self, block: np.ndarray):
+        need = self.size + len(block)
+        if need > len(self.data):
+            grown = np.zeros((max(need, 2 * len(self.data), 1024),) + self.data.shape[1:], dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:need] = block
+        self.size = need
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class _TagColumn:
+    """
+    Жанры или темы всех строк в CSR-виде со своим словарём тег → id.
+    """
+    def __init__(self):
+        self.vocab: dict[str, int] = {}
+        self.terms: list[str] = []        # id → тег
+        self._idf: tuple = (None, 0, np.zeros(0))
+        self._set(TagIncidence(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)))
+
+    def _set(self, incidence: TagIncidence):
+        self.indptr = _Column(np.int64)
+        self.indptr.append(incidence.indptr)
+        self.indices = _Column(np.int64)
+        self.indices.append(incidence.indices)
+
+    def append(self, rows: list):
+        block = TagIncidence.from_sets([set(_as_list(tags)) for tags in rows], self.vocab)
+        if len(self.vocab) > len(self.terms):
+            self.terms.extend(islice(self.vocab, len(self.terms), None))
+        self.indptr.append(block.indptr[1:] + self.indices.size)
+        self.indices.append(block.indices)
+
+    def compact(self, rows: np.ndarray):
+        # Словарь сохраняется, чтобы id тегов не менялись
+        self._set(self.incidence().take(rows))
+
+    def incidence(self) -> TagIncidence:
+        return TagIncidence(self.indptr.view(), self.indices.view())
+
+    def names(self, row: int) -> set[str]:
+        return {self.terms[i] for i in self.incidence().row(row)}
+
+    def names_of(self, indices: np.ndarray) -> set[str]:
+        return {self.terms[i] for i in np.unique(indices)}
+
+    def idf(self, idf: dict[str, float]) -> np.ndarray:
+        # Вектор IDF по id тегов; пересчитывается при обновлении кеша IDF или словаря
+        source, size, weights = self._idf
+        if source is not idf or size != len(self.vocab):
+            weights = idf_vector(idf, self.vocab)
+            self._idf = (idf, len(self.vocab), weights)
+        return weights
+
+
+class FeatureStore:
+    """
+    Горячие данные /find_similar в памяти, в смежных массивах по номеру строки:
+    нормированные float32-векторы модальностей, число слов, id жанров и тем (CSR)
+    и пара (трек, артист). С ними ранжирование не читает строки lyrics из SQLite.
+
+    Строки только дописываются: при повторной загрузке трека старая строка
+    помечается мёртвой, а когда мёртвых становится больше COMPACT_RATIO,
+    массивы пересобираются из живых строк.
+    """
+    COMPACT_RATIO = 0.25
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.rows: dict[int, int] = {}   # id трека → живая строка
+        self.ids = _Column(np.int64)
+        self.live = _Column(bool)
+        self.vectors: dict[str, _Column] = {}
+        self.word_counts = _Column(np.int32)
+        self.names: list[tuple[str, str]] = []
+        self.genres = _TagColumn()
+        self.themes = _TagColumn()
+
+    def _set_rows(self, rows: FeatureRows):
+        self.vectors = {}
+        for m, matrix in rows.vectors.items():
+            self.vectors[m] = _Column(np.float32, matrix.shape[1])
+            self.vectors[m].append(matrix)
+        self.ids = _Column(np.int64)
+        self.ids.append(rows.ids)
+        self.live = _Column(bool)
+        self.live.append(np.ones(len(rows), dtype=bool))
+        self.word_counts = _Column(np.int32)
+        self.word_counts.append(rows.word_counts)
+        self.names = rows.names
+        self.rows = {int(i): row for row, i in enumerate(rows.ids)}
+
+    # --- Загрузка и обновление ---
+
+    def load(self):
+        """
+        Полная загрузка из таблицы lyrics (старт сервиса).
+        """
+        db: Session = ReadSessionLocal()
+        try:
+            query = analyzed_tracks(db).order_by(Lyrics.id).yield_per(LOAD_CHUNK)
+            with self._lock:
+                self._reset()
+                chunk = []
+                for obj in query:
+                    chunk.append(obj)
+                    if len(chunk) == LOAD_CHUNK:
+                        self._append(chunk)
+                        chunk = []
+                if chunk:
+                    self._append(chunk)
+        finally:
+            db.close()
+        logger.info(f"Хранилище признаков: загружено {len(self)} треков")
+
+    def _append(self, objs: list[Lyrics]):
+        for obj in objs:
+            row = self.rows.pop(obj.id, None)
+            if row is not None:
+                self.live.data[row] = False
+        vecs = [row_vectors(o) for o in objs]
+        start = self.ids.size
+        for m in MODALITIES:
+            if m not in self.vectors:
+                self.vectors[m] = _Column(np.float32, vecs[0][m].shape[0])
+            self.vectors[m].append(np.vstack([v[m] for v in vecs]))
+        self.ids.append(np.asarray([o.id for o in objs], dtype=np.int64))
+        self.live.append(np.ones(len(objs), dtype=bool))
+        self.word_counts.append(np.asarray([len((o.lyrics or "").split()) for o in objs], dtype=np.int32))
+        self.names.extend((o.track_name, o.artist) for o in objs)
+        self.genres.append([o.genre for o in objs])
+        self.themes.append([o.themes for o in objs])
+        for offset, obj in enumerate(objs):
+            self.rows[obj.id] = start + offset
+
+    def add(self, obj: Lyrics):
+        """
+        Добавляет или заменяет трек после загрузки.
+        """
+        with self._lock:
+            self._append([obj])
+            self._maybe_compact()
+
+    def remove(self, obj_id: int) -> bool:
+        with self._lock:
+            row = self.rows.pop(obj_id, None)
+            if row is None:
+                return False
+            self.live.data[row] = False
+            self._maybe_compact()
+            return True
+
+    def _maybe_compact(self):
+        dead = self.ids.size - len(self.rows)
+        if dead <= self.COMPACT_RATIO * max(self.ids.size, 1):
+            return
+        live = np.flatnonzero(self.live.view())
+        self._set_rows(self._take(live))
+        self.genres.compact(live)
+        self.themes.compact(live)
+
+    # --- Чтение ---
+
+    def _take(self, rows: np.ndarray) -> FeatureRows:
+        return FeatureRows(
+            self.ids.view()[rows],
+            [self.names[i] for i in rows],
+            {m: col.view()[rows] for m, col in self.vectors.items()},
+            self.word_counts.view()[rows],
+            self.genres.incidence().take(rows),
+            self.themes.incidence().take(rows),
+        )
+
+    def features(self, ids: Iterable[int]) -> FeatureRows:
+        """
+        Признаки треков в порядке ids; треков, которых нет в хранилище, в ответе нет.
+        """
+        with self._lock:
+            rows = [self.rows[i] for i in ids if i in self.rows]
+            return self._take(np.asarray(rows, dtype=np.int64))
+
+    def tags(self, obj_id: int) -> tuple[set[str], set[str]]:
+        """
+        Жанры и темы трека (для фильтра в FAISS); пустые, если трека нет.
+        """
+        with self._lock:
+            row = self.rows.get(obj_id)
+            if row is None:
+                return set(), set()
+            return self.genres.names(row), self.themes.names(row)
+
+    def tag_names(self, *parts: FeatureRows) -> tuple[set[str], set[str]]:
+        """
+        Все жанры и темы строк, взятых из хранилища через features().
+        """
+        with self._lock:
+            return (
+                self.genres.names_of(np.concatenate([p.genres.indices for p in parts])),
+                self.themes.names_of(np.concatenate([p.themes.indices for p in parts])),
+            )
+
+    def idf_vectors(self, genre_idf: dict[str, float], theme_idf: dict[str, float]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        IDF жанров и тем по id словаря; вызывать после features(), чтобы словарь покрывал выборку.
+        """
+        with self._lock:
+            return self.genres.idf(genre_idf), self.themes.idf(theme_idf)
+
+    def __contains__(self, obj_id: int) -> bool:
+        return obj_id in self.rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tracks": len(self.rows),
+                "rows":   self.ids.size,
+                "genres": len(self.genres.vocab),
+                "themes": len(self.themes.vocab),
+                "bytes":  sum(c.data.nbytes for c in self.vectors.values())
+                          + self.ids.data.nbytes + self.word_counts.data.nbytes
+                          + self.genres.indices.data.nbytes + self.themes.indices.data.nbytes,
+            }
+
+# Singleton instance
+feature_store = FeatureStore()
@@ -0,0 +1,75 @@
+import re
+from functools import cached_property
+
+import numpy as np
+
+from .semantic import semantic_encoder, e5_batcher, sbert_batcher
+from .emotion import emotion_batcher
+
+# Длина фрагментов для тем и SBERT в словах
+THEME_SNIPPET_WORDS = 512
+SBERT_SNIPPET_WORDS = 400
+
+_TOKEN_RE = re.compile(r"\b\w{3,}\b")
+
+
+class FeatureContext:
+    """
+    Признаки одного текста, вычисляемые не более одного раза за загрузку.
+
+    Текст один раз делится на слова и чанки E5, чанки один раз проходят через
+    модель; эмбеддинг документа и эмбеддинг для классификатора тем
+    получаются пулингом уже посчитанных чанков, без повторных прогонов.
+    """
+    def __init__(self, text: str):
+        self.text = text
+        self.words = text.replace("\n", " ").split()
+
+    @property
+    def word_count(self) -> int:
+        return len(self.words)
+
+    @cached_property
+    def tokens(self) -> list[str]:
+        """
+        Токены для словарного классификатора тем (>= 3 символов, нижний регистр).
+        """
+        return _TOKEN_RE.findall(self.text.lower())
+
+    @cached_property
+    def e5_chunks(self) -> list[list[int]]:
+        return semantic_encoder.chunk(self.text)
+
+    @cached_property
+    def chunk_embeddings(self) -> np.ndarray:
+        """
+        Эмбеддинги всех чанков: единственное место, где текст идёт через E5.
+        """
+        futures = e5_batcher.submit_many(self.e5_chunks)
+        return np.array([f.result() for f in futures], dtype=np.float32)
+
+    @cached_property
+    def e5_embedding(self) -> np.ndarray:
+        return semantic_encoder.pool(self.chunk_embeddings)
+
+    @cached_property
+    def theme_embedding(self) -> np.ndarray:
+        """
+        Пулинг чанков, покрывающих первые THEME_SNIPPET_WORDS слов.
+        Граница округляется вверх до целого чанка.
+        """
+        snippet_tokens = semantic_encoder.token_count(" ".join(self.words[:THEME_SNIPPET_WORDS]))
+        n_chunks = max(1, -(-snippet_tokens // semantic_encoder.window))
+        return semantic_encoder.pool(self.chunk_embeddings[:n_chunks])
+
+    @property
+    def sbert_input(self) -> str:
+        return " ".join(self.words[:SBERT_SNIPPET_WORDS])
+
+    @cached_property
+    def sbert_embedding(self) -> np.ndarray:
+        return np.asarray(sbert_batcher.run(self.sbert_input), dtype=np.float32)
+
+    @cached_property
+    def emotion_vector(self) -> np.ndarray:
+        return emotion_batcher.run(self.text)
@@ -0,0 +1,144 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import lyricsgenius
+
+from config import (
+    logger, GENIUS_TOKEN, GENIUS_CACHE_TTL, GENIUS_NEGATIVE_TTL,
+    GENIUS_API_ROOT, GENIUS_PUBLIC_API_ROOT, GENIUS_WEB_ROOT
+)
+from database import SessionLocal, ReadSessionLocal
+from models import GeniusCache
+from .external_io import external_io, host_of
+from .metrics import Counters
+from .normalize import match_key
+
+genius = lyricsgenius.Genius(GENIUS_TOKEN)
+genius.verbose = False
+genius.remove_section_headers = True
+genius.timeout = 10
+genius.API_ROOT = GENIUS_API_ROOT
+genius.PUBLIC_API_ROOT = GENIUS_PUBLIC_API_ROOT
+genius.WEB_ROOT = GENIUS_WEB_ROOT
+
+
+@dataclass
+class GeniusRecord:
+    """
+    Результат поиска песни в Genius, который передаётся через все этапы пайплайна.
+    """
+    track: str
+    artist: str
+    found: bool
+    lyrics: str = ""
+    genius_artist: Optional[str] = None
+    song_id: Optional[int] = None
+    fetched_at: Optional[datetime] = None
+
+    @property
+    def canonical_artist(self) -> str:
+        return self.genius_artist or self.artist
+
+
+def fetch_song(track: str, artist: str, retries: int = 3, delay: float = 2.0) -> GeniusRecord:
+    """
+    Один поиск в Genius. None от search_song — это «не найдено»;
+    сетевые ошибки после всех попыток пробрасываются, чтобы не попасть в негативный кеш.
+    """
+    for attempt in range(retries):
+        try:
+            song = genius.search_song(track, artist)
+            now = datetime.utcnow()
+            if not song:
+                return GeniusRecord(track, artist, found=False, fetched_at=now)
+            # Song.artist — имя основного артиста во всех версиях lyricsgenius,
+            # тогда как primary_artist бывает и объектом, и словарём
+            actual_artist = getattr(song, "artist", None) or artist
+            return GeniusRecord(
+                track, artist,
+                found=True,
+                lyrics=song.lyrics or "",
+                genius_artist=actual_artist,
+                song_id=getattr(song, "id", None) or song.to_dict().get("id"),
+                fetched_at=now,
+            )
+        except Exception as e:
+            logger.warning(f"Genius request failed (attempt {attempt+1}): {e}")
+            if attempt + 1 == retries:
+                raise
+            time.sleep(delay)
+
+
+class GeniusLookup:
+    """
+    Кеш результатов Genius в SQLite по ключу строки lyrics (normalize.match_key)
+    с TTL и негативным кешированием «не найдено».
+    """
+    def __init__(self, ttl: float, negative_ttl: float):
+        self.ttl = timedelta(seconds=ttl)
+        self.negative_ttl = timedelta(seconds=negative_ttl)
+        self.counters = Counters("hit", "negative_hit", "miss", "error")
+
+    def resolve(self, track: str, artist: str) -> GeniusRecord:
+        key = match_key(track, artist)
+
+        # Чтение и запись — в отдельных сессиях, чтобы не держать
+        # транзакцию SQLite открытой на время сетевого запроса
+        db = ReadSessionLocal()
+        try:
+            row = db.get(GeniusCache, key)
+            if row is not None and not self._expired(row):
+                self.counters.inc("hit" if row.found else "negative_hit")
+                return GeniusRecord(
+                    track, artist,
+                    found=row.found,
+                    lyrics=row.lyrics or "",
+                    genius_artist=row.genius_artist,
+                    song_id=row.song_id,
+                    fetched_at=row.fetched_at,
+                )
+        finally:
+            db.close()
+
+        self.counters.inc("miss")
+        try:
+            # lyricsgenius синхронный: запрос идёт через пул внешнего I/O под лимитом хоста
+            record = external_io.run(
+                external_io.call_blocking(host_of(GENIUS_API_ROOT), fetch_song, track, artist)
+            )
+        except Exception:
+            self.counters.inc("error")
+            return GeniusRecord(track, artist, found=False)
+
+        db = SessionLocal()
+        try:
+            db.merge(GeniusCache(
+                key=key,
+                track_name=track,
+                artist=artist,
+                found=record.found,
+                lyrics=record.lyrics,
+                genius_artist=record.genius_artist,
+                song_id=record.song_id,
+                fetched_at=record.fetched_at,
+            ))
+            db.commit()
+        finally:
+            db.close()
+        return record
+
+    def _expired(self, row: GeniusCache) -> bool:
+        ttl = self.ttl if row.found else self.negative_ttl
+        return row.fetched_at is None or datetime.utcnow() - row.fetched_at > ttl
+
+    def stats(self) -> dict:
+        return {
+            **self.counters.snapshot(),
+            "hit_rate": self.counters.ratio(("hit", "negative_hit"), ("miss",)),
+        }
+
+
+# Singleton instance
+genius_lookup = GeniusLookup(GENIUS_CACHE_TTL, GENIUS_NEGATIVE_TTL)
@@ -1,68 +1,244 @@
-import json
-import math
-from collections import Counter
-from database import SessionLocal
-from models import Lyrics
-from sqlalchemy import event
-
-class IDFCache:
-    def __init__(self):
-        self.theme_idf: dict[str, float] = {}
-        self.genre_idf: dict[str, float] = {}
-
-    def refresh(self):
-        db = SessionLocal()
-        try:
-            total_docs = db.query(Lyrics).count()
-            if total_docs == 0:
-                return
-
-            theme_counter: Counter[str] = Counter()
-            genre_counter: Counter[str] = Counter()
-
-            # Собираем статистику тем
-            for row, in db.query(Lyrics.themes).all():
-                items = []
-                # поддержка JSON-типа (list) и старых строковых колонок
-                if isinstance(row, (list, tuple)):
-                    items = row
-                elif isinstance(row, str):
-                    try:
-                        items = json.loads(row)
-                    except json.JSONDecodeError:
-                        items = []
-                for t in set(items):
-                    theme_counter[t] += 1
-
-            # Собираем статистику жанров
-            for row, in db.query(Lyrics.genre).all():
-                items = []
-                if isinstance(row, (list, tuple)):
-                    items = row
-                elif isinstance(row, str):
-                    try:
-                        items = json.loads(row)
-                    except json.JSONDecodeError:
-                        items = []
-                for g in set(items):
-                    genre_counter[g] += 1
-
-            # Вычисляем IDF
-            self.theme_idf = {
-                t: math.log((total_docs + 1) / (cnt + 1))
-                for t, cnt in theme_counter.items()
-            }
-            self.genre_idf = {
-                g: math.log((total_docs + 1) / (cnt + 1))
-                for g, cnt in genre_counter.items()
-            }
-        finally:
-            db.close()
-
-idf_service = IDFCache()
-
-# Автоматический refresh TF-IDF после вставки или обновления Lyrics
-@event.listens_for(Lyrics, 'after_insert')
-@event.listens_for(Lyrics, 'after_update')
-def _refresh_idf(mapper, connection, target):
-    idf_service.refresh()
+import math
+import threading
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, object_session
+
+from config import logger
+from database import SessionLocal, ReadSessionLocal
+from models import Lyrics, TagFrequency
+from .faiss_common import _as_list
+from .result_cache import result_cache
+
+TOTAL = ("n", "")               # счётчик числа документов
+PENDING = "idf_delta"           # ключ в Session.info: дельта ещё не закоммиченной транзакции
+CHECK_CHUNK = 5000
+
+
+def doc_counts(genres, themes) -> Counter:
+    """
+    Вклад одной строки lyrics в счётчики: по единице на каждый её жанр и тему и на N.
+    """
+    counts = Counter({TOTAL: 1})
+    counts.update(("g", g) for g in set(_as_list(genres)))
+    counts.update(("t", t) for t in set(_as_list(themes)))
+    return counts
+
+
+class IDFCache:
+    """
+    IDF жанров и тем: log((N + 1) / (df + 1)).
+
+    Документные частоты df и число строк N лежат в таблице tag_frequency и
+    меняются на дельту в той же транзакции, что и вставка, изменение или
+    удаление строки lyrics (слушатели ниже). В памяти держится копия счётчиков,
+    к которой дельта применяется после коммита; словари IDF выводятся из неё
+    лениво — при первом чтении после изменений, за O(число тегов).
+    check() — периодическая сверка счётчиков с полным пересчётом по таблице.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._stale = True
+        self._theme_idf: dict[str, float] = {}
+        self._genre_idf: dict[str, float] = {}
+        self.last_check: dict = {}
+
+    @property
+    def theme_idf(self) -> dict[str, float]:
+        self.sync()
+        return self._theme_idf
+
+    @property
+    def genre_idf(self) -> dict[str, float]:
+        self.sync()
+        return self._genre_idf
+
+    def load(self):
+        """
+        Старт: счётчики из tag_frequency. Если строки lyrics есть, а таблица пуста
+        (первый запуск со счётчиками) или в ней отрицательные значения либо N <= 0
+        (счётчики испорчены), она сперва исправляется полным пересчётом.
+        """
+        stored, has_rows = self._read()
+        if has_rows and (stored.get(TOTAL, 0) <= 0 or any(docs < 0 for docs in stored.values())):
+            logger.info("IDF: таблица счётчиков пуста или испорчена, заполняется полным пересчётом")
+            self.check()
+            stored, _ = self._read()
+        with self._lock:
+            self._counts = Counter({key: docs for key, docs in stored.items() if docs > 0})
+            self._stale = True
+
+    def _read(self) -> tuple[Counter, bool]:
+        db = ReadSessionLocal()
+        try:
+            return self._stored(db), db.query(Lyrics.id).first() is not None
+        finally:
+            db.close()
+
+    def apply(self, delta: Counter):
+        """
+        Закоммиченная дельта счётчиков.
+        """
+        with self._lock:
+            self._counts.update(delta)
+            for key in [k for k in delta if self._counts[k] <= 0]:
+                del self._counts[key]
+            self._stale = True
+
+    def sync(self):
+        """
+        Пересчитывает словари IDF, если счётчики менялись; заодно сбрасывает
+        ответы кеша /find_similar, чей IDF сдвинулся.
+        """
+        with self._lock:
+            if not self._stale:
+                return
+            n = self._counts.get(TOTAL, 0)
+            genre_idf, theme_idf = {}, {}
+            for (kind, tag), df in self._counts.items():
+                if kind == "g":
+                    genre_idf[tag] = math.log((n + 1) / (df + 1))
+                elif kind == "t":
+                    theme_idf[tag] = math.log((n + 1) / (df + 1))
+            self._genre_idf, self._theme_idf = genre_idf, theme_idf
+            self._stale = False
+        result_cache.invalidate_idf(genre_idf, theme_idf)
+
+    def check(self) -> int:
+        """
+        Сверка счётчиков с полным пересчётом по таблице lyrics: ловит строки,
+        изменённые в обход ORM (массовые update/delete, ручные правки).
+        Счётчики читаются до и после пересчёта; исправляются только те, что
+        за это время не менялись, — конкурентные загрузки не дают ложных
+        расхождений, а пропущенное догонит следующая сверка.
+        Возвращает число исправленных счётчиков.
+        """
+        db = ReadSessionLocal()
+        try:
+            before = self._stored(db)
+            actual = Counter()
+            for genres, themes in db.query(Lyrics.genre, Lyrics.themes).yield_per(CHECK_CHUNK):
+                actual.update(doc_counts(genres, themes))
+            after = self._stored(db)
+        finally:
+            db.close()
+
+        drift = Counter()
+        for key in set(actual) | set(after):
+            if before.get(key, 0) == after.get(key, 0) and actual.get(key, 0) != after.get(key, 0):
+                drift[key] = actual.get(key, 0) - after.get(key, 0)
+        if drift:
+            db = SessionLocal()
+            try:
+                _write_delta(db.connection(), drift)
+                db.commit()
+            finally:
+                db.close()
+
+        if drift:
+            self.apply(drift)
+            logger.warning(f"IDF: сверка исправила {len(drift)} счётчиков")
+        self.last_check = {"corrected": len(drift), "documents": actual.get(TOTAL, 0)}
+        return len(drift)
+
+    @staticmethod
+    def _stored(db) -> Counter:
+        db.expire_all()
+        return Counter({(r.kind, r.tag): r.docs for r in db.query(TagFrequency)})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents":  self._counts.get(TOTAL, 0),
+                "genres":     sum(1 for kind, _ in self._counts if kind == "g"),
+                "themes":     sum(1 for kind, _ in self._counts if kind == "t"),
+                "last_check": self.last_check,
+            }
+
+idf_service = IDFCache()
+
+
+# --- Дельты счётчиков при записи в lyrics ---
+
+def _write_delta(connection, delta: Counter):
+    rows = [{"kind": kind, "tag": tag, "docs": docs} for (kind, tag), docs in delta.items() if docs]
+    if not rows:
+        return
+    stmt = insert(TagFrequency)
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["kind", "tag"],
+            set_={"docs": TagFrequency.docs + stmt.excluded.docs},
+        ),
+        rows,
+    )
+
+
+def _record(connection, session: Optional[Session], delta: Counter):
+    delta = Counter({key: v for key, v in delta.items() if v})
+    if not delta:
+        return
+    _write_delta(connection, delta)
+    if session is not None:
+        session.info.setdefault(PENDING, Counter()).update(delta)
+
+
+def record_change(session: Session, old: Optional[tuple], new: Optional[tuple]):
+    """
+    Дельта счётчиков для записи в lyrics в обход ORM (upsert через Core):
+    old/new — (жанры, темы) строки до и после, None — строки не было / не стало.
+    Пишется в транзакции сессии и применяется к кешу после её коммита.
+    """
+    delta = doc_counts(*new) if new is not None else Counter()
+    if old is not None:
+        delta.subtract(doc_counts(*old))
+    _record(session.connection(), session, delta)
+
+
+def _old_value(connection, target, name: str):
+    history = inspect(target).attrs[name].history
+    if not history.has_changes():
+        return getattr(target, name)
+    if history.deleted:
+        return history.deleted[0]
+    # Старое значение не загружалось в сессию — читаем его до UPDATE
+    column = getattr(Lyrics, name)
+    return connection.execute(select(column).where(Lyrics.id == target.id)).scalar()
+
+
+@event.listens_for(Lyrics, 'after_insert')
+def _count_insert(mapper, connection, target):
+    _record(connection, object_session(target), doc_counts(target.genre, target.themes))
+
+
+@event.listens_for(Lyrics, 'before_update')
+def _count_update(mapper, connection, target):
+    state = inspect(target)
+    if not (state.attrs.genre.history.has_changes() or state.attrs.themes.history.has_changes()):
+        return
+    delta = doc_counts(target.genre, target.themes)
+    delta.subtract(doc_counts(_old_value(connection, target, "genre"), _old_value(connection, target, "themes")))
+    _record(connection, object_session(target), delta)
+
+
+@event.listens_for(Lyrics, 'after_delete')
+def _count_delete(mapper, connection, target):
+    delta = Counter()
+    delta.subtract(doc_counts(target.genre, target.themes))
+    _record(connection, object_session(target), delta)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed(session):
+    delta = session.info.pop(PENDING, None)
+    if delta:
+        idf_service.apply(delta)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back(session):
+    session.info.pop(PENDING, None)
@@ -0,0 +1,171 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from config import logger, INGEST_WORKERS, INGEST_JOB_TTL
+from .metrics import StageTimings
+from .normalize import match_key
+
+
+class JobError(Exception):
+    """
+    Ожидаемая ошибка задачи: текст и HTTP-код, которые клиент получит при опросе статуса.
+    """
+    def __init__(self, detail: str, status_code: int = 500):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class IngestJob:
+    def __init__(self, key: str, track: str, artist: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.track = track
+        self.artist = artist
+        self.status = "queued"
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.error_code: Optional[int] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.timings: dict[str, float] = {}
+
+    def to_dict(self) -> dict:
+        data = {"job_id": self.id, "status": self.status, "timings": dict(self.timings)}
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+            data["code"] = self.error_code
+        return data
+
+
+class IngestJobQueue:
+    """
+    Очередь задач загрузки треков с пулом воркеров.
+    Задачи дедуплицируются по ключу строки lyrics (normalize.match_key):
+    пока задача в очереди или выполняется, повторный запрос получает тот же job_id.
+    """
+    def __init__(self, workers: int, job_ttl: float):
+        self.workers = workers
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+        self._jobs: dict[str, IngestJob] = {}
+        self._active: dict[str, IngestJob] = {}
+        self._local = threading.local()
+        self.stage_timings = StageTimings()
+        self.completed = 0
+        self.failed = 0
+        self.deduplicated = 0
+
+    def submit(self, track: str, artist: str, handler: Callable[..., dict], *args) -> IngestJob:
+        """
+        Ставит handler(track, artist, *args) в очередь и сразу возвращает задачу.
+        """
+        key = match_key(track, artist)
+        with self._lock:
+            self._purge_expired()
+            job = self._active.get(key)
+            if job is not None:
+                self.deduplicated += 1
+                return job
+            job = IngestJob(key, track, artist)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job, handler, args)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def current_job(self) -> Optional[IngestJob]:
+        return getattr(self._local, "job", None)
+
+    @contextmanager
+    def stage(self, name: str, job: Optional[IngestJob] = None):
+        """
+        Замеряет этап пайплайна: в общую статистику и в тайминги задачи.
+        Вне потока воркера (например, в event loop внешнего I/O) задачу передают явно.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_timings.observe(name, elapsed)
+            job = job or self.current_job()
+            if job is not None:
+                job.timings[name] = round(elapsed * 1000, 1)
+
+    def _run(self, job: IngestJob, handler: Callable[..., dict], args: tuple):
+        with self._lock:
+            job.status = "running"
+            job.started_at = time.time()
+        self.stage_timings.observe("queue_wait", job.started_at - job.created_at)
+        self._local.job = job
+
+        status, result, error, code = "done", None, None, None
+        try:
+            result = handler(job.track, job.artist, *args)
+        except JobError as e:
+            status, error, code = "failed", e.detail, e.status_code
+        except Exception:
+            logger.exception(f"Ошибка в задаче загрузки {job.artist} - {job.track}")
+            status, error, code = "failed", "Внутренняя ошибка сервера", 500
+        finally:
+            self._local.job = None
+
+        with self._lock:
+            job.result = result
+            job.error = error
+            job.error_code = code
+            job.status = status
+            job.finished_at = time.time()
+            self._active.pop(job.key, None)
+            if status == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+        self.stage_timings.observe("total", job.finished_at - job.started_at)
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.job_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = sum(1 for j in self._active.values() if j.status == "queued")
+            running = sum(1 for j in self._active.values() if j.status == "running")
+            tracked = len(self._jobs)
+            counters = {
+                "completed":    self.completed,
+                "failed":       self.failed,
+                "deduplicated": self.deduplicated,
+            }
+        return {
+            "workers":      self.workers,
+            "queue_depth":  queued,
+            "running":      running,
+            "jobs_tracked": tracked,
+            **counters,
+            "stages":       self.stage_timings.snapshot(),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Singleton instance
+ingest_queue = IngestJobQueue(INGEST_WORKERS, INGEST_JOB_TTL)
@@ -1,164 +1,232 @@
-import requests
-import re
-from urllib.parse import quote
-import backoff
-from config import LASTFM_API_URL, LASTFM_API_KEY, logger
-
-@backoff.on_exception(backoff.expo, requests.RequestException, max_tries=3, jitter=backoff.full_jitter)
-def search_track_versions(title: str, artist: str, limit: int = 10) -> list[dict]:
-    resp = requests.get(LASTFM_API_URL, params={
-        "method": "track.search",
-        "track": title,
-        "artist": artist,
-        "api_key": LASTFM_API_KEY,
-        "format": "json",
-        "limit": limit,
-        "autocorrect": 1
-    }, timeout=5)
-    resp.raise_for_status()
-    matches = resp.json().get("results", {}).get("trackmatches", {}).get("track", [])
-    result = []
-    for item in matches:
-        try:
-            listeners = int(item.get("listeners", 0))
-        except ValueError:
-            listeners = 0
-        result.append({
-            "artist": item.get("artist"),
-            "listeners": listeners
-        })
-    return result
-
-@backoff.on_exception(backoff.expo, requests.RequestException, max_tries=3, jitter=backoff.full_jitter)
-def choose_most_popular_version(title: str, artist: str) -> str:
-    candidates = search_track_versions(title, artist)
-    best_score = -1
-    best_artist = artist
-    for cand in candidates:
-        try:
-            resp = requests.get(LASTFM_API_URL, params={
-                "method": "track.getInfo",
-                "artist": cand["artist"],
-                "track": title,
-                "api_key": LASTFM_API_KEY,
-                "format": "json",
-                "autocorrect": 1
-            }, timeout=5)
-            resp.raise_for_status()
-            info = resp.json().get("track", {}) or {}
-            playcount = int(info.get("playcount", 0))
-        except Exception:
-            playcount = 0
-        score = cand["listeners"] + playcount
-        if score > best_score:
-            best_score = score
-            best_artist = cand["artist"]
-    return best_artist
-
-@backoff.on_exception(backoff.expo, requests.RequestException, max_tries=3, jitter=backoff.full_jitter)
-def fetch_tags_lastfm(title: str, artist: str) -> list[str]:
-    allowed_genres = {
-    # Основные
-    "pop", "rock", "hip-hop", "rap", "jazz", "blues", "electronic", "metal", "punk", "funk", "soul",
-    "rnb", "r&b", "classical", "reggae", "disco", "folk", "indie", "alternative", "house", "techno",
-    "trance", "dubstep", "edm", "instrumental", "ambient", "lo-fi", "lofi", "grunge", "hard rock",
-    "soft rock", "psychedelic", "experimental", "emo", "ska", "drum and bass", "dnb", "new wave",
-    "industrial", "chillout", "synthpop", "trip-hop", "garage", "dance", "dance-pop", "electropop",
-    "minimal", "post-rock", "metalcore", "death metal", "black metal", "heavy metal", "progressive",
-    "neo soul", "dream pop", "dreamy", "gospel", "opera", "world", "ethnic", "latin", "reggaeton",
-    "afrobeat", "trap", "phonk", "boom bap", "chanson", "k-pop", "j-pop", "c-pop", "soundtrack",
-    "score", "musical", "hardcore", "acoustic", "melodic", "epic", "ballad", "romantic", "melancholy",
-    "symphonic", "jazz rap", "pop rap", "alternative rock", "classic rock", "progressive rock", 
-    "nu metal", "grime", "noise", "emo rap", "indietronica", "future bass", "hyperpop", "chiptune",
-    "vaporwave", "glitch", "breakcore", "downtempo", "tech house", "deep house", "bassline", "uk garage",
-    "jungle", "gabber", "hardstyle", "shoegaze", "post-punk", "coldwave", "math rock", "sludge", 
-    "slowcore", "americana", "bluegrass", "swamp rock", "trap metal", "cloud rap",
-
-    # Региональные и народные
-    "flamenco", "tango", "samba", "bossa nova", "mariachi", "cumbia", "nordic folk", "celtic", "balkan",
-    "greek folk", "turkish folk", "arabic", "klezmer", "african", "asian", "indian", "bollywood",
-    "arabesque", "fado", "rebetiko", "persian", "mongolian throat singing", "jewish", "chinese traditional",
-    "soca", "salsa", "merengue", "bachata", "dancehall", "highlife", "zouk", "polka", "Cajun", "zydeco",
-
-    # Электронные и танцевальные
-    "psytrance", "goa trance", "idm", "breakbeat", "electro swing", "future house", "big room",
-    "progressive house", "trancecore", "industrial techno", "tech trance", "eurodance", "eurobeat",
-    "hands up", "happy hardcore", "nightcore", "synthwave", "outrun", "retrowave", "witch house",
-    "acid house", "tropical house", "future garage", "moombahton", "big beat", "drumstep",
-
-    # Металл и тяжёлая сцена
-    "thrash metal", "doom metal", "sludge metal", "post-metal", "speed metal", "power metal",
-    "viking metal", "folk metal", "symphonic metal", "melodic death metal", "blackgaze",
-    "metalstep", "groove metal", "deathcore", "mathcore", "technical death metal",
-    "progressive metal", "industrial metal", "gothic metal",
-
-    # Хип-хоп/рэп и смежное
-    "g-funk", "west coast", "east coast", "southern rap", "drill", "latin trap", "underground rap",
-    "conscious rap", "meme rap", "battle rap", "crunk", "hyphy", "bounce", "miami bass", "trap soul",
-    "cloud rap",
-
-    # Поп и инди
-    "bubblegum pop", "teen pop", "pop punk", "synthpop", "baroque pop", "indie pop",
-    "electro pop", "dream pop", "power pop", "art pop", "glam rock", "britpop", "pop rock", "indie rock",
-
-    # Рок и альтернативная сцена
-    "arena rock", "garage rock", "space rock", "stoner rock", "folk rock", "blues rock", "punk rock",
-    "emo rock", "post-hardcore", "screamo", "noise rock", "psych rock", "sludge rock", "southern rock",
-    "rap rock", "crossover thrash", "krautrock", "post-grunge", "gothic rock",
-
-    # Саундтреки и инструментал
-    "anime", "anime soundtrack", "video game music", "vgm", "game soundtrack", "cinematic",
-    "film score", "instrumental hip-hop", "orchestral", "trailer music", "epic music", "background music",
-
-    # Джаз и джазовые поджанры
-    "bebop", "hard bop", "smooth jazz", "jazz fusion", "modal jazz", "free jazz",
-
-    # Классическая музыка
-    "baroque", "romantic classical", "contemporary classical",
-
-    # Прочие и гибридные
-    "spoken word", "a cappella", "field recordings", "avant-garde", "experimental hip-hop",
-    "meditative", "healing", "new age", "relaxation", "sound healing", "nature sounds", "asmr",
-    "tiktok music", "meme music", "satanic metal", "occult rock"
-}
-
-    logger.debug(f"[LastFM] track.getTopTags request for: artist={artist}, title={title}")
-    try:
-        resp = requests.get(LASTFM_API_URL, params={
-            "method": "track.getTopTags",
-            "artist": artist,
-            "track": title,
-            "api_key": LASTFM_API_KEY,
-            "format": "json",
-            "autocorrect": 1
-        }, timeout=5)
-        resp.raise_for_status()
-        result = resp.json()
-        tags = result.get("toptags", {}).get("tag", [])
-        if isinstance(tags, dict):
-            tags = [tags]
-        names = [t["name"].lower() for t in tags if "name" in t]
-        filtered = [t for t in names if t in allowed_genres]
-        if filtered:
-            logger.debug(f"[LastFM] filtered tags: {filtered!r}")
-            return filtered
-    except Exception as e:
-        logger.debug(f"[LastFM] API call failed: {e!r}")
-
-    logger.debug(f"[LastFM] fallback: HTML scrape for: artist={artist}, title={title}")
-    try:
-        # Убираем служебные скобки из имени артиста и названия для корректного URL
-        safe_artist = re.sub(r"\s*\(.*\)$", "", artist)
-        safe_title = re.sub(r"\s*\(.*\)$", "", title)
-        url = f"https://www.last.fm/music/{quote(safe_artist)}/_/{quote(safe_title)}"
-        page = requests.get(url, timeout=5)
-        page.raise_for_status()
-        html = page.text
-        scraped = re.findall(r'<a[^>]+href="/tag/[^>]*>([^<]+)</a>', html)
-        tags = list(dict.fromkeys(t.strip().lower() for t in scraped if t.strip()))
-        filtered = [t for t in tags if t in allowed_genres]
-        logger.debug(f"[LastFM] scraped and filtered tags: {filtered!r}")
-        return filtered
-    except Exception as e:
-        logger.debug(f"[LastFM] HTML scrape failed: {e!r}")
-        return []
\ No newline at end of file
+import asyncio
+import httpx
+import re
+from collections import OrderedDict
+from urllib.parse import quote
+import backoff
+from config import (
+    LASTFM_API_URL, LASTFM_WEB_URL, LASTFM_API_KEY, logger,
+    LASTFM_VERSION_TOP_N, LASTFM_VERSION_BUDGET, LASTFM_ARTIST_MEMO_SIZE
+)
+from .external_io import external_io
+from .lastfm_cache import lastfm_cache
+from .metrics import Counters
+from .normalize import match_key
+
+# (трек, артист) -> каноничный артист; живёт в event loop внешнего I/O,
+# поэтому обращения к нему однопоточные
+_canonical_artists: "OrderedDict[str, str]" = OrderedDict()
+version_stats = Counters("memo_hit", "resolved", "budget_exceeded")
+
+# Last.fm error 6: "Track not found" / "Artist not found"
+LASTFM_NOT_FOUND = 6
+
+@backoff.on_exception(backoff.expo, httpx.HTTPError, max_tries=3, jitter=backoff.full_jitter)
+async def lastfm_api(method: str, **params) -> dict | None:
+    """
+    Вызов Last.fm API через дисковый кеш. None — Last.fm ответил «не найдено»
+    (такой ответ тоже кешируется, но с коротким TTL).
+    """
+    found, payload = await asyncio.to_thread(lastfm_cache.get, method, params)
+    if found:
+        return payload
+
+    resp = await external_io.get(LASTFM_API_URL, params={
+        "method": method,
+        **params,
+        "api_key": LASTFM_API_KEY,
+        "format": "json"
+    })
+    if resp.status_code == 404:
+        payload = None
+    else:
+        resp.raise_for_status()
+        payload = resp.json()
+        if payload.get("error") == LASTFM_NOT_FOUND:
+            payload = None
+        elif "error" in payload:
+            # прочие ошибки API (лимиты, сбои) не кешируем
+            logger.debug(f"[LastFM] {method} error: {payload.get('message')!r}")
+            return payload
+    await asyncio.to_thread(lastfm_cache.put, method, params, payload)
+    return payload
+
+async def search_track_versions(title: str, artist: str, limit: int = 10) -> list[dict]:
+    data = await lastfm_api("track.search", track=title, artist=artist, limit=limit, autocorrect=1)
+    matches = (data or {}).get("results", {}).get("trackmatches", {}).get("track", [])
+    result = []
+    for item in matches:
+        try:
+            listeners = int(item.get("listeners", 0))
+        except ValueError:
+            listeners = 0
+        result.append({
+            "artist": item.get("artist"),
+            "listeners": listeners
+        })
+    return result
+
+async def fetch_track_playcount(title: str, artist: str) -> int:
+    try:
+        data = await lastfm_api("track.getInfo", artist=artist, track=title, autocorrect=1)
+        info = (data or {}).get("track", {}) or {}
+        return int(info.get("playcount", 0))
+    except Exception:
+        return 0
+
+async def choose_most_popular_version(title: str, artist: str) -> str:
+    """
+    Выбирает каноничного артиста трека на Last.fm.
+    Кандидаты ранжируются по listeners из track.search, track.getInfo
+    запрашивается параллельно только для LASTFM_VERSION_TOP_N лучших
+    и только в пределах LASTFM_VERSION_BUDGET секунд. Результат запоминается.
+    """
+    key = match_key(title, artist)
+    cached = _canonical_artists.get(key)
+    if cached is not None:
+        _canonical_artists.move_to_end(key)
+        version_stats.inc("memo_hit")
+        return cached
+
+    # Один артист может встречаться в выдаче несколько раз — оставляем максимум listeners
+    listeners: dict[str, int] = {}
+    for cand in await search_track_versions(title, artist):
+        if cand["artist"]:
+            listeners[cand["artist"]] = max(listeners.get(cand["artist"], 0), cand["listeners"])
+    if not listeners:
+        return artist
+
+    ranked = sorted(listeners.items(), key=lambda kv: -kv[1])[:LASTFM_VERSION_TOP_N]
+    if len(ranked) == 1:
+        best_artist = ranked[0][0]
+    else:
+        tasks = [asyncio.ensure_future(fetch_track_playcount(title, a)) for a, _ in ranked]
+        done, pending = await asyncio.wait(tasks, timeout=LASTFM_VERSION_BUDGET)
+        for task in pending:
+            task.cancel()
+        if pending:
+            version_stats.inc("budget_exceeded")
+
+        best_score = -1
+        best_artist = artist
+        for (cand_artist, cand_listeners), task in zip(ranked, tasks):
+            playcount = task.result() if task in done else 0
+            score = cand_listeners + playcount
+            if score > best_score:
+                best_score = score
+                best_artist = cand_artist
+
+    version_stats.inc("resolved")
+    _canonical_artists[key] = best_artist
+    if len(_canonical_artists) > LASTFM_ARTIST_MEMO_SIZE:
+        _canonical_artists.popitem(last=False)
+    return best_artist
+
+@backoff.on_exception(backoff.expo, httpx.HTTPError, max_tries=3, jitter=backoff.full_jitter)
+async def fetch_tags_lastfm(title: str, artist: str) -> list[str]:
+    allowed_genres = {
+    # Основные
+    "pop", "rock", "hip-hop", "rap", "jazz", "blues", "electronic", "metal", "punk", "funk", "soul",
+    "rnb", "r&b", "classical", "reggae", "disco", "folk", "indie", "alternative", "house", "techno",
+    "trance", "dubstep", "edm", "instrumental", "ambient", "lo-fi", "lofi", "grunge", "hard rock",
+    "soft rock", "psychedelic", "experimental", "emo", "ska", "drum and bass", "dnb", "new wave",
+    "industrial", "chillout", "synthpop", "trip-hop", "garage", "dance", "dance-pop", "electropop",
+    "minimal", "post-rock", "metalcore", "death metal", "black metal", "heavy metal", "progressive",
+    "neo soul", "dream pop", "dreamy", "gospel", "opera", "world", "ethnic", "latin", "reggaeton",
+    "afrobeat", "trap", "phonk", "boom bap", "chanson", "k-pop", "j-pop", "c-pop", "soundtrack",
+    "score", "musical", "hardcore", "acoustic", "melodic", "epic", "ballad", "romantic", "melancholy",
+    "symphonic", "jazz rap", "pop rap", "alternative rock", "classic rock", "progressive rock", 
+    "nu metal", "grime", "noise", "emo rap", "indietronica", "future bass", "hyperpop", "chiptune",
+    "vaporwave", "glitch", "breakcore", "downtempo", "tech house", "deep house", "bassline", "uk garage",
+    "jungle", "gabber", "hardstyle", "shoegaze", "post-punk", "coldwave", "math rock", "sludge", 
+    "slowcore", "americana", "bluegrass", "swamp rock", "trap metal", "cloud rap",
+
+    # Региональные и народные
+    "flamenco", "tango", "samba", "bossa nova", "mariachi", "cumbia", "nordic folk", "celtic", "balkan",
+    "greek folk", "turkish folk", "arabic", "klezmer", "african", "asian", "indian", "bollywood",
+    "arabesque", "fado", "rebetiko", "persian", "mongolian throat singing", "jewish", "chinese traditional",
+    "soca", "salsa", "merengue", "bachata", "dancehall", "highlife", "zouk", "polka", "Cajun", "zydeco",
+
+    # Электронные и танцевальные
+    "psytrance", "goa trance", "idm", "breakbeat", "electro swing", "future house", "big room",
+    "progressive house", "trancecore", "industrial techno", "tech trance", "eurodance", "eurobeat",
+    "hands up", "happy hardcore", "nightcore", "synthwave", "outrun", "retrowave", "witch house",
+    "acid house", "tropical house", "future garage", "moombahton", "big beat", "drumstep",
+
+    # Металл и тяжёлая сцена
+    "thrash metal", "doom metal", "sludge metal", "post-metal", "speed metal", "power metal",
+    "viking metal", "folk metal", "symphonic metal", "melodic death metal", "blackgaze",
+    "metalstep", "groove metal", "deathcore", "mathcore", "technical death metal",
+    "progressive metal", "industrial metal", "gothic metal",
+
+    # Хип-хоп/рэп и смежное
+    "g-funk", "west coast", "east coast", "southern rap", "drill", "latin trap", "underground rap",
+    "conscious rap", "meme rap", "battle rap", "crunk", "hyphy", "bounce", "miami bass", "trap soul",
+    "cloud rap",
+
+    # Поп и инди
+    "bubblegum pop", "teen pop", "pop punk", "synthpop", "baroque pop", "indie pop",
+    "electro pop", "dream pop", "power pop", "art pop", "glam rock", "britpop", "pop rock", "indie rock",
+
+    # Рок и альтернативная сцена
+    "arena rock", "garage rock", "space rock", "stoner rock", "folk rock", "blues rock", "punk rock",
+    "emo rock", "post-hardcore", "screamo", "noise rock", "psych rock", "sludge rock", "southern rock",
+    "rap rock", "crossover thrash", "krautrock", "post-grunge", "gothic rock",
+
+    # Саундтреки и инструментал
+    "anime", "anime soundtrack", "video game music", "vgm", "game soundtrack", "cinematic",
+    "film score", "instrumental hip-hop", "orchestral", "trailer music", "epic music", "background music",
+
+    # Джаз и джазовые поджанры
+    "bebop", "hard bop", "smooth jazz", "jazz fusion", "modal jazz", "free jazz",
+
+    # Классическая музыка
+    "baroque", "romantic classical", "contemporary classical",
+
+    # Прочие и гибридные
+    "spoken word", "a cappella", "field recordings", "avant-garde", "experimental hip-hop",
+    "meditative", "healing", "new age", "relaxation", "sound healing", "nature sounds", "asmr",
+    "tiktok music", "meme music", "satanic metal", "occult rock"
+}
+
+    logger.debug(f"[LastFM] track.getTopTags request for: artist={artist}, title={title}")
+    try:
+        result = await lastfm_api("track.getTopTags", artist=artist, track=title, autocorrect=1)
+        tags = (result or {}).get("toptags", {}).get("tag", [])
+        if isinstance(tags, dict):
+            tags = [tags]
+        names = [t["name"].lower() for t in tags if "name" in t]
+        filtered = [t for t in names if t in allowed_genres]
+        if filtered:
+            logger.debug(f"[LastFM] filtered tags: {filtered!r}")
+            return filtered
+    except Exception as e:
+        logger.debug(f"[LastFM] API call failed: {e!r}")
+
+    logger.debug(f"[LastFM] fallback: HTML scrape for: artist={artist}, title={title}")
+    try:
+        scrape_key = {"artist": artist, "track": title}
+        found, cached = await asyncio.to_thread(lastfm_cache.get, "web.tags", scrape_key)
+        if found:
+            tags = (cached or {}).get("tags", [])
+        else:
+            # Убираем служебные скобки из имени артиста и названия для корректного URL
+            safe_artist = re.sub(r"\s*\(.*\)$", "", artist)
+            safe_title = re.sub(r"\s*\(.*\)$", "", title)
+            url = f"{LASTFM_WEB_URL}/music/{quote(safe_artist)}/_/{quote(safe_title)}"
+            page = await external_io.get(url)
+            if page.status_code == 404:
+                await asyncio.to_thread(lastfm_cache.put, "web.tags", scrape_key, None)
+                return []
+            page.raise_for_status()
+            html = page.text
+            scraped = re.findall(r'<a[^>]+href="/tag/[^>]*>([^<]+)</a>', html)
+            tags = list(dict.fromkeys(t.strip().lower() for t in scraped if t.strip()))
+            # В кеш кладём все теги: фильтр allowed_genres может поменяться
+            await asyncio.to_thread(lastfm_cache.put, "web.tags", scrape_key, {"tags": tags})
+        filtered = [t for t in tags if t in allowed_genres]
+        logger.debug(f"[LastFM] scraped and filtered tags: {filtered!r}")
+        return filtered
+    except Exception as e:
+        logger.debug(f"[LastFM] HTML scrape failed: {e!r}")
+        return []
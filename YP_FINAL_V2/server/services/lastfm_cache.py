@@ -0,0 +1,150 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func
+
+from config import logger, LASTFM_CACHE_TTLS, LASTFM_NEGATIVE_TTL, LASTFM_CACHE_MAX_BYTES
+from database import SessionLocal, ReadSessionLocal
+from models import LastfmCache
+from .metrics import Counters
+from .normalize import normalize_title
+
+# Параметры, не влияющие на содержимое ответа
+_IGNORED_PARAMS = {"api_key", "format"}
+
+
+def cache_key(method: str, params: dict) -> str:
+    normalized = {
+        k: normalize_title(str(v))
+        for k, v in params.items()
+        if k not in _IGNORED_PARAMS
+    }
+    return method + "\t" + json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+
+class LastfmResponseCache:
+    """
+    Дисковый (SQLite) кеш ответов Last.fm по методу и нормализованным параметрам:
+    TTL по методам, негативное кеширование и вытеснение самых старых записей
+    при превышении LASTFM_CACHE_MAX_BYTES.
+    Методы блокирующие — из event loop их вызывают через asyncio.to_thread.
+    """
+    def __init__(self, ttls: dict[str, float], negative_ttl: float, max_bytes: int):
+        self.ttls = ttls
+        self.negative_ttl = negative_ttl
+        self.max_bytes = max_bytes
+        self.counters = Counters()
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    def get(self, method: str, params: dict) -> tuple[bool, Optional[dict]]:
+        """
+        Возвращает (найдено, payload). payload None — закешированное «не найдено».
+        """
+        key = cache_key(method, params)
+        db = ReadSessionLocal()
+        try:
+            row = db.get(LastfmCache, key)
+            if row is None or row.expires_at is None or row.expires_at < datetime.utcnow():
+                self.counters.inc(f"{method}.miss")
+                return False, None
+            if row.negative:
+                self.counters.inc(f"{method}.negative_hit")
+                return True, None
+            self.counters.inc(f"{method}.hit")
+            return True, json.loads(row.payload)
+        finally:
+            db.close()
+
+    def put(self, method: str, params: dict, payload: Optional[dict]):
+        key = cache_key(method, params)
+        negative = payload is None
+        body = "" if negative else json.dumps(payload, ensure_ascii=False)
+        ttl = self.negative_ttl if negative else self.ttls.get(method, self.negative_ttl)
+        now = datetime.utcnow()
+
+        db = SessionLocal()
+        try:
+            old = db.get(LastfmCache, key)
+            old_size = old.size if old is not None else 0
+            db.merge(LastfmCache(
+                key=key,
+                method=method,
+                payload=body,
+                negative=negative,
+                size=len(body.encode("utf-8")),
+                fetched_at=now,
+                expires_at=now + timedelta(seconds=ttl),
+            ))
+            db.commit()
+            self._add_bytes(db, len(body.encode("utf-8")) - old_size)
+            if self._total_bytes > self.max_bytes:
+                self._evict(db)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"[LastFM] cache write failed: {e!r}")
+        finally:
+            db.close()
+
+    def _add_bytes(self, db, delta: int):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = db.query(func.coalesce(func.sum(LastfmCache.size), 0)).scalar()
+            else:
+                self._total_bytes += delta
+
+    def _evict(self, db):
+        """
+        Удаляет просроченные записи, затем самые старые, пока кеш не сократится до 90% лимита.
+        """
+        now = datetime.utcnow()
+        db.query(LastfmCache).filter(LastfmCache.expires_at < now).delete(synchronize_session=False)
+        db.commit()
+        total = db.query(func.coalesce(func.sum(LastfmCache.size), 0)).scalar()
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        while total > target:
+            batch = (
+                db.query(LastfmCache.key, LastfmCache.size)
+                .order_by(LastfmCache.fetched_at)
+                .limit(500)
+                .all()
+            )
+            if not batch:
+                break
+            keys = []
+            for key, size in batch:
+                keys.append(key)
+                total -= size or 0
+                if total <= target:
+                    break
+            db.query(LastfmCache).filter(LastfmCache.key.in_(keys)).delete(synchronize_session=False)
+            db.commit()
+            evicted += len(keys)
+        with self._lock:
+            self._total_bytes = total
+        self.counters.inc("evicted", evicted)
+
+    def stats(self) -> dict:
+        counts = self.counters.snapshot()
+        methods = {}
+        for name, value in counts.items():
+            method, _, kind = name.rpartition(".")
+            if method:
+                methods.setdefault(method, {})[kind] = value
+        for method, m in methods.items():
+            hits = m.get("hit", 0) + m.get("negative_hit", 0)
+            total = hits + m.get("miss", 0)
+            m["hit_rate"] = round(hits / total, 4) if total else 0.0
+        return {
+            "methods": methods,
+            "evicted": counts.get("evicted", 0),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Singleton instance
+lastfm_cache = LastfmResponseCache(LASTFM_CACHE_TTLS, LASTFM_NEGATIVE_TTL, LASTFM_CACHE_MAX_BYTES)
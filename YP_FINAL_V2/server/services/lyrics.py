@@ -1,107 +1,222 @@
-import hashlib
-import time
-from typing import Tuple
-
-import numpy as np
-from sqlalchemy.orm import Session
-
-from config import logger, GENIUS_TOKEN
-from models import Lyrics, Log
-from .semantic import get_text_embedding, sbert_model
-from .emotion import get_emotion_vector, emotion_model
-from .themes import extract_themes
-from .lastfm import fetch_tags_lastfm, choose_most_popular_version
-import lyricsgenius
-from services.faiss_index import faiss_service
-from config import GENIUS_TOKEN
-
-genius = lyricsgenius.Genius(GENIUS_TOKEN)
-genius.verbose = False
-genius.remove_section_headers = True
-genius.timeout = 10
-
-
-def fetch_lyrics_from_genius(track: str, artist: str, retries: int = 3, delay: float = 2.0) -> Tuple[str, str]:
-    for attempt in range(retries):
-        try:
-            song = genius.search_song(track, artist)
-            if not song:
-                return "", artist
-            lyrics = song.lyrics or ""
-            actual_artist = song.primary_artist.name if hasattr(song, "primary_artist") else artist
-            return lyrics, actual_artist
-        except Exception as e:
-            logger.warning(f"Genius request failed (attempt {attempt+1}): {e}")
-            time.sleep(delay)
-    return "", artist
-
-
-def process_and_save_lyrics(db: Session, track: str, artist: str, lyrics: str, request_info: dict) -> dict:
-    lyrics_hash = hashlib.md5(lyrics.encode()).hexdigest()
-
-    # Уточняем артиста и выбираем самую популярную версию
-    _, genius_artist = fetch_lyrics_from_genius(track, artist)
-    actual_artist = choose_most_popular_version(track, genius_artist)
-
-    # Признаки
-    tags_list = fetch_tags_lastfm(track, actual_artist)
-    themes_list = extract_themes(lyrics)
-
-    # E5-эмбеддинг
-    e5_bytes = get_text_embedding(lyrics)
-    sb_emb = sbert_model.encode([" ".join(lyrics.split()[:400])], batch_size=32)[0]
-    sb_bytes = np.array(sb_emb, dtype=np.float32).tobytes()
-    emo_bytes = get_emotion_vector(lyrics)
-    emovec = np.frombuffer(emo_bytes, dtype=np.float32)
-
-    # scalar_emotion
-    joy_idx = emotion_model.label2id.get("joy")
-    sad_idx = emotion_model.label2id.get("sadness")
-    scalar_emotion = float(emovec[joy_idx] - emovec[sad_idx]) if joy_idx is not None and sad_idx is not None else 0.0
-
-    data = {
-        "track_name": track,
-        "artist": artist,
-        "lyrics": lyrics,
-        "embedding": e5_bytes,
-        "sbert_embedding": sb_bytes,
-        "deep_emotion": scalar_emotion,
-        "deep_emotion_vec": emo_bytes,
-        # Сохраняем Python-списки для JSON-колонок
-        "themes": themes_list,
-        "genre": tags_list,
-        "lyrics_hash": lyrics_hash
-    }
-
-    entry = db.query(Lyrics).filter_by(track_name=track, artist=artist).first()
-    needs_index = False
-    if not entry:
-        entry = Lyrics(**data)
-        db.add(entry)
-        needs_index = True
-    else:
-        if entry.lyrics_hash != lyrics_hash:
-            for k, v in data.items(): setattr(entry, k, v)
-            needs_index = True
-
-    db.commit()
-
-    if needs_index:
-        faiss_service.add(entry)
-
-    # Логируем запрос
-    db.add(Log(
-        ip_address=request_info.get("ip"),
-        operation="get_lyrics",
-        status="success",
-        device_info=request_info.get("agent", "-")
-    ))
-    db.commit()
-
-    return {
-        "track": track,
-        "artist": artist,
-        "lyrics": lyrics,
-        "genre": tags_list,
-        "emotion": scalar_emotion
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import exists, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from config import INGEST_FRESH_TTL
+from database import SessionLocal
+from models import Lyrics, TrackVectors
+from .emotion import emotion_model
+from .features import FeatureContext
+from .themes import extract_themes
+from .lastfm import fetch_tags_lastfm, choose_most_popular_version
+from services.faiss_index import faiss_service
+from .feature_store import feature_store
+from .idf_cache import record_change
+from .normalize import match_key
+from .vector_store import VECTORS_READY, E5_CURRENT, E5_SCHEME
+from .result_cache import result_cache
+from .genius import genius_lookup, GeniusRecord
+from .external_io import external_io
+from .jobs import ingest_queue, IngestJob, JobError
+from .metrics import Counters
+from .request_log import request_log
+
+# db_hit — свежая запись в БД, hash_hit — текст в Genius не изменился,
+# miss — полный пересчёт признаков
+fast_path = Counters("db_hit", "hash_hit", "miss")
+
+
+def _find_entry(db: Session, key: str) -> tuple[Optional[Lyrics], bool]:
+    """
+    Строка lyrics по match_key и признак «векторы посчитаны текущей схемой E5»
+    одним запросом: наличие проверяется EXISTS по track_vectors, сами BLOB не читаются.
+    Векторы прежней схемы считаются непосчитанными — загрузка пересчитает их.
+    """
+    analyzed = exists().where(TrackVectors.track_id == Lyrics.id, VECTORS_READY, E5_CURRENT)
+    row = db.query(Lyrics, analyzed).filter(Lyrics.match_key == key).first()
+    return (row[0], bool(row[1])) if row is not None else (None, False)
+
+
+def _stored_result(entry: Lyrics) -> dict:
+    return {
+        "track": entry.track_name,
+        "artist": entry.artist,
+        "lyrics": entry.lyrics,
+        "genre": entry.genre or [],
+        "emotion": entry.deep_emotion or 0.0
+    }
+
+
+def _log_request(request_info: dict):
+    request_log.log("get_lyrics", request_info.get("ip"), request_info.get("agent", "-"))
+
+
+def _save_entry(db: Session, data: dict, vectors: dict) -> int:
+    """
+    Upsert строки lyrics по match_key и её векторов в track_vectors; возвращает id.
+    Первый оператор — INSERT ... ON CONFLICT DO NOTHING: параллельная загрузка
+    того же трека не создаёт вторую строку, а транзакция сразу держит блокировку
+    записи, так что прочитанные после него старые теги точны для дельты IDF.
+    """
+    table = Lyrics.__table__
+    obj_id = db.execute(
+        insert(table).values(**data)
+        .on_conflict_do_nothing(index_elements=[table.c.match_key])
+        .returning(table.c.id)
+    ).scalar()
+    if obj_id is None:
+        obj_id, genres, themes = db.execute(
+            select(table.c.id, table.c.genre, table.c.themes).where(table.c.match_key == data["match_key"])
+        ).one()
+        db.execute(update(table).where(table.c.id == obj_id).values(**data))
+        record_change(db, (genres, themes), (data["genre"], data["themes"]))
+    else:
+        record_change(db, None, (data["genre"], data["themes"]))
+
+    stmt = insert(TrackVectors).values(track_id=obj_id, **vectors)
+    db.execute(stmt.on_conflict_do_update(index_elements=[TrackVectors.track_id], set_=vectors))
+    return obj_id
+
+
+def fresh_analysis(db: Session, track: str, artist: str, request_info: dict) -> Optional[dict]:
+    """
+    Быстрый путь: если трек уже проанализирован и запись свежая,
+    возвращает сохранённый результат без обращений к сети и моделям.
+    """
+    entry, analyzed = _find_entry(db, match_key(track, artist))
+    if entry is None or not analyzed:
+        return None
+    checked_at = entry.updated_at or entry.created_at
+    if checked_at is None or datetime.utcnow() - checked_at > timedelta(seconds=INGEST_FRESH_TTL):
+        return None
+
+    fast_path.inc("db_hit")
+    _log_request(request_info)
+    return _stored_result(entry)
+
+
+def fast_path_stats() -> dict:
+    return {
+        **fast_path.snapshot(),
+        "hit_rate": fast_path.ratio(("db_hit", "hash_hit"), ("miss",)),
+    }
+
+
+async def lastfm_features(track: str, artist: str, job: Optional[IngestJob] = None) -> list[str]:
+    """
+    Цепочка Last.fm: выбор популярной версии, затем теги для выбранного артиста.
+    Выполняется в event loop внешнего I/O параллельно с инференсом моделей.
+    """
+    with ingest_queue.stage("lastfm_versions", job):
+        actual_artist = await choose_most_popular_version(track, artist)
+    with ingest_queue.stage("lastfm_tags", job):
+        return await fetch_tags_lastfm(track, actual_artist)
+
+
+def ingest_track(track: str, artist: str, request_info: dict) -> dict:
+    """
+    Полный цикл загрузки трека для воркера очереди: Genius → признаки → БД и FAISS.
+    """
+    db = SessionLocal()
+    try:
+        result = fresh_analysis(db, track, artist, request_info)
+    finally:
+        db.close()
+    if result is not None:
+        return result
+
+    with ingest_queue.stage("genius"):
+        record = genius_lookup.resolve(track, artist)
+    ctx = FeatureContext(record.lyrics)
+    if ctx.word_count < 10:
+        raise JobError("Текст слишком короткий или не найден", status_code=404)
+
+    db = SessionLocal()
+    try:
+        return process_and_save_lyrics(db, track, artist, record, request_info, ctx)
+    finally:
+        db.close()
+
+
+def process_and_save_lyrics(
+    db: Session, track: str, artist: str, record: GeniusRecord, request_info: dict,
+    ctx: Optional[FeatureContext] = None
+) -> dict:
+    lyrics = record.lyrics
+    ctx = ctx or FeatureContext(lyrics)
+    lyrics_hash = hashlib.md5(lyrics.encode()).hexdigest()
+
+    # Текст не изменился — признаки пересчитывать незачем
+    key = match_key(track, artist)
+    entry, analyzed = _find_entry(db, key)
+    if entry is not None and entry.lyrics_hash == lyrics_hash and analyzed:
+        fast_path.inc("hash_hit")
+        entry.updated_at = datetime.utcnow()
+        db.commit()
+        _log_request(request_info)
+        return _stored_result(entry)
+    fast_path.inc("miss")
+
+    # Артист уже уточнён Genius — Last.fm запускаем в фоне, пока считаются модели
+    lastfm_future = external_io.submit(
+        lastfm_features(track, record.canonical_artist, ingest_queue.current_job())
+    )
+
+    # Признаки: чанки E5 кодируются один раз и общие для эмбеддинга и тем
+    with ingest_queue.stage("e5"):
+        e5_bytes = ctx.e5_embedding.tobytes()
+    with ingest_queue.stage("themes"):
+        themes_list = extract_themes(ctx)
+    with ingest_queue.stage("sbert"):
+        sb_bytes = ctx.sbert_embedding.tobytes()
+    with ingest_queue.stage("emotion"):
+        emovec = ctx.emotion_vector
+    emo_bytes = emovec.tobytes()
+
+    # scalar_emotion
+    joy_idx = emotion_model.label2id.get("joy")
+    sad_idx = emotion_model.label2id.get("sadness")
+    scalar_emotion = float(emovec[joy_idx] - emovec[sad_idx]) if joy_idx is not None and sad_idx is not None else 0.0
+
+    with ingest_queue.stage("lastfm_wait"):
+        tags_list = lastfm_future.result()
+
+    data = {
+        "track_name": track,
+        "artist": artist,
+        "match_key": key,
+        "lyrics": lyrics,
+        "deep_emotion": scalar_emotion,
+        # Сохраняем Python-списки для JSON-колонок
+        "themes": themes_list,
+        "genre": tags_list,
+        "lyrics_hash": lyrics_hash
+    }
+    vectors = {"e5": e5_bytes, "sbert": sb_bytes, "emotion": emo_bytes, "e5_scheme": E5_SCHEME}
+
+    with ingest_queue.stage("db_write"):
+        obj_id = _save_entry(db, data, vectors)
+        db.commit()
+        entry = db.get(Lyrics, obj_id)
+
+    with ingest_queue.stage("faiss_add"):
+        old_genres, old_themes = feature_store.tags(entry.id)
+        faiss_service.add(entry)
+        feature_store.add(entry)
+        genres, themes = feature_store.tags(entry.id)
+        result_cache.invalidate_track(entry.id, old_genres | genres, old_themes | themes)
+
+    # Логируем запрос
+    _log_request(request_info)
+
+    return {
+        "track": track,
+        "artist": artist,
+        "lyrics": lyrics,
+        "genre": tags_list,
+        "emotion": scalar_emotion
     }
\ No newline at end of file
@@ -0,0 +1,86 @@
+import bisect
+import threading
+
+
+class StageTimings:
+    """
+    Потокобезопасная статистика длительности этапов: количество, среднее и максимум.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            s = self._stats.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0})
+            s["count"] += 1
+            s["total"] += seconds
+            s["max"] = max(s["max"], seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                stage: {
+                    "count":  s["count"],
+                    "avg_ms": round(s["total"] / s["count"] * 1000, 1),
+                    "max_ms": round(s["max"] * 1000, 1),
+                }
+                for stage, s in self._stats.items()
+            }
+
+
+class Counters:
+    """
+    Потокобезопасные именованные счётчики (hit/miss и т.п.).
+    """
+    def __init__(self, *names: str):
+        self._lock = threading.Lock()
+        self._values: dict[str, int] = {name: 0 for name in names}
+
+    def inc(self, name: str, value: int = 1):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def ratio(self, hits: tuple, misses: tuple) -> float:
+        """
+        Доля счётчиков hits среди hits + misses (hit rate).
+        """
+        with self._lock:
+            hit = sum(self._values.get(n, 0) for n in hits)
+            total = hit + sum(self._values.get(n, 0) for n in misses)
+            return round(hit / total, 4) if total else 0.0
+
+
+class Histogram:
+    """
+    Потокобезопасная гистограмма с фиксированными границами корзин.
+    """
+    def __init__(self, buckets: tuple):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._count += 1
+            self._total += value
+            self._max = max(self._max, value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"<={b:g}" for b in self.buckets] + ["+inf"]
+            return {
+                "count":   self._count,
+                "avg":     round(self._total / self._count, 3) if self._count else 0.0,
+                "max":     round(self._max, 3),
+                "buckets": dict(zip(labels, self._counts)),
+            }
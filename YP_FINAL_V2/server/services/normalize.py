@@ -0,0 +1,26 @@
+import unicodedata
+
+# Апострофы внутри слов выбрасываются (Don't → dont), прочая пунктуация — разделитель слов
+_APOSTROPHES = "'’‘`´ʼ"
+
+
+def normalize_title(value: str) -> str:
+    """
+    Каноничный вид названия для сопоставления треков: NFKC, casefold, без
+    апострофов, прочая пунктуация заменена пробелом, пробелы схлопнуты.
+    Строка из одной пунктуации не обнуляется: остаётся её casefold без лишних пробелов.
+    """
+    text = unicodedata.normalize("NFKC", value or "").casefold()
+    chars = [
+        " " if unicodedata.category(ch).startswith("P") else ch
+        for ch in text if ch not in _APOSTROPHES
+    ]
+    return " ".join("".join(chars).split()) or " ".join(text.split())
+
+
+def match_key(track: str, artist: str) -> str:
+    """
+    Ключ уникальности строки lyrics (уникальный индекс по lyrics.match_key):
+    «Artist - Song!» и «artist  -  song» — один трек.
+    """
+    return f"{normalize_title(artist)}\t{normalize_title(track)}"
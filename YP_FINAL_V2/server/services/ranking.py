@@ -0,0 +1,181 @@
+from typing import Iterable
+
+import numpy as np
+from config import THEME_BONUS, GENRE_BONUS, OVERLAP_RATIO_BONUS, LENGTH_NORMALIZATION
+
+
+class TagIncidence:
+    """
+    Разреженная матрица инцидентности «трек × тег» в CSR-виде (indptr, indices);
+    столбцы — id тегов в словаре.
+    """
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_sets(cls, rows: Iterable[set], vocab: dict[str, int]) -> "TagIncidence":
+        # Теги, которых нет в словаре, в него добавляются
+        indptr, indices = [0], []
+        for tags in rows:
+            indices.extend(vocab.setdefault(t, len(vocab)) for t in tags)
+            indptr.append(len(indices))
+        return cls(np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def row(self, i: int) -> np.ndarray:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def take(self, rows: np.ndarray) -> "TagIncidence":
+        """
+        Подматрица из строк rows (в их порядке).
+        """
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        offsets = np.repeat(starts - indptr[:-1], lengths)
+        return TagIncidence(indptr, self.indices[np.arange(indptr[-1]) + offsets])
+
+    def row_sums(self, weights: np.ndarray) -> np.ndarray:
+        # (матрица инцидентности) @ weights: сумма весов тегов каждой строки
+        entry_rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        return np.bincount(entry_rows, weights=weights[self.indices], minlength=len(self))
+
+
+class FeatureRows:
+    """
+    Признаки нескольких треков для ранжирования: id, (трек, артист),
+    нормированные векторы модальностей, число слов, жанры и темы.
+    """
+    def __init__(
+        self, ids: np.ndarray, names: list[tuple[str, str]], vectors: dict[str, np.ndarray],
+        word_counts: np.ndarray, genres: TagIncidence, themes: TagIncidence
+    ):
+        self.ids = ids
+        self.names = names
+        self.vectors = vectors
+        self.word_counts = word_counts
+        self.genres = genres
+        self.themes = themes
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def take(self, rows: np.ndarray) -> "FeatureRows":
+        return FeatureRows(
+            self.ids[rows], [self.names[i] for i in rows], {m: v[rows] for m, v in self.vectors.items()},
+            self.word_counts[rows], self.genres.take(rows), self.themes.take(rows)
+        )
+
+
+def idf_vector(idf: dict[str, float], vocab: dict[str, int]) -> np.ndarray:
+    weights = np.zeros(len(vocab), dtype=np.float64)
+    for tag, col in vocab.items():
+        weights[col] = idf.get(tag, 0)
+    return weights
+
+
+def _in_source(src_cols: np.ndarray, size: int) -> np.ndarray:
+    in_src = np.zeros(size, dtype=np.float64)
+    in_src[src_cols] = 1.0
+    return in_src
+
+
+def tfidf_overlap(src_cols: np.ndarray, incidence: TagIncidence, weights: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Для каждой строки incidence: доля IDF-веса общих с источником тегов в IDF-весе
+    объединения и доля общих тегов в объединении (по числу).
+    weights — IDF по id тегов.
+    """
+    in_src = _in_source(src_cols, len(weights))
+    common_w = incidence.row_sums(weights * in_src)
+    union_w  = weights[src_cols].sum() + incidence.row_sums(weights * (1 - in_src))
+    common_n = incidence.row_sums(in_src)
+    union_n  = len(src_cols) + np.diff(incidence.indptr) - common_n
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # объединение с нулевым весом (теги есть во всех треках) даёт 0, а не деление на ноль
+        tfidf = np.where(union_w > 0, common_w / union_w, 0.0)
+        ratio = np.where(union_n > 0, common_n / union_n, 0.0)
+    return tfidf, ratio
+
+
+def pick_neighbors(src: FeatureRows, cand: FeatureRows, limit: int = 30) -> FeatureRows:
+    """
+    До limit кандидатов в порядке FAISS с общим жанром и общей темой;
+    сам источник и повторы id отбрасываются.
+    """
+    genre_size = int(max(src.genres.indices.max(initial=-1), cand.genres.indices.max(initial=-1))) + 1
+    theme_size = int(max(src.themes.indices.max(initial=-1), cand.themes.indices.max(initial=-1))) + 1
+    # require common genre and theme
+    common_g = cand.genres.row_sums(_in_source(src.genres.row(0), genre_size))
+    common_t = cand.themes.row_sums(_in_source(src.themes.row(0), theme_size))
+    _, first = np.unique(cand.ids, return_index=True)
+    unique = np.zeros(len(cand), dtype=bool)
+    unique[first] = True
+    keep = np.flatnonzero((common_g > 0) & (common_t > 0) & (cand.ids != src.ids[0]) & unique)
+    return cand.take(keep[:limit])
+
+
+def score_candidates(
+    src: FeatureRows, cand: FeatureRows, weights: dict,
+    genre_idf: np.ndarray, theme_idf: np.ndarray
+) -> dict[str, np.ndarray]:
+    """
+    Оценки всех кандидатов сразу: по одному умножению матрицы на вектор на модальность,
+    TF-IDF пересечения жанров и тем через матрицы инцидентности.
+    """
+    cos_sim = cand.vectors["e5"] @ src.vectors["e5"][0]
+    sb_sim  = cand.vectors["sbert"] @ src.vectors["sbert"][0]
+    emo_sim = cand.vectors["emotion"] @ src.vectors["emotion"][0]
+
+    theme_tfidf, _             = tfidf_overlap(src.themes.row(0), cand.themes, theme_idf)
+    genre_tfidf, overlap_ratio = tfidf_overlap(src.genres.row(0), cand.genres, genre_idf)
+
+    raw_score    = weights["sbert"] * sb_sim + weights["e5"] * cos_sim + weights["emotion"] * emo_sim
+    bonus        = (1 + THEME_BONUS * theme_tfidf + GENRE_BONUS * genre_tfidf + OVERLAP_RATIO_BONUS * overlap_ratio)
+    length_bonus = np.minimum(cand.word_counts, LENGTH_NORMALIZATION) / LENGTH_NORMALIZATION
+    score        = np.minimum(raw_score * bonus * length_bonus, 0.9999)
+    return {
+        "score":         score,
+        "cos_sim":       cos_sim,
+        "sb_sim":        sb_sim,
+        "emo_sim":       emo_sim,
+        "theme_tfidf":   theme_tfidf,
+        "genre_tfidf":   genre_tfidf,
+        "overlap_ratio": overlap_ratio,
+    }
+
+
+def rank_candidates(
+    src: FeatureRows, cand: FeatureRows, weights: dict,
+    genre_idf: np.ndarray, theme_idf: np.ndarray, limit: int = 5
+) -> list[dict]:
+    """
+    Итоговая оценка кандидатов (косинусы модальностей, бонусы TF-IDF жанров и тем,
+    длина текста) и top-limit.
+    """
+    if not len(cand):
+        return []
+    s = score_candidates(src, cand, weights, genre_idf, theme_idf)
+
+    similarity = [round(float(x) * 100, 2) for x in s["score"]]
+    final = []
+    # сортировка стабильна: при равных оценках сохраняется порядок кандидатов из FAISS;
+    # дубликатов (трек, артист) нет — match_key в lyrics уникален
+    for i in sorted(range(len(cand)), key=lambda i: -similarity[i])[:limit]:
+        pair = cand.names[i]
+        final.append({
+            "track":            pair[0],
+            "artist":           pair[1],
+            "similarity":       similarity[i],
+            "sbert_similarity": round(max(float(s["sb_sim"][i]),  0) * 100, 2),
+            "cosine_semantic":  round(max(float(s["cos_sim"][i]), 0) * 100, 2),
+            "emotion_sim":      round(float(s["emo_sim"][i]) * 100,   2),
+            "theme_tfidf":      round(float(s["theme_tfidf"][i]) * 100, 2),
+            "genre_tfidf":      round(float(s["genre_tfidf"][i]) * 100, 2),
+            "overlap_ratio":    round(float(s["overlap_ratio"][i]) * 100, 2),
+        })
+    return final
@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import Engine
+
+from config import logger, REQUEST_LOG_DATABASE_URL, REQUEST_LOG_BATCH, REQUEST_LOG_FLUSH_MS, REQUEST_LOG_QUEUE_MAX
+from models import Log
+from storage import PRAGMAS, is_file_sqlite, sqlite_engine, write_engine
+from .metrics import Counters, Histogram
+
+FLUSH_SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024)
+FLUSH_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+# Метка остановки в очереди: всё, что встало раньше неё, будет записано
+_STOP = object()
+
+
+def log_engine(url: str) -> Engine:
+    """
+    Движок журнала: пустой URL — основная БД (общий пишущий движок),
+    иначе отдельный файл, чья блокировка записи не мешает загрузке треков.
+    """
+    if not url:
+        return write_engine
+    if is_file_sqlite(url):
+        return sqlite_engine(url, PRAGMAS, pool_size=1)
+    return create_engine(url)
+
+
+class RequestLogWriter:
+    """
+    Буферизованная запись журнала запросов (таблица logs).
+    Эндпоинты только кладут событие в очередь; фоновый поток пишет события
+    пачкой в одной транзакции, когда набралось max_batch строк или прошло
+    flush_ms с первого события пачки. Время события фиксируется при постановке.
+    Переполненная очередь (запись отстала) отбрасывает новые события — ответ
+    клиенту важнее строки журнала; shutdown() дописывает всё накопленное.
+    """
+    def __init__(self, engine: Engine, max_batch: int, flush_ms: float, max_queue: int):
+        self.engine = engine
+        self.max_batch = max(1, max_batch)
+        self.max_wait = flush_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._table_ready = False
+        self.counters = Counters("queued", "written", "dropped", "failed", "flushes")
+        self.flush_sizes = Histogram(FLUSH_SIZE_BUCKETS)
+        self.flush_ms = Histogram(FLUSH_LATENCY_BUCKETS_MS)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="request-log", daemon=True)
+                self._thread.start()
+
+    def log(self, operation: str, ip: Optional[str], agent: Optional[str], status: str = "success"):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait({
+                "timestamp":   datetime.utcnow(),
+                "ip_address":  ip,
+                "operation":   operation,
+                "status":      status,
+                "device_info": agent or "-",
+            })
+        except queue.Full:
+            self.counters.inc("dropped")
+            return
+        self.counters.inc("queued")
+
+    def _collect(self) -> tuple[list[dict], bool]:
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _flush(self, rows: list[dict]):
+        if not rows:
+            return
+        started = time.perf_counter()
+        try:
+            if not self._table_ready:
+                Log.__table__.create(self.engine, checkfirst=True)
+                self._table_ready = True
+            with self.engine.begin() as conn:
+                conn.execute(insert(Log), rows)
+        except Exception:
+            logger.exception(f"Не удалось записать журнал запросов ({len(rows)} строк)")
+            self.counters.inc("failed", len(rows))
+            return
+        self.counters.inc("written", len(rows))
+        self.counters.inc("flushes")
+        self.flush_sizes.observe(len(rows))
+        self.flush_ms.observe((time.perf_counter() - started) * 1000)
+
+    def _loop(self):
+        while True:
+            batch, stop = self._collect()
+            self._flush(batch)
+            if stop:
+                return
+
+    def shutdown(self, timeout: float = 10.0):
+        """
+        Дописывает накопленные события и останавливает поток записи.
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"Журнал запросов: запись не завершилась за {timeout} с, в очереди {self._queue.qsize()}")
+
+    def stats(self) -> dict:
+        return {
+            **self.counters.snapshot(),
+            "pending":          self._queue.qsize(),
+            "max_batch":        self.max_batch,
+            "flush_ms":         self.max_wait * 1000,
+            "separate_db":      self.engine is not write_engine,
+            "flush_size":       self.flush_sizes.snapshot(),
+            "flush_latency_ms": self.flush_ms.snapshot(),
+        }
+
+
+# Singleton instance
+request_log = RequestLogWriter(
+    log_engine(REQUEST_LOG_DATABASE_URL), REQUEST_LOG_BATCH, REQUEST_LOG_FLUSH_MS, REQUEST_LOG_QUEUE_MAX
+)
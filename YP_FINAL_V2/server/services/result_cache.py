@@ -0,0 +1,207 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from config import RESULT_CACHE_MAX_BYTES, RESULT_CACHE_IDF_RTOL
+from .metrics import Counters
+
+# Оценка накладных расходов на запись и на одну зависимость в обратных индексах
+ENTRY_OVERHEAD = 256
+DEP_OVERHEAD   = 64
+
+
+def result_key(source_id: int, generation: int, weights: dict[str, float], top_k: int) -> tuple:
+    """
+    Ключ кеша: id затравки, поколение индекса FAISS и параметры ранжирования.
+    """
+    return (source_id, generation, tuple(sorted((m, round(w, 6)) for m, w in weights.items())), top_k)
+
+
+class _Entry:
+    __slots__ = ("value", "size", "ids", "filter", "genres", "themes")
+
+    def __init__(self, value: list, size: int, ids: frozenset, filter: tuple, genres: frozenset, themes: frozenset):
+        self.value = value
+        self.size = size
+        self.ids = ids          # затравка и все кандидаты FAISS
+        self.filter = filter    # (жанры, темы) затравки — фильтр поиска
+        self.genres = genres    # жанры и темы, чей IDF входит в оценки (затравка и соседи)
+        self.themes = themes
+
+
+class ResultCache:
+    """
+    LRU-кеш готовых (нерасшифрованных) списков /find_similar, ограниченный
+    RESULT_CACHE_MAX_BYTES.
+
+    Ключ — затравка, поколение индекса и веса, поэтому смена весов или
+    перестройка индекса не выдают чужой ответ. Внутри поколения записи
+    снимаются точечно:
+      - загрузка трека X сбрасывает записи, где X — затравка или кандидат,
+        и записи, чей фильтр «общий жанр и общая тема» пропустил бы X;
+      - пересчёт IDF сбрасывает записи с жанрами и темами, чей IDF сдвинулся
+        больше чем на RESULT_CACHE_IDF_RTOL относительно опорного значения.
+    Ответ, посчитанный во время такого сброса, в кеш не кладётся (см. token()).
+    """
+    def __init__(self, max_bytes: int, idf_rtol: float):
+        self.max_bytes = max_bytes
+        self.idf_rtol = idf_rtol
+        self.counters = Counters("hit", "miss", "put", "stale_put", "evicted", "invalidated")
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._by_id: dict[int, set[tuple]] = {}
+        self._by_tag: dict[str, set[tuple]] = {}    # "g:жанр" / "t:тема" → ключи
+        self._bytes = 0
+        self._epoch = 0
+        self._idf_ref: dict[str, dict[str, float]] = {"g": {}, "t": {}}
+
+    def get(self, key: tuple) -> Optional[list]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters.inc("miss")
+                return None
+            self._entries.move_to_end(key)
+        self.counters.inc("hit")
+        return entry.value
+
+    def token(self) -> int:
+        """
+        Метка до начала расчёта; put() с устаревшей меткой игнорируется.
+        """
+        with self._lock:
+            return self._epoch
+
+    def put(
+        self, key: tuple, value: list, token: int, ids: Iterable[int],
+        src_tags: tuple, genres: Iterable[str], themes: Iterable[str]
+    ):
+        """
+        ids — затравка и кандидаты FAISS, src_tags — (жанры, темы) затравки,
+        genres/themes — теги затравки и отобранных соседей.
+        """
+        ids, genres, themes = frozenset(ids), frozenset(genres), frozenset(themes)
+        src_tags = (frozenset(src_tags[0]), frozenset(src_tags[1]))
+        size = (
+            len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+            + ENTRY_OVERHEAD + DEP_OVERHEAD * (len(ids) + len(genres) + len(themes))
+        )
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if token != self._epoch:
+                self.counters.inc("stale_put")
+                return
+            self._discard(key)
+            self._entries[key] = _Entry(value, size, ids, src_tags, genres, themes)
+            self._bytes += size
+            for i in ids:
+                self._by_id.setdefault(i, set()).add(key)
+            for tag in self._tag_keys(genres, themes):
+                self._by_tag.setdefault(tag, set()).add(key)
+            evicted = 0
+            while self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                evicted += 1
+        self.counters.inc("put")
+        self.counters.inc("evicted", evicted)
+
+    @staticmethod
+    def _tag_keys(genres: Iterable[str], themes: Iterable[str]) -> list[str]:
+        return [f"g:{g}" for g in genres] + [f"t:{t}" for t in themes]
+
+    def _discard(self, key: tuple) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        for i in entry.ids:
+            keys = self._by_id.get(i)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_id[i]
+        for tag in self._tag_keys(entry.genres, entry.themes):
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+        return True
+
+    def _drop(self, keys: Iterable[tuple]) -> int:
+        dropped = sum(self._discard(key) for key in list(keys))
+        self.counters.inc("invalidated", dropped)
+        return dropped
+
+    # --- Инвалидация ---
+
+    def invalidate_track(self, obj_id: int, genres: Iterable[str], themes: Iterable[str]) -> int:
+        """
+        Трек добавлен, заменён или удалён; genres/themes — его теги до и после изменения.
+        """
+        return self.invalidate_tracks([(obj_id, genres, themes)])
+
+    def invalidate_tracks(self, tracks: Iterable[tuple[int, Iterable[str], Iterable[str]]]) -> int:
+        """
+        invalidate_track() для нескольких треков (id, жанры, темы) разом.
+        """
+        with self._lock:
+            self._epoch += 1
+            stale = set()
+            for obj_id, genres, themes in tracks:
+                themes = set(themes)
+                stale.update(self._by_id.get(obj_id, ()))
+                for g in set(genres):
+                    # Теги затравки входят в её теги IDF, так что записи с общим жанром есть в _by_tag
+                    for key in self._by_tag.get(f"g:{g}", ()):
+                        src_genres, src_themes = self._entries[key].filter
+                        # Через фильтр в кандидаты затравки X проходит, только если у них есть общий жанр и общая тема
+                        if g in src_genres and src_themes & themes:
+                            stale.add(key)
+            return self._drop(stale)
+
+    def invalidate_idf(self, genre_idf: dict[str, float], theme_idf: dict[str, float]) -> int:
+        """
+        Вызывается после пересчёта IDF: сбрасывает записи с тегами, чей IDF заметно сдвинулся.
+        """
+        with self._lock:
+            self._epoch += 1
+            stale = set()
+            for kind, idf in (("g", genre_idf), ("t", theme_idf)):
+                ref = self._idf_ref[kind]
+                for tag in set(ref) | set(idf):
+                    old, new = ref.get(tag), idf.get(tag)
+                    if old is not None and new is not None and abs(new - old) <= self.idf_rtol * abs(old):
+                        continue
+                    stale.update(self._by_tag.get(f"{kind}:{tag}", ()))
+                    if new is None:
+                        ref.pop(tag, None)
+                    else:
+                        ref[tag] = new
+            return self._drop(stale)
+
+    def clear(self):
+        """
+        Сбрасывает все записи: вызывается при смене поколения индекса FAISS.
+        """
+        with self._lock:
+            self._epoch += 1
+            self._drop(list(self._entries))
+
+    def stats(self) -> dict:
+        counts = self.counters.snapshot()
+        with self._lock:
+            entries, size = len(self._entries), self._bytes
+        return {
+            **counts,
+            "hit_rate":  self.counters.ratio(("hit",), ("miss",)),
+            "entries":   entries,
+            "bytes":     size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Singleton instance
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_IDF_RTOL)
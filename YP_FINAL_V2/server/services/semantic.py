@@ -1,62 +1,117 @@
-import numpy as np
-import torch
-from functools import lru_cache
-from transformers import AutoTokenizer, AutoModel
-from torch.quantization import quantize_dynamic
-from sentence_transformers import SentenceTransformer
-
-class SemanticEncoder:
-    def __init__(self):
-        # Инициализация токенизатора и модели E5 с динамической квантзацией
-        self.tokenizer = AutoTokenizer.from_pretrained("intfloat/multilingual-e5-large")
-        model = AutoModel.from_pretrained("intfloat/multilingual-e5-large")
-        self.model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
-
-    def encode(self, text: str) -> np.ndarray:
-        """
-        Кодирует длинный текст в один эмбеддинг E5.
-        Делит текст на чанки по ~200 слов, кодирует каждый с max_length=256,
-        затем усредняет и нормализует итоговый вектор.
-        """
-        # Подготовка слов
-        words = text.replace("\n", " ").split()
-        if not words:
-            # Возвращаем вектор нулей, если текст пуст
-            hidden_size = self.model.config.hidden_size
-            return np.zeros(hidden_size, dtype=np.float32)
-
-        # Разбиение на чанки (~200 слов)
-        chunk_size = 200
-        embeddings = []
-        for i in range(0, len(words), chunk_size):
-            chunk = " ".join(words[i:i + chunk_size])
-            prompt = "query: " + chunk.strip()
-            inputs = self.tokenizer(
-                prompt,
-                return_tensors="pt",
-                truncation=True,
-                max_length=256
-            )
-            with torch.no_grad():
-                output = self.model(**inputs).last_hidden_state[:, 0]
-            emb = torch.nn.functional.normalize(output, dim=1)
-            embeddings.append(emb.squeeze(0))
-
-        # Усреднение чанковых эмбеддингов и окончательная нормализация
-        stacked = torch.stack(embeddings, dim=0)
-        pooled = torch.mean(stacked, dim=0, keepdim=True)
-        pooled = torch.nn.functional.normalize(pooled, dim=1)
-        return pooled.squeeze(0).cpu().numpy().astype(np.float32)
-
-# Объект энкодера
-semantic_encoder = SemanticEncoder()
-
-@lru_cache(maxsize=10000)
-def get_text_embedding(text: str) -> bytes:
-    """
-    Возвращает агрегированный эмбеддинг текста в виде байтов для хранения в БД.
-    """
-    return semantic_encoder.encode(text).tobytes()
-
-# SBERT для тонкой оценки сходства (оставляем без изменений на текущем этапе)
-sbert_model = SentenceTransformer("distiluse-base-multilingual-cased-v1")
\ No newline at end of file
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+from torch.quantization import quantize_dynamic
+from sentence_transformers import SentenceTransformer
+
+from config import E5_MAX_LENGTH, E5_MAX_BATCH, E5_BULK_BATCH, SBERT_MAX_BATCH, INFER_MAX_WAIT_MS
+from .batching import MicroBatcher
+
+E5_MODEL_ID = "intfloat/multilingual-e5-large"
+
+class SemanticEncoder:
+    def __init__(self, max_length: int = E5_MAX_LENGTH):
+        # Инициализация токенизатора и модели E5 с динамической квантзацией
+        self.model_id = E5_MODEL_ID
+        self.tokenizer = AutoTokenizer.from_pretrained(E5_MODEL_ID)
+        model = AutoModel.from_pretrained(E5_MODEL_ID)
+        self.model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.max_length = max_length
+        # Окно чанка в токенах: max_length минус префикс "query: " и спецтокены
+        self.prefix_ids = self.tokenizer("query: ", add_special_tokens=False)["input_ids"]
+        self.window = max_length - len(self.prefix_ids) - self.tokenizer.num_special_tokens_to_add()
+
+    def token_count(self, text: str) -> int:
+        return len(self.tokenizer(text.replace("\n", " "), add_special_tokens=False, verbose=False)["input_ids"])
+
+    def chunk(self, text: str) -> list[list[int]]:
+        """
+        Токенизирует текст один раз и режет его на окна, целиком заполняющие
+        max_length модели. Возвращает готовые input_ids чанков с префиксом
+        "query: " и спецтокенами.
+        """
+        ids = self.tokenizer(text.replace("\n", " "), add_special_tokens=False, verbose=False)["input_ids"]
+        return [
+            self.tokenizer.build_inputs_with_special_tokens(self.prefix_ids + ids[i:i + self.window])
+            for i in range(0, len(ids), self.window)
+        ]
+
+    def _forward(self, chunks: list[list[int]]) -> np.ndarray:
+        """
+        Один паддированный прогон модели по чанкам близкой длины.
+        """
+        longest = max(len(c) for c in chunks)
+        input_ids = torch.full((len(chunks), longest), self.tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(chunks), longest), dtype=torch.long)
+        for row, ids in enumerate(chunks):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+        with torch.no_grad():
+            output = self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state[:, 0]
+        emb = torch.nn.functional.normalize(output, dim=1)
+        return emb.cpu().numpy().astype(np.float32)
+
+    def encode_chunks(self, chunks: list[list[int]], batch_size: int = E5_MAX_BATCH) -> np.ndarray:
+        """
+        Кодирует чанки батчами, сгруппированными по длине в токенах, чтобы
+        паддинг был минимальным. Возвращает матрицу нормализованных
+        CLS-эмбеддингов (len(chunks), hidden) в исходном порядке.
+        """
+        result = np.zeros((len(chunks), self.model.config.hidden_size), dtype=np.float32)
+        order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            result[bucket] = self._forward([chunks[i] for i in bucket])
+        return result
+
+    def pool(self, chunk_embeddings: np.ndarray) -> np.ndarray:
+        """
+        Усредняет эмбеддинги чанков и нормализует итоговый вектор.
+        """
+        if len(chunk_embeddings) == 0:
+            return np.zeros(self.model.config.hidden_size, dtype=np.float32)
+        pooled = chunk_embeddings.mean(axis=0)
+        pooled /= (np.linalg.norm(pooled) + 1e-12)
+        return pooled.astype(np.float32)
+
+    def encode(self, text: str) -> np.ndarray:
+        """
+        Кодирует длинный текст в один эмбеддинг E5: все чанки документа
+        идут одним батчем, затем усредняются и нормализуются.
+        """
+        return self.pool(self.encode_chunks(self.chunk(text)))
+
+    def encode_many(self, texts: list[str], batch_size: int = E5_BULK_BATCH) -> np.ndarray:
+        """
+        Массовое кодирование: чанки всех текстов сортируются по длине и идут
+        общими батчами, затем пулятся по документам. Матрица (len(texts), hidden).
+        """
+        if not texts:
+            return np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+        chunks, owners = [], []
+        for doc, text in enumerate(texts):
+            for c in self.chunk(text):
+                chunks.append(c)
+                owners.append(doc)
+        embeddings = self.encode_chunks(chunks, batch_size)
+        owners = np.asarray(owners, dtype=np.int64)
+        return np.stack([self.pool(embeddings[owners == doc]) for doc in range(len(texts))])
+
+# Объект энкодера
+semantic_encoder = SemanticEncoder()
+
+# Чанки от всех конкурентных загрузок кодируются общими батчами
+e5_batcher = MicroBatcher(
+    "e5",
+    lambda chunks: list(semantic_encoder.encode_chunks(chunks)),
+    E5_MAX_BATCH, INFER_MAX_WAIT_MS
+)
+
+# SBERT для тонкой оценки сходства (оставляем без изменений на текущем этапе)
+sbert_model = SentenceTransformer("distiluse-base-multilingual-cased-v1")
+
+sbert_batcher = MicroBatcher(
+    "sbert",
+    lambda texts: list(sbert_model.encode(texts, batch_size=len(texts))),
+    SBERT_MAX_BATCH, INFER_MAX_WAIT_MS
+)
\ No newline at end of file
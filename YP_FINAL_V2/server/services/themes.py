@@ -1,77 +1,114 @@
-# server/services/themes.py
-import re
-import json
-import numpy as np
-from typing import List
-from nltk.stem.snowball import SnowballStemmer
-from functools import lru_cache
-from .semantic import semantic_encoder
-import os
-
-file_path = os.path.join(os.path.dirname(__file__), "themes.json")
-
-# Инициализация стеммеров
-russian_stemmer = SnowballStemmer("russian")
-english_stemmer = SnowballStemmer("english")
-
-
-# Загружаем словарь тем
-with open(file_path, "r", encoding="utf-8") as f:
-    theme_map = json.load(f)
-    
-# Стеммированная карта
-def build_stemmed_map():
-    reverse, smap = {}, {}
-    for theme, words in theme_map.items():
-        stems = set()
-        for word in words:
-            stemmer = russian_stemmer if re.search(r"[а-яА-Я]", word) else english_stemmer
-            stem = stemmer.stem(word)
-            if stem not in reverse:
-                reverse[stem] = theme
-                stems.add(stem)
-        smap[theme] = stems
-    return smap
-
-STEMMED_THEME_MAP = build_stemmed_map()
-
-# Эмбеддинги тем
-THEME_EMBEDDINGS = {
-    theme: semantic_encoder.encode(" ".join(words))
-    for theme, words in theme_map.items()
-}
-
-def extract_themes(text: str, top_k: int = 5, sim_threshold: float = 0.5) -> List[str]:
-    tokens = re.findall(r"\b\w{3,}\b", text.lower())
-    counter = {}
-
-    for token in tokens:
-        stemmer = russian_stemmer if re.search(r"[а-яА-Я]", token) else english_stemmer
-        stem = stemmer.stem(token)
-        for theme, stems in STEMMED_THEME_MAP.items():
-            if stem in stems:
-                counter[theme] = counter.get(theme, 0) + 1
-
-    rule_based = [t for t, c in counter.items() if c >= 2]
-
-    snippet = " ".join(text.split()[:512])
-    emb = semantic_encoder.encode(snippet)
-    norm_emb = np.linalg.norm(emb) + 1e-10
-
-    sims = {
-        theme: float(np.dot(emb, theme_emb) / (norm_emb * (np.linalg.norm(theme_emb) + 1e-10)))
-        for theme, theme_emb in THEME_EMBEDDINGS.items()
-    }
-
-    sem_based = [t for t, s in sims.items() if s >= sim_threshold]
-    if not sem_based:
-        sem_based = [t for t, _ in sorted(sims.items(), key=lambda x: -x[1])[:top_k]]
-
-    themes = []
-    for t in rule_based + sem_based:
-        if t not in themes:
-            themes.append(t)
-        if len(themes) >= top_k:
-            break
-
-    return themes
+# server/services/themes.py
+import re
+import json
+import hashlib
+import numpy as np
+from typing import List
+from nltk.stem.snowball import SnowballStemmer
+from functools import lru_cache
+from config import logger, DATA_DIR
+from .semantic import semantic_encoder
+from .features import FeatureContext
+import os
+
+file_path = os.path.join(os.path.dirname(__file__), "themes.json")
+
+# Инициализация стеммеров
+russian_stemmer = SnowballStemmer("russian")
+english_stemmer = SnowballStemmer("english")
+
+
+# Загружаем словарь тем
+with open(file_path, "rb") as f:
+    themes_raw = f.read()
+theme_map = json.loads(themes_raw.decode("utf-8"))
+    
+# Стеммированная карта
+def build_stemmed_map():
+    reverse, smap = {}, {}
+    for theme, words in theme_map.items():
+        stems = set()
+        for word in words:
+            stemmer = russian_stemmer if re.search(r"[а-яА-Я]", word) else english_stemmer
+            stem = stemmer.stem(word)
+            if stem not in reverse:
+                reverse[stem] = theme
+                stems.add(stem)
+        smap[theme] = stems
+    return smap
+
+STEMMED_THEME_MAP = build_stemmed_map()
+
+# Эмбеддинги тем: нормализованная матрица (темы × hidden) в порядке theme_map.
+# Считается один раз и сохраняется в DATA_DIR; ключ — хеш themes.json,
+# модели и окна чанка, так что при их изменении матрица пересобирается.
+THEME_NAMES = list(theme_map)
+
+
+def theme_matrix_path() -> str:
+    digest = hashlib.sha256()
+    digest.update(themes_raw)
+    digest.update(f"{semantic_encoder.model_id}:{semantic_encoder.max_length}".encode("utf-8"))
+    return os.path.join(DATA_DIR, f"theme_matrix-{digest.hexdigest()[:16]}.npy")
+
+
+def load_theme_matrix() -> np.ndarray:
+    path = theme_matrix_path()
+    if os.path.exists(path):
+        matrix = np.load(path, mmap_mode="r")
+        if matrix.shape[0] == len(THEME_NAMES):
+            return matrix
+        logger.warning(f"Матрица тем {path} не совпадает со словарём, пересобираем")
+
+    matrix = semantic_encoder.encode_many([" ".join(words) for words in theme_map.values()])
+    matrix /= (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-10)
+    matrix = matrix.astype(np.float32)
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            np.save(out, matrix)
+        os.replace(tmp_path, path)
+        logger.info(f"Матрица тем сохранена: {path} {matrix.shape}")
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить матрицу тем: {e!r}")
+    return matrix
+
+
+THEME_MATRIX = load_theme_matrix()
+
+def extract_themes(ctx: FeatureContext, top_k: int = 5, sim_threshold: float = 0.5) -> List[str]:
+    counter = {}
+
+    for token in ctx.tokens:
+        stemmer = russian_stemmer if re.search(r"[а-яА-Я]", token) else english_stemmer
+        stem = stemmer.stem(token)
+        for theme, stems in STEMMED_THEME_MAP.items():
+            if stem in stems:
+                counter[theme] = counter.get(theme, 0) + 1
+
+    rule_based = [t for t, c in counter.items() if c >= 2]
+
+    # Эмбеддинг первых ~512 слов берётся из уже посчитанных чанков документа
+    emb = ctx.theme_embedding
+    emb = emb / (np.linalg.norm(emb) + 1e-10)
+
+    # Строки матрицы нормализованы — косинус всех тем одним произведением
+    sims = THEME_MATRIX @ emb
+
+    above = np.flatnonzero(sims >= sim_threshold)
+    if len(above):
+        sem_based = [THEME_NAMES[i] for i in above]
+    else:
+        k = min(top_k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        sem_based = [THEME_NAMES[i] for i in top[np.argsort(-sims[top])]]
+
+    themes = []
+    for t in rule_based + sem_based:
+        if t not in themes:
+            themes.append(t)
+        if len(themes) >= top_k:
+            break
+
+    return themes
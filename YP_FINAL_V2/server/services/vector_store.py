@@ -0,0 +1,78 @@
+from typing import Iterator
+
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query, Session, contains_eager
+
+from models import Lyrics, TrackVectors
+
+# Строк track_vectors на один запрос при потоковом чтении
+READ_CHUNK = 1000
+
+# Модальность → колонка track_vectors (порядок как в faiss_common.MODALITIES)
+VECTOR_COLUMNS = {
+    "e5":      TrackVectors.e5,
+    "sbert":   TrackVectors.sbert,
+    "emotion": TrackVectors.emotion,
+}
+
+# У трека посчитаны векторы всех модальностей
+VECTORS_READY = and_(*(column != None for column in VECTOR_COLUMNS.values()))
+
+# Схема эмбеддинга E5 (semantic.SemanticEncoder.chunk): 2 — окна токенов с префиксом "query: ".
+# Векторы прежней схемы (NULL) пересчитывает tools.reencode_e5 или повторная загрузка трека
+E5_SCHEME = 2
+E5_CURRENT = TrackVectors.e5_scheme == E5_SCHEME
+E5_STALE = and_(TrackVectors.e5 != None, or_(TrackVectors.e5_scheme == None, TrackVectors.e5_scheme != E5_SCHEME))
+
+
+def analyzed_tracks(db: Session) -> Query:
+    """
+    Проанализированные треки; векторы приходят тем же запросом (JOIN), без
+    отдельной выборки на каждую строку.
+    """
+    return (
+        db.query(Lyrics)
+        .join(Lyrics.vectors)
+        .options(contains_eager(Lyrics.vectors))
+        .filter(VECTORS_READY)
+    )
+
+
+def _matrix(blobs: list[bytes]) -> np.ndarray:
+    # Векторы модальности одной длины: один буфер и reshape вместо frombuffer на строку
+    if len({len(b) for b in blobs}) != 1:
+        raise ValueError("Векторы одной модальности разной длины")
+    return np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+
+
+def read_vectors(db: Session, chunk: int = READ_CHUNK) -> Iterator[tuple[np.ndarray, dict[str, np.ndarray]]]:
+    """
+    Потоковое чтение track_vectors по возрастанию track_id — в порядке первичного
+    ключа, то есть последовательным проходом по таблице, не задевая строки lyrics.
+    Отдаёт блоки (ids, {модальность: матрица float32 без нормализации}).
+    Блоки выбираются по последнему прочитанному id (keyset), без OFFSET.
+    """
+    last = 0
+    columns = list(VECTOR_COLUMNS.values())
+    while True:
+        rows = (
+            db.query(TrackVectors.track_id, *columns)
+            .filter(TrackVectors.track_id > last, VECTORS_READY)
+            .order_by(TrackVectors.track_id)
+            .limit(chunk)
+            .all()
+        )
+        if not rows:
+            return
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        yield ids, {m: _matrix([r[k + 1] for r in rows]) for k, m in enumerate(VECTOR_COLUMNS)}
+        last = int(ids[-1])
+
+
+def count_vectors(db: Session) -> int:
+    return db.query(TrackVectors.track_id).filter(VECTORS_READY).count()
+
+
+def count_stale_e5(db: Session) -> int:
+    return db.query(TrackVectors.track_id).filter(E5_STALE).count()
@@ -0,0 +1,95 @@
+from typing import Optional
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+
+from config import (
+    logger, DEFAULT_DATABASE_URL,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE, SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT,
+    SQLITE_READ_POOL, SQLITE_WRITE_POOL, SQLITE_CHECKPOINT_MODE
+)
+
+# Профиль соединений SQLite; journal_mode ставится только на пишущих соединениях
+PRAGMAS = {
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous":  SQLITE_SYNCHRONOUS,
+    "cache_size":   SQLITE_CACHE_SIZE,
+    "mmap_size":    SQLITE_MMAP_SIZE,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+    "temp_store":   "MEMORY",
+    "foreign_keys": "ON",   # track_vectors удаляются вместе со строкой lyrics
+}
+
+CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+
+
+def is_file_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+
+def sqlite_engine(url: str, pragmas: dict, readonly: bool = False, pool_size: int = 5) -> Engine:
+    """
+    Движок SQLite, который применяет pragmas к каждому новому соединению.
+    readonly — соединения только для чтения (query_only), без смены журнала.
+    """
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=pool_size,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                if readonly and name == "journal_mode":
+                    continue
+                cursor.execute(f"PRAGMA {name}={value}")
+            if readonly:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+
+    return engine
+
+
+def _make_engines(url: str) -> tuple[Engine, Engine]:
+    if not is_file_sqlite(url):
+        # :memory: и другие СУБД — один общий движок без профиля
+        engine = create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {})
+        return engine, engine
+    write = sqlite_engine(url, PRAGMAS, pool_size=SQLITE_WRITE_POOL)
+    # WAL хранится в файле БД: переключаем его до первого читающего соединения
+    with write.connect() as conn:
+        mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+    read = sqlite_engine(url, PRAGMAS, readonly=True, pool_size=SQLITE_READ_POOL)
+    logger.info(f"SQLite: журнал {mode}, synchronous={SQLITE_SYNCHRONOUS}, пулы чтения/записи {SQLITE_READ_POOL}/{SQLITE_WRITE_POOL}")
+    return write, read
+
+
+# Запись (ORM-сессии с commit) и чтение (поиск, загрузка индексов, кеши) — разные пулы:
+# в WAL читатели не ждут писателя, а долгие выборки не занимают пишущие соединения
+write_engine, read_engine = _make_engines(DEFAULT_DATABASE_URL)
+
+
+def checkpoint(mode: Optional[str] = None) -> Optional[dict]:
+    """
+    Переносит WAL в основной файл БД. PASSIVE не ждёт читателей и писателей,
+    TRUNCATE ещё и обрезает файл журнала (при остановке сервиса).
+    None — БД не в режиме WAL.
+    """
+    mode = (mode or SQLITE_CHECKPOINT_MODE).upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"Неизвестный режим checkpoint: {mode}")
+    if not is_file_sqlite(str(write_engine.url)):
+        return None
+    with write_engine.connect() as conn:
+        if str(conn.execute(text("PRAGMA journal_mode")).scalar()).lower() != "wal":
+            return None
+        busy, log_pages, done_pages = conn.execute(text(f"PRAGMA wal_checkpoint({mode})")).one()
+    result = {"mode": mode, "busy": bool(busy), "wal_pages": log_pages, "checkpointed": done_pages}
+    if busy:
+        logger.info(f"SQLite: checkpoint {mode} не завершён — БД занята ({done_pages}/{log_pages} страниц)")
+    return result
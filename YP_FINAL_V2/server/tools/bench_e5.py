@@ -0,0 +1,59 @@
+"""
+Пропускная способность E5 (текстов/сек) для трёх режимов:
+  per_chunk   — прежний цикл: чанки по 200 слов, один прогон модели на чанк;
+  encode      — SemanticEncoder.encode, все чанки документа одним батчем;
+  encode_many — массовый режим, чанки всех текстов в батчах по длине.
+
+Запуск из папки server:
+    python -m tools.bench_e5 --limit 100 --batch-size 32
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from services.semantic import semantic_encoder
+from tools.bench_features import load_texts
+
+
+def per_chunk(text: str) -> np.ndarray:
+    words = text.replace("\n", " ").split()
+    embeddings = []
+    for i in range(0, len(words), 200):
+        inputs = semantic_encoder.tokenizer(
+            "query: " + " ".join(words[i:i + 200]),
+            return_tensors="pt",
+            truncation=True,
+            max_length=256
+        )
+        with torch.no_grad():
+            output = semantic_encoder.model(**inputs).last_hidden_state[:, 0]
+        embeddings.append(torch.nn.functional.normalize(output, dim=1).squeeze(0).numpy())
+    return semantic_encoder.pool(np.array(embeddings, dtype=np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E5 throughput, texts/sec")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    texts = load_texts(args.limit)
+    chunks = sum(len(semantic_encoder.chunk(t)) for t in texts)
+    print(f"texts: {len(texts)}  token chunks: {chunks}")
+
+    runs = {
+        "per_chunk":   lambda: [per_chunk(t) for t in texts],
+        "encode":      lambda: [semantic_encoder.encode(t) for t in texts],
+        "encode_many": lambda: semantic_encoder.encode_many(texts, args.batch_size),
+    }
+    for name, fn in runs.items():
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        print(f"{name:<12} {len(texts) / elapsed:8.2f} texts/sec  ({elapsed:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
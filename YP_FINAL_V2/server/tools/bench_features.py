@@ -0,0 +1,87 @@
+"""
+Сравнение числа прогонов E5 на одну загрузку: прежний путь (тексты для тем
+и для эмбеддинга кодируются отдельно) против общего FeatureContext.
+
+Запуск из папки server:
+    python -m tools.bench_features --limit 50
+
+Тексты берутся из таблицы lyrics (DATABASE_URL), при пустой БД — из каталога
+заглушек. Считаются вызовы модели (forward) и закодированные последовательности
+через forward hook, поэтому микробатчинг на результат не влияет.
+"""
+import argparse
+import time
+
+from database import SessionLocal
+from models import Lyrics
+from services.semantic import semantic_encoder
+from services.features import FeatureContext, THEME_SNIPPET_WORDS
+from tools.stub_servers import DEFAULT_CATALOG
+
+
+class ForwardCounter:
+    def __init__(self, model):
+        self.calls = 0
+        self.sequences = 0
+        model.register_forward_hook(self._hook)
+
+    def _hook(self, module, args, output):
+        self.calls += 1
+        self.sequences += output.last_hidden_state.shape[0]
+
+    def reset(self):
+        self.calls = self.sequences = 0
+
+
+def load_texts(limit: int) -> list[str]:
+    db = SessionLocal()
+    try:
+        rows = db.query(Lyrics.lyrics).filter(Lyrics.lyrics.isnot(None)).limit(limit).all()
+    finally:
+        db.close()
+    texts = [r[0] for r in rows if r[0]]
+    return texts or [item["lyrics"] for item in DEFAULT_CATALOG]
+
+
+def legacy(text: str):
+    # Прежний порядок: сниппет для тем и полный текст кодировались независимо
+    semantic_encoder.encode(" ".join(text.split()[:THEME_SNIPPET_WORDS]))
+    semantic_encoder.encode(text)
+
+
+def shared(text: str):
+    ctx = FeatureContext(text)
+    ctx.theme_embedding
+    ctx.e5_embedding
+
+
+def measure(name: str, fn, texts: list[str], counter: ForwardCounter) -> dict:
+    counter.reset()
+    started = time.perf_counter()
+    for text in texts:
+        fn(text)
+    elapsed = time.perf_counter() - started
+    n = len(texts)
+    return {
+        "path":                 name,
+        "forward_per_ingest":   round(counter.calls / n, 2),
+        "sequences_per_ingest": round(counter.sequences / n, 2),
+        "ms_per_ingest":        round(elapsed * 1000 / n, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E5 forward passes per ingest")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    texts = load_texts(args.limit)
+    counter = ForwardCounter(semantic_encoder.model)
+    print(f"texts: {len(texts)}")
+    for name, fn in (("legacy", legacy), ("feature_context", shared)):
+        row = measure(name, fn, texts, counter)
+        print("  ".join(f"{k}={v}" for k, v in row.items()))
+
+
+if __name__ == "__main__":
+    main()
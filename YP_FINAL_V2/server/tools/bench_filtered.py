@@ -0,0 +1,98 @@
+"""
+Фильтр «общий жанр и общая тема» в /find_similar: прежний пост-фильтр
+(top-50 из FAISS, затем отсев) против фильтрации внутри индекса.
+
+Запуск из папки server:
+    python -m tools.bench_filtered --queries 200
+
+Для случайных треков из БД считает заполненность выдачи (найдено / 30
+кандидатов, как в эндпоинте), долю пустых ответов (404) и задержку поиска.
+Модели не нужны — используются сохранённые векторы.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from database import SessionLocal
+from services.vector_store import analyzed_tracks
+from services.faiss_common import posting_keys
+from services.faiss_index import faiss_service
+
+TOP_K = 50
+NEEDED = 30
+
+
+def post_filter(src, genres: set, themes: set) -> list[int]:
+    ids = faiss_service.search(*src, top_k=TOP_K)
+    keys_g = {f"g:{g}" for g in genres}
+    keys_t = {f"t:{t}" for t in themes}
+    return [
+        i for i in ids
+        if faiss_service.state.tags.get(i, frozenset()) & keys_g and faiss_service.state.tags.get(i, frozenset()) & keys_t
+    ]
+
+
+def in_index(src, genres: set, themes: set) -> list[int]:
+    return faiss_service.search(*src, top_k=TOP_K, genres=genres, themes=themes)
+
+
+def run(name: str, fn, sources: list) -> dict:
+    fills, empty, latencies = [], 0, []
+    for obj_id, src, genres, themes in sources:
+        started = time.perf_counter()
+        ids = fn(src, genres, themes)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found = min(len([i for i in ids if i != obj_id]), NEEDED)
+        fills.append(found / NEEDED)
+        empty += found == 0
+    return {
+        "mode":     name,
+        "fill":     round(float(np.mean(fills)), 3),
+        "empty":    round(empty / len(sources), 3),
+        "p50_ms":   round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms":   round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-filter vs filtered ANN search")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faiss_service.load_or_build()
+    db = SessionLocal()
+    try:
+        rows = analyzed_tracks(db).all()
+    finally:
+        db.close()
+    if not rows:
+        print("В БД нет проанализированных треков")
+        return
+
+    random.seed(args.seed)
+    sample = random.sample(rows, min(args.queries, len(rows)))
+    sources = []
+    for o in sample:
+        keys = posting_keys(o.genre, o.themes)
+        sources.append((
+            o.id,
+            (
+                np.frombuffer(o.embedding, dtype=np.float32),
+                np.frombuffer(o.sbert_embedding, dtype=np.float32),
+                np.frombuffer(o.deep_emotion_vec, dtype=np.float32),
+            ),
+            {k[2:] for k in keys if k.startswith("g:")},
+            {k[2:] for k in keys if k.startswith("t:")},
+        ))
+
+    print(f"tracks: {len(faiss_service)}  queries: {len(sources)}")
+    for name, fn in (("post_filter", post_filter), ("in_index", in_index)):
+        row = run(name, fn, sources)
+        print("  ".join(f"{k}={v}" for k, v in row.items()))
+
+
+if __name__ == "__main__":
+    main()
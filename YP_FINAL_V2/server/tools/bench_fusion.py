@@ -0,0 +1,89 @@
+"""
+Задержка поиска: прежний единый HNSW по взвешенной конкатенации векторов
+против индексов по модальностям со слиянием во время запроса.
+
+Запуск из папки server:
+    python -m tools.bench_fusion --queries 300 --top-k 50
+
+Конкатенированный индекс строится здесь же из сохранённых векторов
+(как раньше в FaissIndexService.build_index); время его построения —
+это цена смены весов в старой схеме. Для слияния та же смена весов
+бесплатна: сравнивается задержка с весами из config и с изменёнными.
+Также печатается пересечение top-k обеих схем.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from config import E5_WEIGHT, SBERT_WEIGHT, EMO_WEIGHT
+from database import SessionLocal
+from services.vector_store import analyzed_tracks
+from services.faiss_common import make_index, row_vectors
+from services.faiss_index import faiss_service
+
+
+def concat_vector(vecs: dict, weights: dict) -> np.ndarray:
+    part = np.concatenate([weights["e5"] * vecs["e5"], weights["sbert"] * vecs["sbert"], weights["emotion"] * vecs["emotion"]])
+    return (part / (np.linalg.norm(part) + 1e-10)).astype(np.float32)
+
+
+def percentiles(latencies: list[float]) -> str:
+    return f"p50={np.percentile(latencies, 50):.3f} ms  p95={np.percentile(latencies, 95):.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concatenated index vs late fusion")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rows = analyzed_tracks(db).all()
+    finally:
+        db.close()
+    if not rows:
+        print("В БД нет проанализированных треков")
+        return
+
+    weights = {"e5": E5_WEIGHT, "sbert": SBERT_WEIGHT, "emotion": EMO_WEIGHT}
+    vectors = [row_vectors(o) for o in rows]
+    ids = np.asarray([o.id for o in rows], dtype=np.int64)
+
+    started = time.perf_counter()
+    matrix = np.vstack([concat_vector(v, weights) for v in vectors])
+    concat = make_index("hnsw_flat", matrix)
+    build_s = time.perf_counter() - started
+
+    faiss_service.load_or_build()
+
+    random.seed(args.seed)
+    sample = random.sample(range(len(rows)), min(args.queries, len(rows)))
+    queries = [vectors[i] for i in sample]
+    print(f"tracks: {len(rows)}  queries: {len(queries)}  top_k: {args.top_k}")
+    print(f"concat build (цена смены весов): {build_s:.2f} s")
+
+    concat_lat, concat_res = [], []
+    for v in queries:
+        t = time.perf_counter()
+        _, idxs = concat.search(concat_vector(v, weights).reshape(1, -1), args.top_k)
+        concat_lat.append((time.perf_counter() - t) * 1000)
+        concat_res.append(set(ids[idxs[0][idxs[0] >= 0]].tolist()))
+    print(f"concat            {percentiles(concat_lat)}")
+
+    alt = {"e5": 0.6, "sbert": 0.2, "emotion": 0.2}
+    for name, w in (("fusion", weights), ("fusion(reweight)", alt)):
+        lat, overlap = [], []
+        for v, expected in zip(queries, concat_res):
+            t = time.perf_counter()
+            found = faiss_service.search(v["e5"], v["sbert"], v["emotion"], args.top_k, weights=w)
+            lat.append((time.perf_counter() - t) * 1000)
+            overlap.append(len(expected & set(found)) / max(len(expected), 1))
+        print(f"{name:<17} {percentiles(lat)}  overlap@k с concat={np.mean(overlap):.3f}")
+
+
+if __name__ == "__main__":
+    main()
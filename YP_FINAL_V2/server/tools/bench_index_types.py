@@ -0,0 +1,103 @@
+"""
+Сравнение семейств базового индекса FAISS на сохранённых векторах:
+полнота recall@k относительно точного поиска, размер индекса и задержка.
+
+Запуск из папки server:
+    python -m tools.bench_index_types --modality e5 --queries 500 --top-k 50
+    python -m tools.bench_index_types --types hnsw_flat,ivf_pq --nprobe 8,32
+
+Запросы — случайные векторы из той же таблицы (сам трек из ответа не
+исключается ни у эталона, ни у индекса). Память — размер сериализованного
+индекса, то есть то, что держится в RAM; точные векторы для пересчёта
+лежат в снимке отдельно и отображаются в память.
+Для IVF-типов можно перебрать несколько nprobe без перестройки.
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from database import SessionLocal
+from services.faiss_common import INDEX_TYPES, MODALITIES, make_index, normalize_rows, search_params
+from services.vector_store import read_vectors
+
+
+def load_matrix(modality: str) -> np.ndarray:
+    db = SessionLocal()
+    try:
+        parts = [normalize_rows(matrices[modality]) for _, matrices in read_vectors(db)]
+        return np.vstack(parts) if parts else np.zeros((0, 0), np.float32)
+    finally:
+        db.close()
+
+
+def ivf_of(index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    params = search_params(index, k)
+    latencies, hits = [], 0
+    for q, expected in zip(queries, truth):
+        started = time.perf_counter()
+        _, idxs = index.search(q.reshape(1, -1), k, params=params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(set(expected.tolist()) & set(idxs[0][idxs[0] >= 0].tolist()))
+    return {
+        "recall":   round(hits / (len(queries) * k), 4),
+        "p50_ms":   round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms":   round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall, memory and latency per FAISS index type")
+    parser.add_argument("--modality", choices=MODALITIES, default="e5")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--nprobe", default="", help="список nprobe для IVF-типов через запятую")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    matrix = load_matrix(args.modality)
+    if not len(matrix):
+        print("В БД нет проанализированных треков")
+        return
+    n, dim = matrix.shape
+    k = min(args.top_k, n)
+    rng = np.random.default_rng(args.seed)
+    queries = matrix[rng.choice(n, min(args.queries, n), replace=False)]
+
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(matrix)
+    _, truth = exact.search(queries, k)
+    print(f"modality: {args.modality}  vectors: {n}  dim: {dim}  queries: {len(queries)}  top_k: {k}")
+    print(f"raw float32: {matrix.nbytes / 2**20:.1f} MiB")
+
+    for kind in args.types.split(","):
+        started = time.perf_counter()
+        index = make_index(kind, matrix)
+        build_s = time.perf_counter() - started
+        size_mb = faiss.serialize_index(index).nbytes / 2**20
+        ivf = ivf_of(index)
+        probes = [int(p) for p in args.nprobe.split(",") if p] if ivf is not None else []
+        for nprobe in probes or [None]:
+            if nprobe is not None:
+                ivf.nprobe = nprobe
+            row = {
+                "type":     kind if nprobe is None else f"{kind}(nprobe={nprobe})",
+                "index":    type(index).__name__,
+                "mem_mb":   round(size_mb, 1),
+                "build_s":  round(build_s, 1),
+                **measure(index, queries, truth, k),
+            }
+            print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Пересчёт кандидатов /find_similar: прежний цикл по ORM-строкам кандидатов
+против векторного ранжирования по хранилищу признаков (services.ranking).
+
+Запуск из папки server:
+    python -m tools.bench_rerank --sources 200 --repeat 20
+
+Для случайных проанализированных треков берутся кандидаты из FAISS
+(как в эндпоинте). Проверка совпадения: одинаковые отобранные соседи,
+одинаковые top-5 (треки и все поля) и расхождение несокращённых оценок
+не больше --atol. При несовпадении код возврата 1. Время прежнего пути
+включает выборку строк кандидатов из БД, как было в эндпоинте.
+Модели не нужны — используются сохранённые векторы.
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+from sqlalchemy.orm import joinedload
+
+from config import THEME_BONUS, GENRE_BONUS, OVERLAP_RATIO_BONUS, LENGTH_NORMALIZATION
+from database import SessionLocal, init_db
+from models import Lyrics
+from services.faiss_common import default_weights, row_vectors
+from services.faiss_index import faiss_service
+from services.feature_store import feature_store
+from services.idf_cache import idf_service
+from services.vector_store import VECTORS_READY
+from services.ranking import pick_neighbors, rank_candidates, score_candidates
+
+
+def legacy_pick(source, candidate_ids: list[int], id_to_obj: dict) -> list:
+    src_genres = set(source.genre or [])
+    src_themes = set(source.themes or [])
+    neighbors  = []
+    seen_ids   = set()
+    for cid in candidate_ids:
+        if cid == source.id or cid in seen_ids:
+            continue
+        o = id_to_obj.get(cid)
+        if not o or not o.embedding:
+            continue
+        if not (src_genres & set(o.genre or [])):
+            continue
+        if not (src_themes & set(o.themes or [])):
+            continue
+        neighbors.append(o)
+        seen_ids.add(cid)
+        if len(neighbors) >= 30:
+            break
+    return neighbors
+
+
+def legacy(db, source, src_vectors: tuple, candidate_ids: list[int], weights: dict):
+    # Прежде векторы читались той же выборкой, что и строка lyrics
+    objs = db.query(Lyrics).options(joinedload(Lyrics.vectors)).filter(Lyrics.id.in_(candidate_ids)).all()
+    neighbors = legacy_pick(source, candidate_ids, {o.id: o for o in objs})
+    return neighbors, legacy_rank(source, src_vectors, neighbors, weights)
+
+
+def vectorized(source_id: int, candidate_ids: list[int], weights: dict):
+    src = feature_store.features([source_id])
+    neighbors = pick_neighbors(src, feature_store.features(candidate_ids))
+    genre_idf, theme_idf = feature_store.idf_vectors(idf_service.genre_idf, idf_service.theme_idf)
+    final = rank_candidates(src, neighbors, weights, genre_idf, theme_idf)
+    return neighbors, final, score_candidates(src, neighbors, weights, genre_idf, theme_idf)["score"]
+
+
+def legacy_rank(source, src_vectors: tuple, neighbors: list, weights: dict) -> tuple[list[dict], list[float]]:
+    # Прежняя реализация из find_similar_encrypted; вторым значением — несокращённые оценки
+    src_e5, src_sb, src_em = src_vectors
+    src_genres = set(source.genre or [])
+    src_themes = set(source.themes or [])
+    theme_idf = idf_service.theme_idf
+    genre_idf = idf_service.genre_idf
+
+    results, raw = [], []
+    for cand in neighbors:
+        e5v = np.frombuffer(cand.embedding, dtype=np.float32).copy()
+        sbv = np.frombuffer(cand.sbert_embedding, dtype=np.float32).copy()
+        emv = np.frombuffer(cand.deep_emotion_vec, dtype=np.float32).copy()
+        e5v /= (np.linalg.norm(e5v) + 1e-10)
+        sbv /= (np.linalg.norm(sbv) + 1e-10)
+        emv /= (np.linalg.norm(emv) + 1e-10)
+
+        cos_sim = float(np.dot(src_e5, e5v))
+        sb_sim  = float(np.dot(src_sb, sbv))
+        emo_sim = float(np.dot(src_em, emv))
+
+        common_t    = src_themes & set(cand.themes or [])
+        union_t     = src_themes | set(cand.themes or [])
+        theme_tfidf = (
+            sum(theme_idf.get(t, 0) for t in common_t) /
+            sum(theme_idf.get(t, 0) for t in union_t)
+            if union_t else 0.0
+        )
+
+        common_g    = src_genres & set(cand.genre or [])
+        union_g     = src_genres | set(cand.genre or [])
+        genre_tfidf = (
+            sum(genre_idf.get(g, 0) for g in common_g) /
+            sum(genre_idf.get(g, 0) for g in union_g)
+            if union_g else 0.0
+        )
+        overlap_ratio = (len(common_g) / len(union_g)) if union_g else 0.0
+
+        raw_score    = weights["sbert"] * sb_sim + weights["e5"] * cos_sim + weights["emotion"] * emo_sim
+        bonus        = (1 + THEME_BONUS * theme_tfidf + GENRE_BONUS * genre_tfidf + OVERLAP_RATIO_BONUS * overlap_ratio)
+        length_bonus = min(len(cand.lyrics.split()), LENGTH_NORMALIZATION) / LENGTH_NORMALIZATION
+        score        = raw_score * bonus * length_bonus
+        score        = min(score, 0.9999)
+        raw.append(score)
+
+        results.append({
+            "track":            cand.track_name,
+            "artist":           cand.artist,
+            "similarity":       round(score * 100, 2),
+            "sbert_similarity": round(max(sb_sim,  0) * 100, 2),
+            "cosine_semantic":  round(max(cos_sim, 0) * 100, 2),
+            "emotion_sim":      round(emo_sim * 100,   2),
+            "theme_tfidf":      round(theme_tfidf * 100,2),
+            "genre_tfidf":      round(genre_tfidf * 100,2),
+            "overlap_ratio":    round(overlap_ratio * 100,2),
+        })
+
+    seen_pairs = set()
+    final = []
+    for item in sorted(results, key=lambda x: -x["similarity"]):
+        pair = (item["track"], item["artist"])
+        if pair in seen_pairs:
+            continue
+        seen_pairs.add(pair)
+        final.append(item)
+        if len(final) == 5:
+            break
+    return final, raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy vs vectorized re-ranking")
+    parser.add_argument("--sources", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--atol", type=float, default=1e-6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    init_db()
+    idf_service.load()
+    faiss_service.load_or_build()
+    feature_store.load()
+    weights = default_weights()
+    db = SessionLocal()
+    try:
+        ids = [i for i, in db.query(Lyrics.id).join(Lyrics.vectors).filter(VECTORS_READY).all()]
+        random.seed(args.seed)
+        cases = []
+        for source in db.query(Lyrics).filter(Lyrics.id.in_(random.sample(ids, min(args.sources, len(ids))))):
+            vecs = row_vectors(source)
+            src_vectors = (vecs["e5"], vecs["sbert"], vecs["emotion"])
+            candidate_ids = faiss_service.search(
+                *src_vectors, top_k=50,
+                genres=set(source.genre or []), themes=set(source.themes or []), weights=weights
+            )
+            cases.append((source, src_vectors, candidate_ids))
+
+        mismatched, max_diff, n_cand = 0, 0.0, []
+        for source, src_vectors, candidate_ids in cases:
+            old_neighbors, (expected, raw) = legacy(db, source, src_vectors, candidate_ids, weights)
+            neighbors, final, scores = vectorized(source.id, candidate_ids, weights)
+            n_cand.append(len(neighbors))
+            if [o.id for o in old_neighbors] != neighbors.ids.tolist() or final != expected:
+                mismatched += 1
+            elif raw:
+                max_diff = max(max_diff, float(np.abs(scores - raw).max()))
+        print(f"sources: {len(cases)}  candidates/source: {np.mean(n_cand):.1f}")
+        print(f"parity: mismatches={mismatched}  max |score diff|={max_diff:.2e}")
+
+        runs = (
+            ("legacy", lambda c: legacy(db, *c, weights)),
+            ("vectorized", lambda c: vectorized(c[0].id, c[2], weights)),
+        )
+        for name, fn in runs:
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                for case in cases:
+                    fn(case)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<11} {elapsed * 1e6 / (args.repeat * len(cases)):8.1f} us/request")
+    finally:
+        db.close()
+
+    if mismatched or max_diff > args.atol:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Смешанная нагрузка на SQLite: писатели (вставка трека и строки лога, как
+загрузка в /get_lyrics) параллельно с читателями (поиск id по ключу трек-артист
+и выборка 50 строк кандидатов, как в /find_similar).
+
+Запуск из папки server:
+    python -m tools.bench_sqlite --writers 4 --readers 8 --seconds 10
+
+Профили:
+    legacy — один движок с настройками по умолчанию (журнал отката), как было;
+    tuned  — профиль storage.PRAGMAS (WAL и т.д.), отдельные движки чтения и записи.
+Каждый профиль гоняется на своей временной БД, засеянной --rows строками;
+рабочая БД не трогается. Печатаются операции в секунду, p50/p99 задержки
+и число ошибок «database is locked».
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Lyrics, Log
+from storage import PRAGMAS, sqlite_engine
+from services.normalize import match_key
+from config import SQLITE_READ_POOL, SQLITE_WRITE_POOL
+
+GENRES = [f"genre{i}" for i in range(40)]
+THEMES = [f"theme{i}" for i in range(60)]
+
+
+def fake_row(rng: random.Random, i: int) -> Lyrics:
+    blob = np.asarray([rng.random() for _ in range(256)], dtype=np.float32).tobytes()
+    return Lyrics(
+        track_name=f"track{i}", artist=f"artist{i % 997}", match_key=match_key(f"track{i}", f"artist{i % 997}"),
+        lyrics="la " * 200,
+        embedding=blob, sbert_embedding=blob, deep_emotion_vec=blob[:112],
+        genre=rng.sample(GENRES, 3), themes=rng.sample(THEMES, 3),
+    )
+
+
+def seed(url: str, rows: int):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    rng = random.Random(0)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    for start in range(0, rows, 1000):
+        db.add_all(fake_row(rng, i) for i in range(start, min(start + 1000, rows)))
+        db.commit()
+    db.close()
+    engine.dispose()
+
+
+def engines(profile: str, url: str):
+    if profile == "legacy":
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        return engine, engine
+    return (
+        sqlite_engine(url, PRAGMAS, pool_size=SQLITE_WRITE_POOL),
+        sqlite_engine(url, PRAGMAS, readonly=True, pool_size=SQLITE_READ_POOL),
+    )
+
+
+def run(profile: str, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_sqlite_"), "bench.db")
+    url = f"sqlite:///{path}"
+    seed(url, args.rows)
+    write_engine, read_engine = engines(profile, url)
+    Write, Read = sessionmaker(bind=write_engine), sessionmaker(bind=read_engine)
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {"read": [], "write": [], "locked": 0, "errors": 0}
+
+    def worker(kind: str, n: int):
+        rng = random.Random(n)
+        latencies, locked, errors = [], 0, 0
+        i = args.rows + n * 10_000_000
+        while not stop.is_set():
+            started = time.perf_counter()
+            db = (Write if kind == "write" else Read)()
+            try:
+                if kind == "write":
+                    i += 1
+                    db.add(fake_row(rng, i))
+                    db.add(Log(ip_address="127.0.0.1", operation="get_lyrics", status="success", device_info="bench"))
+                    db.commit()
+                else:
+                    k = rng.randrange(args.rows)
+                    db.query(Lyrics.id).filter_by(match_key=match_key(f"track{k}", f"artist{k % 997}")).first()
+                    ids = [rng.randrange(1, args.rows) for _ in range(50)]
+                    db.query(Lyrics).filter(Lyrics.id.in_(ids)).all()
+                latencies.append((time.perf_counter() - started) * 1000)
+            except OperationalError as e:
+                db.rollback()
+                if "locked" in str(e):
+                    locked += 1
+                else:
+                    errors += 1
+            finally:
+                db.close()
+        with lock:
+            stats[kind].extend(latencies)
+            stats["locked"] += locked
+            stats["errors"] += errors
+
+    threads = (
+        [threading.Thread(target=worker, args=("write", n)) for n in range(args.writers)]
+        + [threading.Thread(target=worker, args=("read", args.writers + n)) for n in range(args.readers)]
+    )
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    def pct(values, q):
+        return round(float(np.percentile(values, q)), 2) if values else None
+
+    return {
+        "profile":     profile,
+        "writes_s":    round(len(stats["write"]) / args.seconds, 1),
+        "reads_s":     round(len(stats["read"]) / args.seconds, 1),
+        "write_p50":   pct(stats["write"], 50),
+        "write_p99":   pct(stats["write"], 99),
+        "read_p50":    pct(stats["read"], 50),
+        "read_p99":    pct(stats["read"], 99),
+        "locked":      stats["locked"],
+        "errors":      stats["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed read/write load: legacy vs tuned SQLite profile")
+    parser.add_argument("--profiles", default="legacy,tuned")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"writers: {args.writers}  readers: {args.readers}  seconds: {args.seconds}  rows: {args.rows}")
+    for profile in args.profiles.split(","):
+        row = run(profile, args)
+        print("  ".join(f"{k}={v}" for k, v in row.items()))
+
+
+if __name__ == "__main__":
+    main()
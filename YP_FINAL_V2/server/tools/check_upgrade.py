@@ -0,0 +1,163 @@
+"""
+Проверка обновления старой БД: строки lyrics с дубликатами по (трек, артист),
+векторы в самой таблице lyrics, таблицы счётчиков IDF ещё нет.
+
+Запуск из папки server:
+    python -m tools.check_upgrade --rows 2000
+
+Во временной папке создаётся БД старой схемы, затем выполняется то же, что
+при старте сервиса: init_db(), слияние дубликатов, загрузка счётчиков IDF.
+Сверяется, что дубликатов не осталось, а счётчики tag_frequency и в памяти
+совпадают с полным пересчётом и положительны. Второй прогон портит счётчики
+(отрицательные значения) и проверяет, что load() восстанавливает их.
+Код выхода 1 — проверка не прошла. Рабочая БД не трогается.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+GENRES = [f"genre{i}" for i in range(20)]
+THEMES = [f"theme{i}" for i in range(30)]
+
+LEGACY_SCHEMA = """
+CREATE TABLE lyrics (
+    id INTEGER NOT NULL PRIMARY KEY,
+    track_name VARCHAR(200),
+    artist VARCHAR(200),
+    lyrics TEXT,
+    embedding BLOB,
+    sbert_embedding BLOB,
+    deep_emotion FLOAT,
+    deep_emotion_vec BLOB,
+    themes JSON,
+    genre JSON,
+    created_at DATETIME
+)
+"""
+
+# Варианты написания одного трека: после нормализации ключ у них общий
+SPELLINGS = (
+    lambda t, a: (t, a),
+    lambda t, a: (t.upper(), a.lower()),
+    lambda t, a: (f"  {t} ", f"{a}  "),
+)
+
+
+def make_legacy_db(path: str, rows: int, seed: int = 0) -> int:
+    """
+    Старая БД: каждый третий трек записан 2–3 раза в разном написании,
+    у части строк нет векторов. Возвращает число строк.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    data = []
+    for i in range(rows):
+        track, artist = f"Track {i}", f"Artist {i % 97}"
+        for spelling in SPELLINGS[:rng.choice((2, 3)) if i % 3 == 0 else 1]:
+            t, a = spelling(track, artist)
+            blob = np.asarray([rng.random() for _ in range(8)], dtype=np.float32).tobytes()
+            analyzed = rng.random() < 0.7
+            data.append((
+                t, a, "la la", blob if analyzed else None, blob if analyzed else None,
+                blob if analyzed else None,
+                json.dumps(rng.sample(THEMES, rng.randint(0, 3))), json.dumps(rng.sample(GENRES, rng.randint(0, 2))),
+                f"2024-01-{1 + rng.randrange(28):02d} 00:00:00",
+            ))
+    conn.executemany(
+        "INSERT INTO lyrics (track_name, artist, lyrics, embedding, sbert_embedding, deep_emotion_vec, "
+        "themes, genre, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", data
+    )
+    conn.commit()
+    conn.close()
+    return len(data)
+
+
+def check_counts(label: str) -> list[str]:
+    from database import ReadSessionLocal
+    from models import Lyrics, TagFrequency
+    from services.idf_cache import doc_counts, idf_service, TOTAL
+
+    db = ReadSessionLocal()
+    try:
+        actual = Counter()
+        for genres, themes in db.query(Lyrics.genre, Lyrics.themes):
+            actual.update(doc_counts(genres, themes))
+        stored = {(r.kind, r.tag): r.docs for r in db.query(TagFrequency)}
+    finally:
+        db.close()
+
+    errors = []
+    negative = [key for key, docs in stored.items() if docs < 0]
+    if negative:
+        errors.append(f"{label}: отрицательные счётчики {negative[:5]}")
+    if Counter({k: v for k, v in stored.items() if v > 0}) != actual:
+        errors.append(f"{label}: tag_frequency расходится с пересчётом")
+    try:
+        genre_idf, theme_idf = idf_service.genre_idf, idf_service.theme_idf
+    except (ValueError, ZeroDivisionError) as e:
+        return errors + [f"{label}: sync() упал: {e!r}"]
+    n = actual[TOTAL]
+    for kind, idf in (("g", genre_idf), ("t", theme_idf)):
+        tags = {tag for k, tag in actual if k == kind}
+        if set(idf) != tags or any(abs(idf[t] - np.log((n + 1) / (actual[(kind, t)] + 1))) > 1e-9 for t in tags):
+            errors.append(f"{label}: IDF ({kind}) расходится с пересчётом")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upgrade a legacy DB with duplicates and no IDF counters")
+    parser.add_argument("--rows", type=int, default=2000, help="треков до дубликатов")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="check_upgrade_")
+    path = os.path.join(tmp, "legacy.db")
+    total = make_legacy_db(path, args.rows)
+    # Движки создаются при импорте database — URL задаётся до него
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["DATA_DIR"] = tmp
+
+    from sqlalchemy import func, text
+    from database import ReadSessionLocal, engine, init_db
+    from models import Lyrics
+    from services.duplicates import ensure_unique_keys, has_unique_index
+    from services.idf_cache import idf_service
+
+    init_db()
+    ensure_unique_keys()
+    idf_service.load()
+
+    errors = []
+    db = ReadSessionLocal()
+    try:
+        left = db.query(Lyrics.id).count()
+        repeated = db.query(Lyrics.match_key).group_by(Lyrics.match_key).having(func.count() > 1).count()
+    finally:
+        db.close()
+    if repeated or not has_unique_index():
+        errors.append(f"дубликаты: осталось групп {repeated}, уникальный индекс {has_unique_index()}")
+    errors += check_counts("после обновления")
+
+    # Счётчики, испорченные в обход ORM: load() должен пересчитать их, а не принять как есть
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE tag_frequency SET docs = -docs WHERE kind = 'g'"))
+    idf_service.load()
+    errors += check_counts("после порчи счётчиков")
+
+    print(f"строк {total} → {left}; БД {path}")
+    for error in errors:
+        print("FAIL", error)
+    if errors:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Разовое слияние дубликатов lyrics по нормализованному ключу (match_key)
+и создание уникального индекса по нему.
+
+Запуск из папки server (при остановленном сервисе):
+    python -m tools.merge_duplicates --dry-run
+    python -m tools.merge_duplicates
+
+Сервис делает то же сам при старте, пока уникального индекса нет; вручную —
+чтобы заранее посмотреть, сколько строк будет удалено (--dry-run).
+"""
+import argparse
+
+from database import init_db
+from services.duplicates import merge_duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge duplicate lyrics rows by normalized key")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать, ничего не менять")
+    args = parser.parse_args()
+
+    init_db()
+    result = merge_duplicates(dry_run=args.dry_run)
+    print("  ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
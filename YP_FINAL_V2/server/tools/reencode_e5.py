@@ -0,0 +1,74 @@
+"""
+Пересчёт эмбеддингов E5, сохранённых прежней схемой (чанки по 200 слов),
+текущей схемой SemanticEncoder (окна токенов с префиксом "query: "):
+иначе /find_similar сравнивает векторы двух разных пулингов.
+
+Запуск из папки server (при остановленном сервисе):
+    python -m tools.reencode_e5 --chunk 256
+
+Векторы пересчитываются по тексту из lyrics пачками через encode_many и
+помечаются track_vectors.e5_scheme = E5_SCHEME. В конце удаляются метаданные
+снимка FAISS: при следующем старте индекс перестраивается из БД.
+"""
+import argparse
+import os
+import time
+
+from sqlalchemy import bindparam, update
+
+from config import FAISS_SNAPSHOT_DIR, E5_BULK_BATCH
+from database import SessionLocal, init_db
+from models import Lyrics, TrackVectors
+from services.faiss_snapshot import META_FILE
+from services.semantic import semantic_encoder
+from services.vector_store import E5_SCHEME, E5_STALE, count_stale_e5
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode E5 vectors stored with the legacy chunking")
+    parser.add_argument("--chunk", type=int, default=256, help="треков на одну запись в БД")
+    parser.add_argument("--batch-size", type=int, default=E5_BULK_BATCH, help="чанков на прогон модели")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    table = TrackVectors.__table__
+    stmt = (
+        update(table)
+        .where(table.c.track_id == bindparam("row_id"))
+        .values(e5=bindparam("vec"), e5_scheme=E5_SCHEME)
+    )
+    try:
+        total = count_stale_e5(db)
+        print(f"векторов E5 прежней схемы: {total}")
+        done, last, started = 0, 0, time.perf_counter()
+        while True:
+            rows = (
+                db.query(TrackVectors.track_id, Lyrics.lyrics)
+                .join(Lyrics, Lyrics.id == TrackVectors.track_id)
+                .filter(E5_STALE, TrackVectors.track_id > last)
+                .order_by(TrackVectors.track_id)
+                .limit(args.chunk)
+                .all()
+            )
+            if not rows:
+                break
+            last = rows[-1][0]
+            embeddings = semantic_encoder.encode_many([text or "" for _, text in rows], args.batch_size)
+            db.execute(stmt, [
+                {"row_id": track_id, "vec": vec.tobytes()} for (track_id, _), vec in zip(rows, embeddings)
+            ])
+            db.commit()
+            done += len(rows)
+            print(f"  {done}/{total}  {done / (time.perf_counter() - started):.1f} треков/с")
+    finally:
+        db.close()
+
+    meta_path = os.path.join(FAISS_SNAPSHOT_DIR, META_FILE)
+    if done and os.path.exists(meta_path):
+        os.remove(meta_path)
+        print(f"снимок FAISS сброшен ({meta_path}), индекс перестроится при старте")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Локальные заглушки Genius и Last.fm для прогона пайплайна без внешней сети.
+
+Запуск из папки server:
+    python -m tools.stub_servers --delay 0.3
+
+Скрипт печатает переменные окружения, которые нужно выставить серверу
+(LASTFM_API_URL, LASTFM_WEB_URL, GENIUS_*_ROOT), чтобы все внешние запросы
+шли в заглушки. --delay добавляет задержку к каждому ответу и позволяет
+увидеть эффект параллельных запросов и лимитов на хост.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+DEFAULT_CATALOG = [
+    {"title": "Stub Song One", "artist": "Stub Artist", "tags": ["rock", "indie"],
+     "lyrics": "we walk the empty streets at night\nand every light is burning bright\n" * 8},
+    {"title": "Stub Song Two", "artist": "Stub Artist", "tags": ["pop"],
+     "lyrics": "money in my pocket and the summer on my mind\nleave the heavy days behind\n" * 8},
+    {"title": "Звёздная ночь", "artist": "Заглушка", "tags": ["rock"],
+     "lyrics": "ночь и звёзды над рекой\nгород спит, а я с тобой\n" * 8},
+]
+
+
+class StubState:
+    def __init__(self, catalog: list[dict], delay: float):
+        self.delay = delay
+        self.songs = {}
+        for i, item in enumerate(catalog, start=1):
+            path = f"stub-{i}-lyrics"
+            self.songs[i] = {**item, "id": i, "path": path}
+        self.lock = threading.Lock()
+        self.requests: dict[str, int] = {}
+
+    def hit(self, name: str):
+        with self.lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def find(self, query: str):
+        q = " ".join(query.casefold().split())
+        for song in self.songs.values():
+            if q == " ".join(f"{song['title']} {song['artist']}".casefold().split()):
+                return song
+        return None
+
+    def find_track(self, title: str, artist: str = ""):
+        for song in self.songs.values():
+            if song["title"].casefold() == title.casefold() and (
+                not artist or song["artist"].casefold() == artist.casefold()
+            ):
+                return song
+        return None
+
+
+def genius_song_info(song: dict) -> dict:
+    return {
+        "id": song["id"],
+        "title": song["title"],
+        "primary_artist": {"name": song["artist"]},
+        "url": f"https://genius.com/{song['path']}",
+        "path": f"/{song['path']}",
+        "lyrics_state": "complete",
+    }
+
+
+def make_handler(state: StubState, service: str):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, payload, content_type="application/json"):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            time.sleep(state.delay)
+            url = urlsplit(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if service == "genius":
+                self._genius(url.path, params)
+            else:
+                self._lastfm(url.path, params)
+
+        def _genius(self, path: str, params: dict):
+            if path.endswith("/search/multi") or path.endswith("/search"):
+                state.hit("genius.search")
+                song = state.find(params.get("q", ""))
+                hits = [{"index": "song", "type": "song", "result": genius_song_info(song)}] if song else []
+                return self._send({"response": {"sections": [{"type": "song", "hits": hits}], "hits": hits}})
+            if "/songs/" in path:
+                state.hit("genius.song")
+                song = state.songs.get(int(path.rsplit("/", 1)[-1]))
+                return self._send({"response": {"song": genius_song_info(song) if song else {}}})
+            state.hit("genius.page")
+            for song in state.songs.values():
+                if path.strip("/") == song["path"]:
+                    lines = "<br/>".join(song["lyrics"].splitlines())
+                    html = f'<html><body><div data-lyrics-container="true">{lines}</div></body></html>'
+                    return self._send(html.encode("utf-8"), "text/html; charset=utf-8")
+            self._send(b"<html></html>", "text/html")
+
+        def _lastfm(self, path: str, params: dict):
+            if path.startswith("/music/"):
+                state.hit("lastfm.web")
+                parts = path.split("/")
+                song = state.find_track(unquote(parts[-1]), unquote(parts[2]))
+                links = "".join(f'<a href="/tag/{t}">{t}</a>' for t in (song or {}).get("tags", []))
+                return self._send(f"<html><body>{links}</body></html>".encode("utf-8"), "text/html")
+
+            method = params.get("method", "")
+            state.hit(f"lastfm.{method}")
+            song = state.find_track(params.get("track", ""))
+            if method == "track.search":
+                matches = [{"artist": song["artist"], "listeners": str(1000 * song["id"])}] if song else []
+                return self._send({"results": {"trackmatches": {"track": matches}}})
+            if method == "track.getInfo":
+                return self._send({"track": {"playcount": str(5000 * song["id"]) if song else "0"}})
+            if method == "track.getTopTags":
+                tags = [{"name": t} for t in (song or {}).get("tags", [])]
+                return self._send({"toptags": {"tag": tags}})
+            self._send({"error": 3, "message": "Invalid Method"})
+
+    return Handler
+
+
+def serve(state: StubState, service: str, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state, service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Genius/Last.fm servers")
+    parser.add_argument("--lastfm-port", type=int, default=8901)
+    parser.add_argument("--genius-port", type=int, default=8902)
+    parser.add_argument("--delay", type=float, default=0.0, help="задержка ответа, сек.")
+    parser.add_argument("--catalog", help="JSON-файл со списком {title, artist, tags, lyrics}")
+    args = parser.parse_args()
+
+    catalog = DEFAULT_CATALOG
+    if args.catalog:
+        with open(args.catalog, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+
+    state = StubState(catalog, args.delay)
+    serve(state, "lastfm", args.lastfm_port)
+    serve(state, "genius", args.genius_port)
+
+    lastfm = f"http://127.0.0.1:{args.lastfm_port}"
+    genius = f"http://127.0.0.1:{args.genius_port}"
+    print(f"LASTFM_API_URL={lastfm}/2.0/")
+    print(f"LASTFM_WEB_URL={lastfm}")
+    print(f"GENIUS_API_ROOT={genius}/")
+    print(f"GENIUS_PUBLIC_API_ROOT={genius}/api/")
+    print(f"GENIUS_WEB_ROOT={genius}/")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(state.requests, ensure_ascii=False))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()